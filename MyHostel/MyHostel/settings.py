@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mainapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +78,135 @@ WSGI_APPLICATION = 'MyHostel.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# DB_PROFILE picks the database setup:
+#   sqlite        the development default
+#   sqlite-tuned  WAL journal, tuned pragmas (SQLITE_PRAGMAS), busy timeout and persistent connections
+#   postgres      persistent connections (CONN_MAX_AGE); POSTGRES_POOLER=pgbouncer when connecting
+#                 through a transaction pooler, which can not keep server side cursors open
+
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    },
+    'sqlite-tuned': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'OPTIONS': {
+            # seconds a writer waits for the lock before "database is locked"
+            'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'myhostel'),
+        'USER': os.environ.get('POSTGRES_USER', 'myhostel'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_POOLER') == 'pgbouncer',
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    },
+}
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
 
 DATABASES = {
+    'default': DATABASE_PROFILES[DB_PROFILE],
+}
+
+# run on every new sqlite connection of the sqlite-tuned profile, see mainapp.signals
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+} if DB_PROFILE == 'sqlite-tuned' else {}
+
+# start sqlite transactions with BEGIN IMMEDIATE: writers queue on the busy timeout for the write lock
+# up front, instead of failing with "database is locked" when a read transaction tries to start writing
+SQLITE_IMMEDIATE_TRANSACTIONS = DB_PROFILE == 'sqlite-tuned'
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# 'objects' backs the read-through object cache of hostels and employees.
+# OBJECT_CACHE_BACKEND=file shares it between processes through LRU evicted files.
+
+OBJECT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'objects',
+    },
+    'file': {
+        'BACKEND': 'mainapp.cache.LRUFileBasedCache',
+        'LOCATION': os.environ.get('OBJECT_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'myhostel_objects')),
+    },
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'objects': {
+        **OBJECT_CACHE_BACKENDS[os.environ.get('OBJECT_CACHE_BACKEND', 'locmem')],
+        'TIMEOUT': int(os.environ.get('OBJECT_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('OBJECT_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+
+# Async views
+# database work of the async/ endpoints runs on a thread pool of this size
+
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 16))
+
+
+# Room sweeper
+# every ROOM_SWEEP_INTERVAL seconds a thread sets reserved rooms whose bookings have all ended
+# back to vacant, ROOM_SWEEP_BATCH_SIZE rooms per transaction. 0 leaves it to the release_rooms command.
+
+ROOM_SWEEP_INTERVAL = int(os.environ.get('ROOM_SWEEP_INTERVAL', 0))
+ROOM_SWEEP_BATCH_SIZE = int(os.environ.get('ROOM_SWEEP_BATCH_SIZE', 500))
+
+
+# Idempotency keys
+# responses to booking/ and payment/ POSTs sent with an Idempotency-Key header are replayed
+# to the client that sent them for IDEMPOTENCY_KEY_TTL seconds, expired keys are purged every
+# IDEMPOTENCY_PURGE_INTERVAL seconds (0: never). a request still in progress holds its key for
+# IDEMPOTENCY_LOCK_TIMEOUT seconds at most, then a retry takes it over.
+
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', 600))
+
+
+# Throttling
+# every client (by address) gets a token bucket per url name below: it holds up to burst requests
+# and refills rate requests a second. a budget with methods only counts those, so booking/ and
+# payment/ listings are free; a budget that shares another takes from its bucket, booking updates
+# and batches count against the bookings a client makes. other routes are not throttled.
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ['mainapp.throttling.TokenBucketThrottle'],
+}
+
+THROTTLE_BUDGETS = {
+    'List_Vacant_Rooms': {'rate': 20, 'burst': 100},
+    'Async_List_Vacant_Rooms': {'rate': 20, 'burst': 100},
+    'Do_Booking': {'rate': 5, 'burst': 30, 'methods': ['POST']},
+    'Do_Batch_Booking': {'shares': 'Do_Booking', 'methods': ['POST']},
+    'Get_Booking_Details': {'shares': 'Do_Booking', 'methods': ['PUT']},
+    'Do_Payment': {'rate': 5, 'burst': 30, 'methods': ['POST']},
 }
+THROTTLE_MAX_BUCKETS = int(os.environ.get('THROTTLE_MAX_BUCKETS', 10000))
 
 
 # Password validation
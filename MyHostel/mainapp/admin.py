@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Employee, Hostel, Payment, Transcation, Room, Booking
+from .models import Student, Employee, Hostel, HostelOccupancy, Payment, Transcation, Room, Booking
 
 # Register your models here.
 admin.site.register(Student)
@@ -9,3 +9,4 @@ admin.site.register(Hostel)
 admin.site.register(Employee)
 admin.site.register(Payment)
 admin.site.register(Transcation)
+admin.site.register(HostelOccupancy)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MainappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainapp'
+
+    def ready(self):
+        from . import signals
+        from .sweeper import start_sweeper
+        self.sweeper = start_sweeper()
@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections
+from django.http import Http404, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+from rest_framework.request import Request
+from .cache import object_cache
+from .models import Booking, Hostel, Payment, Room
+from .serializers import (
+    CreateHostelSerializer,
+    GetBookingSerializer,
+    PaymentSerializer,
+    RoomSerializer,
+    BookingValuesSerializer,
+    PaymentValuesSerializer,
+    requested_fields
+)
+from .throttling import TokenBucketThrottle
+from .views import ModelsPagination, GetVacantRooms, PaymentView, no_vacant_rooms
+
+
+# Create your async api views here.
+
+"""
+    database work of the async views runs on this bounded pool, so a slow query holds one
+    of ASYNC_DB_POOL_SIZE threads instead of the event loop, and requests beyond the pool size
+    queue up instead of opening more database connections.
+"""
+db_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_DB_POOL_SIZE', 16),
+    thread_name_prefix='async-db'
+)
+
+
+def in_db_thread(func, *args, **kwargs):
+    """ run func on a pool thread, dropping its connection when CONN_MAX_AGE says so, like a request would """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args, **kwargs):
+    """ await a blocking database call on the pool, in the context of the request (for its metrics) """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, context.run, partial(in_db_thread, func, *args, **kwargs))
+
+
+def async_api_view(view):
+    """ throttle like the DRF views and render the DRF exceptions raised by an async view the way DRF views do """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'detail' : f'Method "{request.method}" not allowed.'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            request = Request(request)
+            throttle = TokenBucketThrottle()
+            if not throttle.allow_request(request, None):
+                raise Throttled(throttle.wait())
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail' : exc.detail}
+            response = JsonResponse(data, status=exc.status_code, safe=False)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+        except Http404:
+            return JsonResponse({'detail' : 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return wrapper
+
+
+def paginated_data(queryset, request, serialize):
+    """ one page of queryset, same body as ModelsPagination.get_paginated_response """
+    paginator = ModelsPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return {
+        'next' : paginator.get_next_link(),
+        'previous' : paginator.get_previous_link(),
+        'results' : serialize(page)
+    }
+
+
+def object_data(queryset, serialize):
+    """ the single object list of a pk lookup, the pk is unique so one query answers it """
+    rows = serialize(queryset)
+    if not rows:
+        raise ValidationError({
+            'failed' : True,
+            'error' : 'Object Does not exist'
+        })
+    return rows
+
+
+def read_path(queryset, serializer_class, values_serializer_class, lite, fields=None):
+    """ the queryset to read and how to serialize its rows, lite reads values() dicts; fields is a sparse fieldset """
+    if lite:
+        return values_serializer_class.values(queryset, fields), lambda rows: values_serializer_class(rows, fields).data
+    return serializer_class.sparse_queryset(queryset, fields), \
+        lambda rows: serializer_class(rows, many=True, fields=fields).data
+
+
+@async_api_view
+async def getVacantRooms(request):
+    """
+        async GetVacantRooms: the emptiness checks and the page query are independent,
+        so they run concurrently and the page is thrown away if a check fails.
+    """
+    view = GetVacantRooms(request=request, kwargs={}, format_kwarg=None)
+    room_price_limit = view.get_price_limit()
+    stay_dates = view.get_stay_dates()
+    fields = requested_fields(request.query_params, RoomSerializer)
+    serialize = lambda page: RoomSerializer(page, many=True, fields=fields).data
+
+    if stay_dates is not None:
+        queryset = RoomSerializer.sparse_queryset(
+            Room.objects.available(stay_dates['check_in_date'], stay_dates['check_out_date']), fields)
+        if room_price_limit is None:
+            data = await run_db(paginated_data, queryset, request, serialize)
+            return JsonResponse(data)
+        queryset = queryset.filter(price__lte=room_price_limit)
+        has_rooms, data = await asyncio.gather(
+            run_db(queryset.exists), run_db(paginated_data, queryset, request, serialize))
+        if not has_rooms:
+            raise ValidationError(f'There are no vacant rooms below {room_price_limit}')
+        return JsonResponse(data)
+
+    queryset = RoomSerializer.sparse_queryset(Room.objects.filter(status='vacant'), fields)
+    if room_price_limit is not None:
+        queryset = queryset.filter(price__lte=room_price_limit)
+    """ the vacant room index only touches the database when it has to be (re)loaded or finds no room """
+    vacant = Room.objects.filter(status='vacant')
+    checks = lambda: (no_vacant_rooms(vacant), room_price_limit is not None and
+        no_vacant_rooms(vacant.filter(price__lte=room_price_limit), room_price_limit))
+    (all_occupied, none_under_limit), data = await asyncio.gather(
+        run_db(checks), run_db(paginated_data, queryset, request, serialize))
+    if all_occupied:
+        raise ValidationError({
+            'room-count' : 0,
+            'error' : 'Sorry, all rooms are occupied. Please try later..'
+            })
+    if none_under_limit:
+        raise ValidationError(f'There are no vacant rooms below {room_price_limit}')
+    return JsonResponse(data)
+
+
+@async_api_view
+async def getHostelDetails(request, pk):
+    """ async GetHostelDetails, read through the object cache """
+    fields = requested_fields(request.query_params, CreateHostelSerializer)
+
+    def hostel_data():
+        try:
+            return CreateHostelSerializer(object_cache.get(Hostel.objects.all(), pk), fields=fields).data
+        except ObjectDoesNotExist:
+            raise Http404
+    return JsonResponse(await run_db(hostel_data))
+
+
+@async_api_view
+async def getBookings(request, pk=None):
+    """ async DoBooking.get, pass lite=true for the values based read path and fields=a,b for a sparse fieldset """
+    lite = request.query_params.get('lite') == 'true'
+    fields = requested_fields(request.query_params, GetBookingSerializer)
+    booking_qs, serialize = read_path(
+        Booking.objects.select_related('student', 'room'), GetBookingSerializer, BookingValuesSerializer, lite, fields)
+    if pk is not None:
+        data = await run_db(object_data, booking_qs.filter(booking_id=pk), serialize)
+        return JsonResponse(data, safe=False)
+
+    room_price_limit = request.query_params.get('price_limit', None)
+    if room_price_limit:
+        try:
+            booking_qs = booking_qs.filter(room__price__lte=int(room_price_limit))
+        except ValueError:
+            raise ValidationError({'price_limit' : 'Price limit should be a number'})
+    return JsonResponse(await run_db(paginated_data, booking_qs, request, serialize))
+
+
+@async_api_view
+async def getPayments(request, pk=None):
+    """ async PaymentView.get, pass lite=true for the values based read path and fields=a,b for a sparse fieldset """
+    lite = request.query_params.get('lite') == 'true'
+    fields = requested_fields(request.query_params, PaymentSerializer)
+    payment_qs, serialize = read_path(
+        Payment.objects.select_related('student', 'booking__room'), PaymentSerializer, PaymentValuesSerializer, lite, fields)
+    if pk is not None:
+        data = await run_db(object_data, payment_qs.filter(payment_id=pk), serialize)
+        return JsonResponse(data, safe=False)
+
+    payment_mode = request.query_params.get('payment_mode', None)
+    if payment_mode:
+        if payment_mode.lower() not in PaymentView.PAYMENTMODES:
+            raise ValidationError('Invalid payment mode passed')
+        payment_qs = payment_qs.filter(payment_mode__iexact=payment_mode)
+    return JsonResponse(await run_db(paginated_data, payment_qs, request, serialize))
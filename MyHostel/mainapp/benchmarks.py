@@ -0,0 +1,120 @@
+import io
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from django.db import connection, transaction
+
+
+@contextmanager
+def benchmark_database(verbosity=0, test_name=None):
+    """
+        run against a throwaway test database, so benchmarks never touch real data.
+        test_name overrides the TEST NAME of the database, e.g. a file instead of sqlite's in-memory default.
+    """
+    if test_name is not None:
+        connection.settings_dict['TEST'] = dict(connection.settings_dict.get('TEST') or {}, NAME=test_name)
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+
+
+@contextmanager
+def rolled_back():
+    """ undo whatever the block writes, so a write benchmark leaves the dataset as it was """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def git_revision():
+    """ the commit being benchmarked, None outside a git checkout """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_stats(timings):
+    """ mean and percentiles of a list of timings in milliseconds """
+    timings = sorted(timings)
+    return {
+        'calls' : len(timings),
+        'mean_ms' : round(statistics.mean(timings), 4),
+        'p50_ms' : round(timings[len(timings) // 2], 4),
+        'p95_ms' : round(timings[max(int(len(timings) * 0.95) - 1, 0)], 4),
+    }
+
+
+def time_calls(func, repeat, setup=None):
+    """
+        call func repeat times, return latency stats in milliseconds.
+        setup runs untimed before each call and its result is passed to func.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        started = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return latency_stats(timings)
+
+
+def wsgi_get(handler, path, query_string=''):
+    """ GET path from a WSGI application in process, return the status code """
+    environ = {
+        'REQUEST_METHOD' : 'GET',
+        'PATH_INFO' : path,
+        'QUERY_STRING' : query_string,
+        'SERVER_NAME' : 'localhost',
+        'SERVER_PORT' : '80',
+        'HTTP_HOST' : 'localhost',
+        'SERVER_PROTOCOL' : 'HTTP/1.1',
+        'wsgi.version' : (1, 0),
+        'wsgi.url_scheme' : 'http',
+        'wsgi.input' : io.BytesIO(),
+        'wsgi.errors' : sys.stderr,
+        'wsgi.multithread' : True,
+        'wsgi.multiprocess' : False,
+        'wsgi.run_once' : False,
+    }
+    statuses = []
+    body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path, query_string=''):
+    """ GET path from an ASGI application in process, return the status code """
+    scope = {
+        'type' : 'http',
+        'asgi' : {'version' : '3.0'},
+        'http_version' : '1.1',
+        'method' : 'GET',
+        'scheme' : 'http',
+        'path' : path,
+        'raw_path' : path.encode(),
+        'query_string' : query_string.encode(),
+        'headers' : [(b'host', b'localhost')],
+        'server' : ('localhost', 80),
+        'client' : ('127.0.0.1', 0),
+    }
+    messages = []
+
+    async def receive():
+        return {'type' : 'http.request', 'body' : b'', 'more_body' : False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return next(message['status'] for message in messages if message['type'] == 'http.response.start')
@@ -0,0 +1,83 @@
+import os
+import threading
+from collections import Counter
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """
+        file based cache that evicts the least recently used entries.
+        every read touches the file, and culling removes the files with the oldest access time.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        if value is not default:
+            try:
+                os.utime(self._key_to_file(key, version))
+            except FileNotFoundError:
+                pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+        filelist.sort(key=lambda fname: os.stat(fname).st_mtime if os.path.exists(fname) else 0)
+        for fname in filelist[:num_entries // self._cull_frequency]:
+            self._delete(fname)
+
+
+class ObjectCache:
+    """
+        read-through cache of model instances by primary key.
+        entries live in the 'objects' cache (TTL and LRU eviction come from its backend)
+        and are deleted by the save/delete signals of the cached models.
+    """
+
+    def __init__(self, alias='objects'):
+        self.alias = alias
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(model, pk):
+        return f'{model._meta.label_lower}:{pk}'
+
+    def get(self, queryset, pk):
+        """ the instance of queryset with this pk, from the cache or else from the database """
+        model = queryset.model
+        key = self.make_key(model, pk)
+        instance = self.cache.get(key)
+        self.count(model, 'hits' if instance is not None else 'misses')
+        if instance is None:
+            instance = queryset.get(pk=pk)
+            self.cache.set(key, instance)
+        return instance
+
+    def invalidate(self, model, *pks):
+        self.cache.delete_many([self.make_key(model, pk) for pk in pks])
+
+    def count(self, model, outcome):
+        with self.lock:
+            self.counters[(model._meta.label_lower, outcome)] += 1
+
+    def stats(self):
+        """ {model: {'hits': n, 'misses': n}} counted by this process """
+        with self.lock:
+            counters = dict(self.counters)
+        stats = {}
+        for (label, outcome), value in counters.items():
+            stats.setdefault(label, {'hits': 0, 'misses': 0})[outcome] = value
+        return stats
+
+
+object_cache = ObjectCache()
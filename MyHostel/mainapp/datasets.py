@@ -0,0 +1,122 @@
+import random
+from datetime import timedelta
+from itertools import islice
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import (
+    Booking, Employee, Hostel, HostelOccupancy, LedgerDailySummary, ModelVersion, Payment, Room, Student, Transcation
+)
+from .search import search_index
+from .vacancy import vacant_rooms
+
+DATASET_SIZES = {
+    'small' : {'hostels' : 10, 'rooms' : 500, 'students' : 5000, 'bookings' : 20000},
+    'medium' : {'hostels' : 50, 'rooms' : 2500, 'students' : 50000, 'bookings' : 200000},
+    'large' : {'hostels' : 100, 'rooms' : 10000, 'students' : 200000, 'bookings' : 1000000},
+}
+FIRST_NAMES = ('Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan',
+    'Ananya', 'Diya', 'Priya', 'Kavya', 'Meera', 'Saanvi', 'Aadhya', 'Isha', 'Riya', 'Nisha')
+CITIES = ('Bangalore', 'Hyderabad', 'Chennai', 'Pune', 'Mumbai', 'Delhi', 'Kolkata', 'Kochi')
+
+
+def bulk_insert(model, objects, batch_size):
+    """ bulk_create an iterable batch_size objects at a time, never holding more than one batch """
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def insert_rows(model, field_names, rows, batch_size):
+    """
+        executemany database ready tuples straight into the table of model, batch_size rows at a time.
+        for the million row tables: building a model instance per row costs far more than the insert.
+    """
+    fields = [model._meta.get_field(field_name) for field_name in field_names]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            cursor.executemany(sql, batch)
+
+
+def generate_dataset(hostels, rooms, students, bookings, seed=1, batch_size=5000):
+    """
+        fill an empty database with a reproducible dataset: the same sizes and seed give the same rows.
+        every room gets an unbroken history of non overlapping stays ending around today, each booking
+        is paid for and recorded in the ledger by the hostel's warden, rooms with a stay in progress are reserved, and the occupancy counters and search index are rebuilt.
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    with transaction.atomic():
+        bulk_insert(Hostel, (
+            Hostel(name=f'{CITIES[i % len(CITIES)]} Hostel {i}', address=f'{i} Main Road, {CITIES[i % len(CITIES)]}',
+                phone_no=f'6{i:09d}', manager_id=i + 1, room_limit=100)
+            for i in range(hostels)
+        ), batch_size)
+        hostel_ids = list(Hostel.objects.order_by('pk').values_list('pk', flat=True))
+        bulk_insert(Employee, (
+            Employee(first_name=FIRST_NAMES[i % len(FIRST_NAMES)], last_name=f'Warden {i}', address='Staff Quarters',
+                phone_no=f'7{i:09d}', email_address=f'warden{i}@myhostel.test', hostel_id=hostel_id)
+            for i, hostel_id in enumerate(hostel_ids)
+        ), batch_size)
+        """ rooms fill the hostels in turn, so no hostel goes past its room limit of 100 """
+        bulk_insert(Room, (
+            Room(hostel_id=hostel_ids[i % len(hostel_ids)], description=f'Room {i}',
+                price=rng.randrange(1000, 10000, 100))
+            for i in range(rooms)
+        ), batch_size)
+        room_ids = list(Room.objects.order_by('pk').values_list('pk', flat=True))
+        bulk_insert(Student, (
+            Student(first_name=FIRST_NAMES[i % len(FIRST_NAMES)], last_name=f'Student {i}',
+                address=CITIES[rng.randrange(len(CITIES))], phone_no=f'8{i:09d}')
+            for i in range(students)
+        ), batch_size)
+        student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+        insert_rows(Booking, ('student', 'room', 'booking_date', 'check_in_date', 'check_out_date', 'no_of_nights'),
+            generate_bookings(rng, room_ids, student_ids, bookings, today), batch_size)
+        Room.objects.filter(pk__in=Booking.objects.filter(check_out_date__gt=today).values('room')).update(
+            status='reserved')
+        paid_at = Payment._meta.get_field('payment_datetime').get_db_prep_save(timezone.now(), connection)
+        insert_rows(Payment, ('student', 'booking', 'payment_mode', 'payment_datetime'), (
+            (student_id, booking_id, 'online' if rng.random() < 0.6 else 'cash', paid_at)
+            for booking_id, student_id in Booking.objects.order_by('pk').values_list('pk', 'student').iterator()
+        ), batch_size)
+        wardens = dict(Employee.objects.values_list('hostel', 'pk'))
+        insert_rows(Transcation, ('student', 'booking', 'payment', 'employee', 'hostel', 'amount', 'created_at'), (
+            (student_id, booking_id, payment_id, wardens[hostel_id], hostel_id, amount, paid_at)
+            for payment_id, student_id, booking_id, hostel_id, amount in Payment.objects.with_totals().order_by(
+                'pk').values_list('pk', 'student', 'booking', 'booking__room__hostel', 'total_amount').iterator()
+        ), batch_size)
+        HostelOccupancy.objects.rebuild()
+        LedgerDailySummary.objects.rebuild()
+        ModelVersion.objects.bump(Hostel, Employee, Room, Student, Booking, Payment)
+        search_index.rebuild(batch_size=batch_size)
+        transaction.on_commit(vacant_rooms.invalidate)
+
+
+def generate_bookings(rng, room_ids, student_ids, count, today):
+    """
+        rows of count bookings spread evenly over the rooms, each room's stays walking back from around today.
+        booked on today, as Booking.booking_date would be.
+    """
+    adapt_date = connection.ops.adapt_datefield_value
+    booking_date = adapt_date(today)
+    per_room, extra = divmod(count, len(room_ids))
+    for position, room_id in enumerate(room_ids):
+        check_out_date = today + timedelta(days=rng.randrange(-3, 5))
+        for _ in range(per_room + (position < extra)):
+            no_of_nights = rng.randint(1, 7)
+            check_in_date = check_out_date - timedelta(days=no_of_nights)
+            yield (student_ids[rng.randrange(len(student_ids))], room_id, booking_date,
+                adapt_date(check_in_date), adapt_date(check_out_date), no_of_nights)
+            check_out_date = check_in_date - timedelta(days=rng.randrange(0, 4))
@@ -0,0 +1,46 @@
+import hashlib
+from functools import wraps
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from .models import ModelVersion
+
+
+def versions_etag(*model_classes):
+    """
+        etag_func over the change counters of model_classes and the full path, so different
+        filters or pages of a view get different ETags. computing it is one query.
+        None while a counter missed a bump, an ETag would then stay the same over a change.
+    """
+    def etag(request, *args, **kwargs):
+        if ModelVersion.objects.is_stale(*model_classes):
+            return None
+        versions = ModelVersion.objects.current(*model_classes)
+        key = f'{request.get_full_path()}|{",".join(map(str, versions))}'
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+    return etag
+
+
+def conditional_get(*model_classes):
+    """
+        method decorator for the get of an APIView: a GET whose If-None-Match matches
+        gets 304 without the view running any other query or serializer.
+        only 200 responses carry the ETag, so a 404 or 400 can never be answered with 304 later.
+    """
+    etag_func = versions_etag(*model_classes)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = etag_func(request, *args, **kwargs)
+            if etag is None:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(etag)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return method_decorator(decorator)
@@ -0,0 +1,105 @@
+import csv
+import gzip
+import json
+import os
+from datetime import datetime, time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Booking, Payment, Student, Transcation
+
+
+class Export:
+    """ one exported table: the queryset, the columns read with values_list() and the --since filter """
+
+    def __init__(self, queryset, columns, since_filter):
+        self.queryset = queryset
+        self.columns = columns
+        self.since_filter = since_filter
+
+    def rows(self, since=None, chunk_size=2000):
+        """
+            stream tuples in primary key order. iterator() fetches chunk_size rows at a time
+            (through a server side cursor on postgresql), so memory stays flat whatever the table size.
+        """
+        queryset = self.queryset()
+        if since is not None:
+            queryset = self.since_filter(queryset, since)
+        return queryset.order_by('pk').values_list(*self.columns).iterator(chunk_size=chunk_size)
+
+
+def start_of_day(day):
+    """ midnight of day in the current time zone: a range from it can use the index of a datetime column, unlike __date """
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def students_since(queryset, since):
+    """ students have no date of their own, export the ones who booked since then """
+    return queryset.filter(Exists(Booking.objects.filter(student=OuterRef('pk'), booking_date__gte=since)))
+
+
+EXPORTS = {
+    'bookings' : Export(
+        Booking.objects.all,
+        ('booking_id', 'student_id', 'room_id', 'booking_date', 'check_in_date', 'check_out_date', 'no_of_nights'),
+        lambda queryset, since: queryset.filter(booking_date__gte=since)
+    ),
+    'payments' : Export(
+        Payment.objects.with_totals,
+        ('payment_id', 'student_id', 'booking_id', 'payment_mode', 'payment_datetime', 'total_amount'),
+        lambda queryset, since: queryset.filter(payment_datetime__gte=start_of_day(since))
+    ),
+    'students' : Export(
+        Student.objects.all,
+        ('student_id', 'first_name', 'last_name', 'address', 'phone_no'),
+        students_since
+    ),
+    'transactions' : Export(
+        Transcation.objects.all,
+        ('transaction_id', 'student_id', 'booking_id', 'payment_id', 'employee_id', 'hostel_id', 'amount', 'created_at'),
+        lambda queryset, since: queryset.filter(created_at__gte=start_of_day(since))
+    ),
+}
+FORMATS = ('csv', 'ndjson')
+
+
+def write_csv(stream, columns, rows):
+    writer = csv.writer(stream)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_ndjson(stream, columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    count = 0
+    for row in rows:
+        stream.write(encoder.encode(dict(zip(columns, row))))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+WRITERS = {'csv' : write_csv, 'ndjson' : write_ndjson}
+
+
+def export_table(name, directory, file_format='csv', since=None, chunk_size=2000, compresslevel=6):
+    """
+        write one table to <directory>/<name>.<format>.gz and return (path, row count).
+        the dump goes to a temporary file first, so a failed run never leaves a truncated export behind.
+    """
+    export = EXPORTS[name]
+    path = os.path.join(directory, f'{name}.{file_format}.gz')
+    partial_path = f'{path}.partial'
+    try:
+        with gzip.open(partial_path, 'wt', compresslevel=compresslevel, newline='', encoding='utf-8') as stream:
+            count = WRITERS[file_format](stream, export.columns, export.rows(since, chunk_size))
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return path, count
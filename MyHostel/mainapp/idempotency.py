@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import close_old_connections, transaction, IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+""" expired records are deleted on this single thread, off the request path """
+purge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='idempotency-purge')
+purge_lock = threading.Lock()
+last_purge = time.monotonic()
+
+
+def request_fingerprint(request):
+    """ sha256 of the parsed request body, to tell a retry from another request reusing the key """
+    data = dict(request.data.lists()) if hasattr(request.data, 'lists') else request.data
+    body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def client_of(request):
+    """ the signed in user, else the address as the throttles see it; a key only replays to the client that sent it """
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return BaseThrottle().get_ident(request)
+
+
+def claim(client, key, endpoint, fingerprint):
+    """
+        insert the in progress record of key, return (record, True) if claimed else (existing record, False).
+        an in progress claim holds the key for IDEMPOTENCY_LOCK_TIMEOUT seconds only: once that lease
+        runs out its worker is taken for dead and a retry of the same request claims the key over.
+    """
+    now = timezone.now()
+    ttl = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+    lease = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 30))
+    records = IdempotencyRecord.objects.filter(client=client, key=key, endpoint=endpoint)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(client=client, key=key, endpoint=endpoint,
+                    fingerprint=fingerprint, locked_until=now + lease, expires_at=now + ttl)
+            return record, True
+        except IntegrityError:
+            record = records.first()
+            if record is None:
+                """ purged in between, claim again """
+                continue
+            if record.expires_at <= now:
+                """ expired but not purged yet, the key is free again """
+                records.filter(pk=record.pk, expires_at__lte=now).delete()
+                continue
+            if record.status_code is None and record.fingerprint == fingerprint and \
+                    (record.locked_until is None or record.locked_until <= now):
+                """ the lease of the first request ran out, take its claim over unless another retry just did """
+                if records.filter(pk=record.pk, status_code=None, locked_until=record.locked_until).update(
+                        locked_until=now + lease, expires_at=now + ttl):
+                    record.locked_until = now + lease
+                    return record, True
+                continue
+            return record, False
+    return records.first(), False
+
+
+def replay(record, fingerprint):
+    """ the response to a repeated key """
+    if record.fingerprint != fingerprint:
+        return Response({'Idempotency-Key' : 'This key was already used with a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return Response({'Idempotency-Key' : 'A request with this key is still being processed'},
+            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+    return Response(json.loads(record.response_body), status=record.status_code,
+        headers={'Idempotent-Replayed': 'true'})
+
+
+def is_final(response):
+    """ conflicts, throttling and server errors are worth retrying, so they are not replayed """
+    return response.status_code < 500 and response.status_code not in (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def idempotent(method):
+    """
+        honour an Idempotency-Key header on an APIView POST handler.
+        the first request with a key claims it with a unique insert and stores its response;
+        a retry with the same key and body from the same client gets the stored response back, without
+        running the handler or touching the booking and payment tables. records expire after IDEMPOTENCY_KEY_TTL.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return method(self, request, *args, **kwargs)
+        if not key or len(key) > 255:
+            return Response({'Idempotency-Key' : 'Should be between 1 and 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST)
+        endpoint = request.resolver_match.url_name
+        fingerprint = request_fingerprint(request)
+        record, claimed = claim(client_of(request), key, endpoint, fingerprint)
+        if not claimed:
+            return replay(record, fingerprint)
+
+        """ only while the claim is still ours, a worker whose lease ran out must not overwrite its successor """
+        held = IdempotencyRecord.objects.filter(pk=record.pk, locked_until=record.locked_until)
+        try:
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception as exc:
+                """ render API errors here, as dispatch would, so they are stored too """
+                response = self.handle_exception(exc)
+        except BaseException:
+            held.delete()
+            raise
+        if is_final(response):
+            held.update(status_code=response.status_code, response_body=json.dumps(response.data, cls=JSONEncoder))
+        else:
+            held.delete()
+        schedule_purge()
+        return response
+    return wrapper
+
+
+def purge():
+    close_old_connections()
+    try:
+        purged = IdempotencyRecord.objects.purge_expired()
+        logger.info('purged %s expired idempotency keys', purged)
+    except Exception:
+        logger.exception('idempotency key purge failed')
+    finally:
+        close_old_connections()
+
+
+def schedule_purge():
+    """ purge expired records in the background, at most once every IDEMPOTENCY_PURGE_INTERVAL seconds """
+    global last_purge
+    interval = getattr(settings, 'IDEMPOTENCY_PURGE_INTERVAL', 600)
+    if not interval:
+        return
+    with purge_lock:
+        if time.monotonic() - last_purge < interval:
+            return
+        last_purge = time.monotonic()
+    purge_executor.submit(purge)
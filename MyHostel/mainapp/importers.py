@@ -0,0 +1,295 @@
+import csv
+import time
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from .models import Employee, Hostel, HostelOccupancy, ModelVersion, Room, Student, violated_constraint
+from .search import search_index
+from .vacancy import vacant_rooms
+
+
+def null_fields(constraint):
+    """ fields the condition of a unique constraint requires NULL, Q(field__isnull=True) is the only condition used """
+    if constraint.condition is None:
+        return ()
+    return tuple(lookup[:-len('__isnull')] for lookup, value in constraint.condition.children)
+
+
+class ImportReport:
+    """ outcome of an import: rows created, per row errors and throughput """
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0
+
+    def add_error(self, line, errors):
+        self.errors.append({'line' : line, 'errors' : errors})
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.errors.sort(key=lambda error: error['line'])
+
+    @property
+    def rows(self):
+        return self.created + len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed) if self.elapsed else 0
+
+    def as_dict(self):
+        return {
+            'rows' : self.rows,
+            'created' : self.created,
+            'failed' : len(self.errors),
+            'seconds' : round(self.elapsed, 3),
+            'rows_per_second' : self.rows_per_second,
+            'errors' : self.errors
+        }
+
+
+class CSVImporter:
+    """
+        stream rows of a CSV into bulk_create, batch_size rows at a time.
+        a batch costs a fixed number of queries whatever its size:
+        field validators (PHONE_NO_REGEX, max lengths, choices) run in python with clean_fields(),
+        each unique constraint is checked with one IN query, and the valid rows go in with bulk_create.
+    """
+    model = None
+    columns = ()
+    related_fields = ()
+    """ SearchIndex kind of the model, None when it is not searchable """
+    search_kind = None
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        """ (fields, nulls) of each unique constraint, nulls are the fields its condition requires NULL """
+        self.unique_fields = [
+            (tuple(constraint.fields), null_fields(constraint)) for constraint in self.model._meta.constraints
+            if isinstance(constraint, models.UniqueConstraint)
+        ]
+        """ unique values of the rows already imported, to catch duplicates within the file """
+        self.seen = {unique: set() for unique in self.unique_fields}
+
+    def missing_columns(self, fieldnames):
+        return [column for column in self.columns if column not in (fieldnames or ())]
+
+    def run(self, lines):
+        """ import an iterable of CSV lines, return the ImportReport """
+        report = ImportReport()
+        reader = csv.DictReader(lines)
+        missing = self.missing_columns(reader.fieldnames)
+        if missing:
+            raise ValidationError(f'CSV is missing the columns {", ".join(missing)}')
+        """ line 1 is the header """
+        rows = enumerate(reader, start=2)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch, report)
+        report.finish()
+        return report
+
+    def import_batch(self, batch, report):
+        instances = {}
+        for line, row in batch:
+            try:
+                instances[line] = self.build(row)
+            except ValidationError as exc:
+                report.add_error(line, exc.message_dict)
+        try:
+            with transaction.atomic():
+                for line, errors in self.check_unique(instances).items():
+                    report.add_error(line, errors)
+                    instances.pop(line)
+                for line, errors in self.check_batch(instances).items():
+                    report.add_error(line, errors)
+                    instances.pop(line)
+                self.model.objects.bulk_create(instances.values(), batch_size=self.batch_size)
+                if instances:
+                    ModelVersion.objects.bump(self.model)
+                self.after_create(list(instances.values()))
+                self.index_for_search(list(instances.values()))
+        except IntegrityError as exc:
+            """ a concurrent writer took one of the unique values after the batch was checked """
+            constraint = violated_constraint(exc, self.model)
+            for line in instances:
+                report.add_error(line, {'non_field_errors' : [f'Conflicts with a concurrent write ({constraint})']})
+            return
+        for (fields, nulls), seen in self.seen.items():
+            seen.update(self.unique_key(instance, fields, nulls) for instance in instances.values())
+        report.created += len(instances)
+
+    def build(self, row):
+        """ an unsaved instance from a CSV row, validated without any query """
+        values = {
+            column: (row.get(column) or '').strip() or None
+            for column in self.columns if column not in self.related_fields
+        }
+        instance = self.model(**values)
+        errors = {}
+        for field_name in self.related_fields:
+            try:
+                setattr(instance, f'{field_name}_id', int(row.get(field_name) or ''))
+            except ValueError:
+                errors[field_name] = ['A valid integer is required.']
+        try:
+            instance.clean_fields(exclude=self.related_fields)
+        except ValidationError as exc:
+            errors.update(exc.message_dict)
+        errors.update(self.validate(instance))
+        if errors:
+            raise ValidationError(errors)
+        return instance
+
+    def validate(self, instance):
+        """ extra field checks, {field: [errors]} """
+        return {}
+
+    def check_unique(self, instances):
+        """ one query per unique constraint for the whole batch, returns {line: errors} """
+        errors = {}
+        for fields, nulls in self.unique_fields:
+            keys = {line: self.unique_key(instance, fields, nulls) for line, instance in instances.items()}
+            keys = {line: key for line, key in keys.items() if key is not None}
+            existing = set(
+                self.model.objects.filter(**{
+                    f'{field}__in': {key[position] for key in keys.values()}
+                    for position, field in enumerate(fields)
+                }, **{f'{field}__isnull': True for field in nulls}).order_by().values_list(*fields)
+            ) if keys else set()
+            batch_keys = set()
+            for line, key in keys.items():
+                if key in existing or key in self.seen[fields, nulls] or key in batch_keys:
+                    errors.setdefault(line, {}).update(self.unique_error(fields + nulls))
+                batch_keys.add(key)
+        return errors
+
+    def unique_key(self, instance, fields, nulls):
+        """ the values of instance a unique constraint keeps apart, None if the constraint does not cover it """
+        key = tuple(getattr(instance, field) for field in fields)
+        """ NULLs never clash in a unique constraint, a conditional one only covers rows with its nulls NULL """
+        if None in key or any(getattr(instance, field) is not None for field in nulls):
+            return None
+        return key
+
+    def unique_error(self, fields):
+        verbose_name = self.model._meta.verbose_name.capitalize()
+        if len(fields) == 1:
+            field = self.model._meta.get_field(fields[0])
+            return {fields[0] : [f'{verbose_name} with this {field.verbose_name} already exists']}
+        return {'non_field_errors' : [f'{verbose_name} already exists']}
+
+    def check_batch(self, instances):
+        """ checks against the database for the whole batch, returns {line: errors} """
+        return {}
+
+    def after_create(self, instances):
+        """ keep derived data in step with the rows just inserted, same transaction """
+
+    def index_for_search(self, instances):
+        """ bulk_create skips the post_save signal, index the new rows found by their unique phone number """
+        if self.search_kind and instances:
+            search_index.index(self.search_kind,
+                self.model.objects.filter(phone_no__in=[instance.phone_no for instance in instances]))
+
+
+def check_hostels_exist(instances):
+    """ one query for the hostels referenced by a batch, returns {line: errors} for unknown ones """
+    hostel_ids = set(Hostel.objects.filter(
+        pk__in={instance.hostel_id for instance in instances.values()}).values_list('pk', flat=True))
+    return {
+        line: {'hostel' : ['Hostel does not exist']}
+        for line, instance in instances.items() if instance.hostel_id not in hostel_ids
+    }
+
+
+class HostelImporter(CSVImporter):
+    model = Hostel
+    search_kind = 'hostel'
+    columns = ('name', 'address', 'phone_no', 'manager_id', 'room_limit')
+
+    def after_create(self, instances):
+        """ bulk_create skips Hostel.save, so count the new hostels from scratch """
+        names = [instance.name for instance in instances]
+        if names:
+            HostelOccupancy.objects.rebuild(Hostel.objects.filter(name__in=names).values_list('pk', flat=True))
+
+
+class RoomImporter(CSVImporter):
+    model = Room
+    columns = ('hostel', 'description', 'price', 'status')
+    related_fields = ('hostel',)
+
+    def build(self, row):
+        if not (row.get('status') or '').strip():
+            row = dict(row, status='vacant')
+        return super().build(row)
+
+    def validate(self, instance):
+        """ same rule as RoomSerializer.validate_price """
+        if instance.price is not None and instance.price <= 0:
+            return {'price' : ['Price cannot be lesser than 0']}
+        return {}
+
+    def check_batch(self, instances):
+        """
+            unknown hostels, and rooms past Hostel.room_limit.
+            the hostel rows are locked so concurrent imports can not both take the last places,
+            and the rooms a hostel already has come from its occupancy counter.
+        """
+        errors = check_hostels_exist(instances)
+        hostel_ids = {instance.hostel_id for line, instance in instances.items() if line not in errors}
+        hostels = Hostel.objects.select_for_update().filter(pk__in=hostel_ids).order_by().values_list(
+            'pk', 'room_limit', 'occupancy__total_rooms')
+        room_limits, room_counts = {}, {}
+        for hostel_id, room_limit, total_rooms in hostels:
+            room_limits[hostel_id] = room_limit
+            room_counts[hostel_id] = total_rooms if total_rooms is not None else \
+                Room.objects.filter(hostel=hostel_id).count()
+        for line, instance in instances.items():
+            if line in errors:
+                continue
+            if room_counts[instance.hostel_id] >= room_limits[instance.hostel_id]:
+                errors[line] = {'hostel' : [f'Hostel room limit of {room_limits[instance.hostel_id]} reached']}
+            else:
+                room_counts[instance.hostel_id] += 1
+        return errors
+
+    def after_create(self, instances):
+        counts = {}
+        for instance in instances:
+            total, vacant = counts.get(instance.hostel_id, (0, 0))
+            counts[instance.hostel_id] = (total + 1, vacant + int(instance.is_room_vacant()))
+        for hostel_id, (total, vacant) in counts.items():
+            HostelOccupancy.objects.add(hostel_id, total_rooms=total, vacant_rooms=vacant)
+        """ bulk_create does not return the new ids on every database, reload the index instead """
+        if instances:
+            transaction.on_commit(vacant_rooms.invalidate)
+
+
+class StudentImporter(CSVImporter):
+    model = Student
+    search_kind = 'student'
+    columns = ('first_name', 'last_name', 'address', 'phone_no')
+
+
+class EmployeeImporter(CSVImporter):
+    model = Employee
+    search_kind = 'employee'
+    columns = ('first_name', 'last_name', 'address', 'phone_no', 'email_address', 'hostel')
+    related_fields = ('hostel',)
+
+    def check_batch(self, instances):
+        return check_hostels_exist(instances)
+
+
+IMPORTERS = {
+    'hostels' : HostelImporter,
+    'rooms' : RoomImporter,
+    'students' : StudentImporter,
+    'employees' : EmployeeImporter,
+}
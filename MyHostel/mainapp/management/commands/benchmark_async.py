@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from mainapp.benchmarks import asgi_get, benchmark_database, latency_stats, wsgi_get
+from mainapp.datasets import DATASET_SIZES, generate_dataset
+
+ENDPOINTS = ('getVacantRooms/', 'booking/', 'payment/')
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync views served over WSGI with the async views served over ASGI under concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help='concurrent clients')
+        parser.add_argument('--requests', type=int, default=2000, help='requests per run')
+        parser.add_argument('--size', choices=list(DATASET_SIZES), default='small', help='dataset to serve')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--query-latency', type=float, default=0,
+            help='milliseconds added to every query, to stand in for a database across the network')
+
+    def handle(self, *args, **options):
+        """ every request comes from the same client, the throttle would turn most of them away """
+        with benchmark_database(), override_settings(THROTTLE_BUDGETS={}):
+            generate_dataset(seed=options['seed'], **DATASET_SIZES[options['size']])
+            if options['query_latency']:
+                self.add_query_latency(options['query_latency'] / 1000)
+            query_string = f'page_size={options["page_size"]}'
+            paths = [f'/api/v1/{endpoint}' for endpoint in ENDPOINTS]
+            async_paths = [f'/api/v1/async/{endpoint}' for endpoint in ENDPOINTS]
+            runs = {
+                'sync views, WSGI, threads' : self.run_wsgi(paths, query_string, options),
+                'sync views, ASGI, tasks' : self.run_asgi(paths, query_string, options),
+                'async views, ASGI, tasks' : self.run_asgi(async_paths, query_string, options),
+            }
+
+        for name, (elapsed, timings, errors) in runs.items():
+            stats = latency_stats(timings)
+            self.stdout.write(
+                f'{name:<27} {len(timings) / elapsed:>8.0f} req/s   '
+                f'p50 {stats["p50_ms"]:>8.2f} ms   p95 {stats["p95_ms"]:>8.2f} ms   {errors} errors')
+
+    def add_query_latency(self, seconds):
+        """ sleep (releasing the GIL, like waiting on a socket) before every query of every connection """
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        connection_created.connect(add_delay, weak=False)
+        add_delay(None, connection)
+
+    def run_wsgi(self, paths, query_string, options):
+        """ --clients threads sharing the requests, like a threaded WSGI server """
+        handler = WSGIHandler()
+        timings, errors = [], []
+        requests = iter(range(options['requests']))
+        lock = threading.Lock()
+
+        def client():
+            try:
+                while True:
+                    with lock:
+                        number = next(requests, None)
+                    if number is None:
+                        return
+                    started = time.perf_counter()
+                    status_code = wsgi_get(handler, paths[number % len(paths)], query_string)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if status_code != 200:
+                        errors.append(status_code)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(options['clients'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, timings, len(errors)
+
+    def run_asgi(self, paths, query_string, options):
+        """ --clients tasks sharing the requests on one event loop, like an ASGI server """
+        application = ASGIHandler()
+        timings, errors = [], []
+        requests = iter(range(options['requests']))
+
+        async def client():
+            for number in requests:
+                started = time.perf_counter()
+                status_code = await asgi_get(application, paths[number % len(paths)], query_string)
+                timings.append((time.perf_counter() - started) * 1000)
+                if status_code != 200:
+                    errors.append(status_code)
+
+        async def run():
+            await asyncio.gather(*(client() for _ in range(options['clients'])))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return time.perf_counter() - started, timings, len(errors)
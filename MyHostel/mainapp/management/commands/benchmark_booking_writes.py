@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from mainapp.benchmarks import benchmark_database, latency_stats
+from mainapp.datasets import generate_dataset
+from mainapp.models import Room, Student
+
+
+class Command(BaseCommand):
+    help = 'Compare the write throughput of DoBooking.post under the database profiles of DB_PROFILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='sqlite,sqlite-tuned',
+            help=f'comma separated profiles out of {", ".join(settings.DATABASE_PROFILES)}')
+        parser.add_argument('--threads', type=int, default=8, help='concurrent clients')
+        parser.add_argument('--bookings', type=int, default=400, help='bookings made per profile, one per room')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--child', action='store_true', help='run one profile in this process (internal)')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.run_profile(options)))
+            return
+
+        for profile in [profile.strip() for profile in options['profiles'].split(',') if profile.strip()]:
+            if profile not in settings.DATABASE_PROFILES:
+                raise CommandError(f'Unknown database profile {profile}')
+            result = self.run_child(profile, options)
+            stats = result['latency']
+            self.stdout.write(
+                f'{profile:<14} {result["bookings_per_second"]:>7.1f} bookings/s   p50 {stats["p50_ms"]:>8.2f} ms   '
+                f'p95 {stats["p95_ms"]:>8.2f} ms   {result["retries"]} retries (409)   {result["failed"]} failed')
+
+    def run_child(self, profile, options):
+        """ the database settings are read at startup, so every profile runs in its own process """
+        command = [
+            sys.executable, sys.argv[0], 'benchmark_booking_writes', '--child',
+            '--threads', str(options['threads']), '--bookings', str(options['bookings']), '--seed', str(options['seed'])
+        ]
+        child = subprocess.run(command, env=dict(os.environ, DB_PROFILE=profile), capture_output=True, text=True)
+        if child.returncode != 0:
+            raise CommandError(f'{profile} run failed:\n{child.stderr}')
+        return json.loads(child.stdout.strip().splitlines()[-1])
+
+    def run_profile(self, options):
+        """ book --bookings distinct rooms from --threads clients against a fresh test database """
+        with tempfile.TemporaryDirectory() as directory:
+            """ a file, not sqlite's in-memory test database, so the journal and pragmas matter """
+            test_name = os.path.join(directory, 'benchmark.sqlite3') if connection.vendor == 'sqlite' else None
+            with benchmark_database(test_name=test_name), override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], THROTTLE_BUDGETS={}):
+                generate_dataset(hostels=max(options['bookings'] // 100, 1) + 1, rooms=options['bookings'],
+                    students=options['bookings'], bookings=0, seed=options['seed'])
+                return self.book_rooms(options)
+
+    def book_rooms(self, options):
+        check_in_date = date.today() + timedelta(days=30)
+        stays = [
+            {'student': student_id, 'room': room_id, 'check_in_date': check_in_date,
+                'check_out_date': check_in_date + timedelta(days=3)}
+            for student_id, room_id in zip(
+                Student.objects.order_by('pk').values_list('pk', flat=True),
+                Room.objects.order_by('pk').values_list('pk', flat=True))
+        ]
+        timings, retries, failed = [], [], []
+        lock = threading.Lock()
+
+        def client():
+            api = Client()
+            try:
+                while True:
+                    with lock:
+                        if not stays:
+                            return
+                        stay = stays.pop()
+                    started = time.perf_counter()
+                    for attempt in range(100):
+                        response = api.post('/api/v1/booking/', stay)
+                        if response.status_code != 409:
+                            break
+                        retries.append(attempt)
+                        time.sleep(0.001 * (attempt + 1))
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 201:
+                        failed.append(response.status_code)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'bookings_per_second' : round((len(timings) - len(failed)) / elapsed, 1),
+            'latency' : latency_stats(timings),
+            'retries' : len(retries),
+            'failed' : len(failed),
+        }
@@ -0,0 +1,38 @@
+import random
+from django.core.management.base import BaseCommand
+from mainapp.benchmarks import benchmark_database, time_calls
+from mainapp.datasets import FIRST_NAMES, generate_dataset
+from mainapp.search import KIND_MODELS, search_index
+
+
+class Command(BaseCommand):
+    help = 'Time the search index against icontains queries over a generated dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500000)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        students, limit = options['students'], options['limit']
+        typo = lambda name: name[:-2] + name[-1] + name[-2]
+        queries = {
+            'short prefix' : lambda: rng.choice(FIRST_NAMES)[:2],
+            'name prefix' : lambda: rng.choice(FIRST_NAMES)[:4],
+            'full name' : lambda: f'{rng.choice(FIRST_NAMES)} Student {rng.randrange(students)}',
+            'phone number' : lambda: f'8{rng.randrange(students):09d}'[:8],
+            'typo' : lambda: typo(rng.choice(FIRST_NAMES)) + f' Studnet {rng.randrange(students)}',
+        }
+        with benchmark_database():
+            generate_dataset(hostels=100, rooms=1000, students=students, bookings=0, seed=options['seed'])
+            results = {}
+            for name, query in queries.items():
+                results[name] = time_calls(lambda q: search_index.search(q, limit=limit), options['repeat'], query)
+                results[f'{name} (icontains)'] = time_calls(
+                    lambda q: search_index.search_database(q, list(KIND_MODELS), limit), options['repeat'], query)
+
+        for name, stats in results.items():
+            self.stdout.write(f'{name:<26} mean {stats["mean_ms"]:>8.3f} ms   p95 {stats["p95_ms"]:>8.3f} ms')
+        self.stdout.write(self.style.SUCCESS(f'searched {students} students'))
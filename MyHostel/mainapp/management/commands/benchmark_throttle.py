@@ -0,0 +1,44 @@
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from mainapp.benchmarks import benchmark_database, time_calls, wsgi_get
+from mainapp.datasets import DATASET_SIZES, generate_dataset
+from mainapp.throttling import TokenBuckets
+
+""" a budget no benchmark client runs out of, so every request takes a token and is served """
+UNLIMITED = {'rate' : 10 ** 9, 'burst' : 10 ** 9}
+
+
+class Command(BaseCommand):
+    help = 'Measure the per request overhead of the token bucket throttle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+        parser.add_argument('--clients', type=int, default=10000, help='distinct clients taking tokens')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat, clients = options['repeat'], options['clients']
+        token_buckets = TokenBuckets(max_buckets=clients)
+        keys = iter(range(10 ** 9))
+        take = time_calls(lambda: token_buckets.take(f'client-{next(keys) % clients}:Do_Booking', 5, 30), repeat * 10)
+
+        handler = WSGIHandler()
+        results = {}
+        with benchmark_database(), override_settings(DEBUG=False):
+            generate_dataset(**DATASET_SIZES['small'])
+            """ alternate the two in rounds and keep the best round of each, to keep warmup and drift out """
+            for _ in range(options['rounds']):
+                for name, budgets in (('unthrottled', {}), ('throttled', {'List_Vacant_Rooms' : UNLIMITED})):
+                    with override_settings(THROTTLE_BUDGETS=budgets):
+                        stats = time_calls(lambda: wsgi_get(handler, '/api/v1/getVacantRooms/'), repeat)
+                    if name not in results or stats['mean_ms'] < results[name]['mean_ms']:
+                        results[name] = stats
+
+        self.stdout.write(f'token bucket take over {clients} clients: mean {take["mean_ms"] * 1000:.2f} us')
+        for name, stats in results.items():
+            self.stdout.write(f'getVacantRooms {name:<12} mean {stats["mean_ms"]:>7.3f} ms   p95 {stats["p95_ms"]:>7.3f} ms')
+        difference = results['throttled']['mean_ms'] - results['unthrottled']['mean_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f'throttled - unthrottled: {difference * 1000:+.1f} us per request '
+            f'({difference / results["unthrottled"]["mean_ms"]:+.1%}), against {take["mean_ms"] * 1000:.2f} us per token taken'))
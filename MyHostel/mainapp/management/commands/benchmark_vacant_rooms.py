@@ -0,0 +1,78 @@
+import random
+from django.core.management.base import BaseCommand
+from mainapp.benchmarks import benchmark_database, time_calls
+from mainapp.models import Hostel, Room
+from mainapp.vacancy import vacant_rooms
+
+
+class Command(BaseCommand):
+    help = 'Compare the vacant room index against the database query path of getVacantRooms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hostels', type=int, default=100)
+        parser.add_argument('--rooms', type=int, default=10000)
+        parser.add_argument('--reserved', type=float, default=0.5, help='share of reserved rooms')
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with benchmark_database():
+            self.create_rooms(rng, options)
+            page_size = options['page_size']
+            price_limits = [rng.randrange(1000, 10000, 100) for _ in range(options['repeat'])]
+
+            def database_path():
+                """ what getVacantRooms ran before the index: count, exists, then the page """
+                price_limit = price_limits[rng.randrange(len(price_limits))]
+                vacant = Room.objects.filter(status='vacant')
+                vacant.count()
+                under_limit = vacant.filter(price__lte=price_limit)
+                under_limit.exists()
+                list(under_limit[:page_size])
+
+            def index_path():
+                """ bisect lookups for the checks, one query for the page """
+                price_limit = price_limits[rng.randrange(len(price_limits))]
+                vacant_rooms.count_under()
+                vacant_rooms.count_under(price_limit)
+                list(Room.objects.filter(status='vacant', price__lte=price_limit)[:page_size])
+
+            def database_lookup():
+                Room.objects.filter(status='vacant', price__lte=price_limits[rng.randrange(len(price_limits))]).count()
+
+            def index_lookup():
+                vacant_rooms.count_under(price_limits[rng.randrange(len(price_limits))])
+
+            vacant_rooms.invalidate()
+            cold = time_calls(vacant_rooms.load, 1)
+            results = {
+                'database path' : time_calls(database_path, options['repeat']),
+                'index path' : time_calls(index_path, options['repeat']),
+                'database count under price' : time_calls(database_lookup, options['repeat']),
+                'index count under price' : time_calls(index_lookup, options['repeat']),
+            }
+            vacant_rooms.invalidate()
+
+        self.stdout.write(f'index load (cold): {cold["mean_ms"]:.2f} ms for {options["rooms"]} rooms')
+        for name, stats in results.items():
+            self.stdout.write(f'{name:<28} mean {stats["mean_ms"]:>8.3f} ms   p95 {stats["p95_ms"]:>8.3f} ms')
+        speedup = results['database path']['mean_ms'] / results['index path']['mean_ms']
+        self.stdout.write(self.style.SUCCESS(f'getVacantRooms lookups: index path is {speedup:.1f}x faster'))
+
+    def create_rooms(self, rng, options):
+        hostels = Hostel.objects.bulk_create(
+            Hostel(name=f'Hostel {i}', address='Bench Street', phone_no=f'9{i:09d}', manager_id=i, room_limit=100)
+            for i in range(options['hostels'])
+        )
+        hostel_ids = list(Hostel.objects.values_list('pk', flat=True))
+        Room.objects.bulk_create((
+            Room(
+                hostel_id=rng.choice(hostel_ids),
+                description=f'Room {i}',
+                price=rng.randrange(1000, 10000, 100),
+                status='reserved' if rng.random() < options['reserved'] else 'vacant'
+            )
+            for i in range(options['rooms'])
+        ), batch_size=1000)
@@ -0,0 +1,43 @@
+import os
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.exporters import EXPORTS, FORMATS, export_table
+
+
+class Command(BaseCommand):
+    help = 'Export bookings, payments, students and transactions to gzip compressed CSV or NDJSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', metavar='table',
+            help=f'tables to export ({", ".join(EXPORTS)}), all of them by default')
+        parser.add_argument('--output-dir', default='.', help='directory the .gz files are written to')
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='file_format')
+        parser.add_argument('--since', help='only rows dated on or after this day (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='rows fetched from the database at a time')
+        parser.add_argument('--compresslevel', type=int, choices=range(1, 10), default=6)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since takes a date formatted as YYYY-MM-DD')
+        unknown = set(options['tables']) - set(EXPORTS)
+        if unknown:
+            raise CommandError(f'Unknown tables {", ".join(sorted(unknown))}, choose from {", ".join(EXPORTS)}')
+        os.makedirs(options['output_dir'], exist_ok=True)
+
+        for name in options['tables'] or EXPORTS:
+            started = time.perf_counter()
+            path, count = export_table(
+                name,
+                options['output_dir'],
+                file_format=options['file_format'],
+                since=since,
+                chunk_size=options['chunk_size'],
+                compresslevel=options['compresslevel']
+            )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Exported {count} {name} to {path} in {elapsed:.2f}s'))
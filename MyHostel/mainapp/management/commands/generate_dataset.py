@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.datasets import DATASET_SIZES, generate_dataset
+from mainapp.models import Hostel
+
+
+class Command(BaseCommand):
+    help = 'Fill an empty database with a seeded, reproducible dataset of hostels, rooms, students, bookings and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(DATASET_SIZES), default='small')
+        for counter in ('hostels', 'rooms', 'students', 'bookings'):
+            parser.add_argument(f'--{counter}', type=int, help=f'override the number of {counter} of --size')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if Hostel.objects.exists():
+            raise CommandError('The database already has hostels, generate datasets into an empty database')
+        sizes = {
+            counter: options[counter] if options[counter] is not None else size
+            for counter, size in DATASET_SIZES[options['size']].items()
+        }
+        started = time.perf_counter()
+        generate_dataset(seed=options['seed'], batch_size=options['batch_size'], **sizes)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {", ".join(f"{count} {counter}" for counter, count in sizes.items())} in {elapsed:.1f}s'))
@@ -0,0 +1,29 @@
+import gzip
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.importers import IMPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Bulk import hostels, rooms, students or employees from a CSV file (plain or .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(IMPORTERS))
+        parser.add_argument('path', help='CSV file with a header row, .gz files are decompressed on the fly')
+        parser.add_argument('--batch-size', type=int, default=500, help='rows validated and inserted at a time')
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']](batch_size=options['batch_size'])
+        opener = gzip.open if options['path'].endswith('.gz') else open
+        try:
+            with opener(options['path'], 'rt', newline='', encoding='utf-8') as lines:
+                report = importer.run(lines)
+        except (OSError, ValidationError) as exc:
+            raise CommandError(exc)
+
+        for error in report.errors:
+            for field, messages in error['errors'].items():
+                self.stdout.write(f'line {error["line"]}: {field}: {" ".join(map(str, messages))}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} of {report.rows} {options["kind"]} in {report.elapsed:.2f}s '
+            f'({report.rows_per_second} rows/s), {len(report.errors)} failed'))
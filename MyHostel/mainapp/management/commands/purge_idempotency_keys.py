@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from mainapp.models import IdempotencyRecord
+
+
+class Command(BaseCommand):
+    help = 'Delete the expired idempotency keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='keys deleted per statement')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        purged = IdempotencyRecord.objects.purge_expired(options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency keys in {elapsed:.2f}s'))
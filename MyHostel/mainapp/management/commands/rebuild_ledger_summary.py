@@ -0,0 +1,13 @@
+import time
+from django.core.management.base import BaseCommand
+from mainapp.models import LedgerDailySummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily ledger totals per employee and hostel from the transactions'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = LedgerDailySummary.objects.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily ledger totals in {elapsed:.2f}s'))
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.models import HostelOccupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per hostel occupancy counters from the tables, reporting any drift found'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hostel', type=int, action='append', dest='hostels',
+            help='only this hostel id, can be repeated')
+        parser.add_argument('--check', action='store_true',
+            help='only report drift, fail if the stored counters are off')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift = HostelOccupancy.objects.drift(options['hostels'])
+        for hostel_id, differences in sorted(drift.items()):
+            for counter, (stored, counted) in differences.items():
+                self.stdout.write(f'hostel {hostel_id}: {counter} stored {stored}, counted {counted}')
+
+        if options['check']:
+            if drift:
+                raise CommandError(f'{len(drift)} hostels have drifted occupancy counters')
+            self.stdout.write(self.style.SUCCESS('Occupancy counters are up to date'))
+            return
+
+        counters = HostelOccupancy.objects.rebuild(options['hostels'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt occupancy of {len(counters)} hostels ({len(drift)} drifted) in {elapsed:.2f}s'))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from mainapp.search import KIND_MODELS, search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index of students, employees and hostels from the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', help=f'only these kinds, of {", ".join(KIND_MODELS)}')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        invalid = set(options['kinds']) - set(KIND_MODELS)
+        if invalid:
+            raise CommandError(f'Unknown kinds {", ".join(sorted(invalid))}, choose from {", ".join(KIND_MODELS)}')
+        if not search_index.is_available():
+            raise CommandError('This database has no search table, search falls back to icontains queries')
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = search_index.rebuild(options['kinds'], options['batch_size'])
+        elapsed = time.perf_counter() - started
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count} indexed')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index in {elapsed:.2f}s'))
@@ -0,0 +1,29 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from mainapp.sweeper import release_rooms
+
+
+class Command(BaseCommand):
+    help = 'Set reserved rooms whose bookings have all ended back to vacant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='rooms released per transaction')
+        parser.add_argument('--date', help='release rooms free on this day (YYYY-MM-DD) instead of today')
+        parser.add_argument('--every', type=int, default=0, metavar='SECONDS',
+            help='keep running, sweeping every SECONDS seconds')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size should be at least 1')
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date should be a YYYY-MM-DD date')
+        while True:
+            report = release_rooms(today, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Released {report["released"]} rooms in {report["batches"]} batches in {report["seconds"]:.2f}s'))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,177 @@
+import json
+import platform
+import random
+from datetime import date, timedelta
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from mainapp.benchmarks import benchmark_database, git_revision, rolled_back, time_calls
+from mainapp.datasets import DATASET_SIZES, generate_dataset
+from mainapp.models import Booking, Hostel, Payment, Room, Student
+
+
+class Command(BaseCommand):
+    help = 'Time every endpoint and the key model methods on generated datasets, and write a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+            help=f'comma separated dataset sizes out of {", ".join(DATASET_SIZES)}')
+        parser.add_argument('--repeat', type=int, default=50, help='timed calls per benchmark')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='write the JSON report to this file')
+        parser.add_argument('--compare', help='an earlier JSON report to check for regressions against')
+        parser.add_argument('--threshold', type=float, default=1.25,
+            help='flag benchmarks whose mean time grew by more than this factor')
+        parser.add_argument('--min-delta-ms', type=float, default=0.1,
+            help='ignore slowdowns smaller than this, microsecond benchmarks are noisy')
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = set(sizes) - set(DATASET_SIZES)
+        if unknown:
+            raise CommandError(f'Unknown dataset sizes {", ".join(sorted(unknown))}')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as report_file:
+                baseline = json.load(report_file)
+
+        report = {
+            'revision' : git_revision(),
+            'python' : platform.python_version(),
+            'django' : django.get_version(),
+            'database' : connection.vendor,
+            'seed' : options['seed'],
+            'repeat' : options['repeat'],
+            'datasets' : {},
+        }
+        """ DEBUG would log every query and slow every benchmark down """
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], THROTTLE_BUDGETS={}):
+            for size in sizes:
+                with benchmark_database():
+                    self.stdout.write(f'generating the {size} dataset...')
+                    generate_dataset(seed=options['seed'], **DATASET_SIZES[size])
+                    report['datasets'][size] = {
+                        'rows' : DATASET_SIZES[size],
+                        'results' : self.run_suite(random.Random(options['seed']), options['repeat']),
+                    }
+
+        for size, dataset in report['datasets'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{size}: {dataset["rows"]}'))
+            for name, stats in dataset['results'].items():
+                self.stdout.write(
+                    f'  {name:<45} mean {stats["mean_ms"]:>9.3f} ms   p95 {stats["p95_ms"]:>9.3f} ms   '
+                    f'{stats["queries"]:>3} queries')
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                json.dump(report, report_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options['threshold'], options['min_delta_ms'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} benchmarks regressed against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
+
+    def run_suite(self, rng, repeat):
+        """ {benchmark name: latency stats and queries per call} on the current dataset """
+        client = Client()
+        hostel_ids = list(Hostel.objects.values_list('pk', flat=True))
+        room_ids = list(Room.objects.values_list('pk', flat=True))
+        student_ids = list(Student.objects.values_list('pk', flat=True))
+        booking_ids = list(Booking.objects.values_list('pk', flat=True)[:10000])
+        payment_ids = list(Payment.objects.values_list('pk', flat=True)[:10000])
+        pick = rng.choice
+        """ far enough ahead that no generated stay overlaps """
+        future = date.today() + timedelta(days=3650)
+
+        def get(path, **params):
+            return lambda: client.get(path, params)
+
+        def post_booking():
+            with rolled_back():
+                client.post('/api/v1/booking/', {'student': pick(student_ids), 'room': pick(room_ids),
+                    'check_in_date': future, 'check_out_date': future + timedelta(days=3)})
+
+        def post_batch_booking():
+            stays = [
+                {'student': pick(student_ids), 'room': room_id, 'check_in_date': str(future),
+                    'check_out_date': str(future + timedelta(days=3))}
+                for room_id in rng.sample(room_ids, 10)
+            ]
+            with rolled_back():
+                client.post('/api/v1/booking/batch/', stays, content_type='application/json')
+
+        def save_booking(booking):
+            with rolled_back():
+                booking.save()
+
+        benchmarks = {
+            'GET getHostelDetails' : lambda: client.get(f'/api/v1/getHostelDetails/{pick(hostel_ids)}/'),
+            'GET getHostelOccupancy' : lambda: client.get(f'/api/v1/getHostelOccupancy/{pick(hostel_ids)}/'),
+            'GET listEmployee' : get('/api/v1/listEmployee/', page_size=20),
+            'GET getVacantRooms' : get('/api/v1/getVacantRooms/', page_size=20),
+            'GET getVacantRooms price_limit' : lambda: client.get('/api/v1/getVacantRooms/',
+                {'page_size': 20, 'price_limit': rng.randrange(2000, 10000, 100)}),
+            'GET getVacantRooms stay dates' : get('/api/v1/getVacantRooms/', page_size=20,
+                check_in_date=date.today(), check_out_date=date.today() + timedelta(days=2)),
+            'GET getStudents' : lambda: client.get(f'/api/v1/getStudents/{pick(hostel_ids)}/', {'page_size': 100}),
+            'GET booking' : get('/api/v1/booking/', page_size=20),
+            'GET booking lite' : get('/api/v1/booking/', page_size=20, lite='true'),
+            'GET booking price_limit' : get('/api/v1/booking/', page_size=20, price_limit=2000),
+            'GET booking/<pk>' : lambda: client.get(f'/api/v1/booking/{pick(booking_ids)}/'),
+            'GET payment' : get('/api/v1/payment/', page_size=20),
+            'GET payment lite' : get('/api/v1/payment/', page_size=20, lite='true'),
+            'GET payment/<pk>' : lambda: client.get(f'/api/v1/payment/{pick(payment_ids)}/'),
+            'GET revenue' : get('/api/v1/revenue/', group_by='hostel,month'),
+            'GET async/booking' : get('/api/v1/async/booking/', page_size=20),
+            'POST booking' : post_booking,
+            'POST booking/batch (10 stays)' : post_batch_booking,
+        }
+        results = {name: self.measure(benchmark, repeat) for name, benchmark in benchmarks.items()}
+
+        results['Booking.save'] = self.measure(save_booking, repeat, setup=lambda: Booking(
+            student_id=pick(student_ids), room=Room.objects.get(pk=pick(room_ids)),
+            check_in_date=future, check_out_date=future + timedelta(days=3)))
+        results['Payment.calculate_total_payment'] = self.measure(
+            lambda payment: payment.calculate_total_payment(), repeat,
+            setup=lambda: Payment.objects.get(pk=pick(payment_ids)))
+        results['Payment.calculate_total_payment with_totals'] = self.measure(
+            lambda payment: payment.calculate_total_payment(), repeat,
+            setup=lambda: Payment.objects.with_totals().get(pk=pick(payment_ids)))
+        return results
+
+    def measure(self, func, repeat, setup=None):
+        """ warm up and count the queries of one call, then time repeat calls """
+        args = () if setup is None else (setup(),)
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        """ an execute wrapper, unlike connection.queries, is not reset by the request_started signal """
+        with connection.execute_wrapper(count_query):
+            func(*args)
+        stats = time_calls(func, repeat, setup)
+        stats['queries'] = len(queries)
+        return stats
+
+
+def compare_reports(baseline, report, threshold, min_delta_ms=0):
+    """ messages for the benchmarks that got threshold times (and min_delta_ms) slower, or run more queries, than in baseline """
+    regressions = []
+    for size, dataset in report['datasets'].items():
+        baseline_results = baseline.get('datasets', {}).get(size, {}).get('results', {})
+        for name, stats in dataset['results'].items():
+            before = baseline_results.get(name)
+            if before is None:
+                continue
+            ratio = stats['mean_ms'] / before['mean_ms'] if before['mean_ms'] else 1
+            if ratio > threshold and stats['mean_ms'] - before['mean_ms'] > min_delta_ms:
+                regressions.append(
+                    f'{size} {name}: mean {before["mean_ms"]:.3f} ms -> {stats["mean_ms"]:.3f} ms ({ratio:.2f}x)')
+            if stats['queries'] > before['queries']:
+                regressions.append(f'{size} {name}: {before["queries"]} -> {stats["queries"]} queries')
+    return regressions
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+""" [query count, query seconds] of the request being served, shared with the threads it queries from """
+current_sql = ContextVar('current_sql', default=None)
+
+
+class EndpointStats:
+    """ counters of one url name in one thread """
+    __slots__ = ('requests', 'seconds', 'buckets', 'queries', 'sql_seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+class Metrics:
+    """
+        per process request metrics, sharded by thread:
+        every thread only ever writes its own shard, so recording a request takes no lock.
+        the lock is only taken when a thread creates its shard and when the shards are read.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def record(self, url_name, seconds, queries, sql_seconds):
+        shard = self.shard()
+        stats = shard.get(url_name)
+        if stats is None:
+            stats = shard[url_name] = EndpointStats()
+        stats.requests += 1
+        stats.seconds += seconds
+        stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        stats.queries += queries
+        stats.sql_seconds += sql_seconds
+
+    def snapshot(self):
+        """ {url_name: EndpointStats} summed over all threads """
+        with self.lock:
+            shards = list(self.shards)
+        totals = {}
+        for shard in shards:
+            for url_name, stats in list(shard.items()):
+                total = totals.get(url_name)
+                if total is None:
+                    total = totals[url_name] = EndpointStats()
+                total.requests += stats.requests
+                total.seconds += stats.seconds
+                total.buckets = [count + other for count, other in zip(total.buckets, stats.buckets)]
+                total.queries += stats.queries
+                total.sql_seconds += stats.sql_seconds
+        return totals
+
+    def reset(self):
+        with self.lock:
+            for shard in self.shards:
+                shard.clear()
+
+    def prometheus(self):
+        """ the snapshot in the Prometheus text exposition format """
+        totals = sorted(self.snapshot().items())
+        lines = [
+            '# HELP myhostel_requests_total Requests served, by url name.',
+            '# TYPE myhostel_requests_total counter',
+        ]
+        lines += [f'myhostel_requests_total{{url_name="{url_name}"}} {stats.requests}' for url_name, stats in totals]
+        lines += [
+            '# HELP myhostel_request_duration_seconds Request latency, by url name.',
+            '# TYPE myhostel_request_duration_seconds histogram',
+        ]
+        for url_name, stats in totals:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+                cumulative += count
+                lines.append(f'myhostel_request_duration_seconds_bucket{{url_name="{url_name}",le="{bound}"}} {cumulative}')
+            lines.append(f'myhostel_request_duration_seconds_sum{{url_name="{url_name}"}} {stats.seconds:.6f}')
+            lines.append(f'myhostel_request_duration_seconds_count{{url_name="{url_name}"}} {stats.requests}')
+        lines += [
+            '# HELP myhostel_sql_queries_total SQL queries run while serving requests, by url name.',
+            '# TYPE myhostel_sql_queries_total counter',
+        ]
+        lines += [f'myhostel_sql_queries_total{{url_name="{url_name}"}} {stats.queries}' for url_name, stats in totals]
+        lines += [
+            '# HELP myhostel_sql_duration_seconds_total Time spent in SQL queries while serving requests, by url name.',
+            '# TYPE myhostel_sql_duration_seconds_total counter',
+        ]
+        lines += [
+            f'myhostel_sql_duration_seconds_total{{url_name="{url_name}"}} {stats.sql_seconds:.6f}'
+            for url_name, stats in totals
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def count_query(execute, sql, params, many, context):
+    """ execute wrapper of every connection, charging the query to the request being served """
+    sql_stats = current_sql.get()
+    if sql_stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sql_stats[0] += 1
+        sql_stats[1] += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """ record latency and SQL work of every request under its url name """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            """ mark the instance as a coroutine function so django calls it without a thread hop """
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sql_stats = [0, 0.0]
+        token = current_sql.set(sql_stats)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            self.record(request, started, sql_stats)
+            current_sql.reset(token)
+
+    async def __acall__(self, request):
+        sql_stats = [0, 0.0]
+        token = current_sql.set(sql_stats)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.record(request, started, sql_stats)
+            current_sql.reset(token)
+
+    def record(self, request, started, sql_stats):
+        resolver_match = getattr(request, 'resolver_match', None)
+        url_name = resolver_match.url_name if resolver_match is not None and resolver_match.url_name else 'unmatched'
+        metrics.record(url_name, time.perf_counter() - started, sql_stats[0], sql_stats[1])
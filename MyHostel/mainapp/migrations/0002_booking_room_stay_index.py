@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-17 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='booking',
+            options={'ordering': ['-booking_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='employee',
+            options={'ordering': ['-employee_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='hostel',
+            options={'ordering': ['-hostel_branch_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='payment',
+            options={'ordering': ['-payment_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='room',
+            options={'ordering': ['-room_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='student',
+            options={'ordering': ['-student_id']},
+        ),
+        migrations.AlterModelOptions(
+            name='transcation',
+            options={'ordering': ['-transaction_id']},
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'check_out_date', 'check_in_date'], name='booking_room_stay_idx'),
+        ),
+    ]
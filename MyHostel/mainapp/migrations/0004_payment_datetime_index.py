@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-17 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0003_room_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_datetime'], name='payment_datetime_idx'),
+        ),
+    ]
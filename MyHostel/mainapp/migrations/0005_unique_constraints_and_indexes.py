@@ -0,0 +1,53 @@
+# Generated by Django 3.2 on 2026-10-17 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0004_payment_datetime_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'check_in_date'], name='booking_room_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['hostel', 'first_name'], name='employee_hostel_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['status', 'price'], name='room_status_price_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='employee',
+            constraint=models.UniqueConstraint(fields=('phone_no',), name='unique_employee_phone_no'),
+        ),
+        migrations.AddConstraint(
+            model_name='employee',
+            constraint=models.UniqueConstraint(fields=('first_name', 'last_name'), name='unique_employee_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='hostel',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_hostel_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='hostel',
+            constraint=models.UniqueConstraint(fields=('phone_no',), name='unique_hostel_phone_no'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('booking',), name='unique_payment_booking'),
+        ),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(fields=('phone_no',), name='unique_student_phone_no'),
+        ),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(fields=('first_name', 'last_name'), name='unique_student_name'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-17 23:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0005_unique_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostelOccupancy',
+            fields=[
+                ('hostel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy', serialize=False, to='mainapp.hostel')),
+                ('total_rooms', models.IntegerField(default=0)),
+                ('vacant_rooms', models.IntegerField(default=0)),
+                ('active_bookings', models.IntegerField(default=0)),
+                ('students', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, OperationalError
+
+
+def create_search_table(apps, schema_editor):
+    """
+        FTS5 table of the names and contact details of students, employees and hostels,
+        the trigram tokenizer indexes every substring of three characters. sqlite only,
+        SearchIndex falls back to icontains queries where the table does not exist.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE mainapp_search USING fts5(name, contact, tokenize='trigram')")
+    except OperationalError:
+        """ sqlite older than 3.34 has no trigram tokenizer """
+        return
+    """ index the rows already there, same documents as mainapp.search.DOCUMENTS """
+    documents = (
+        ("student_id * 4 + 1", "TRIM(first_name || ' ' || COALESCE(last_name, ''))", "phone_no", 'mainapp_student'),
+        ("employee_id * 4 + 2", "TRIM(first_name || ' ' || COALESCE(last_name, ''))",
+            "phone_no || ' ' || email_address", 'mainapp_employee'),
+        ("hostel_branch_id * 4 + 3", "name", "phone_no || ' ' || address", 'mainapp_hostel'),
+    )
+    for rowid, name, contact, table in documents:
+        schema_editor.execute(
+            f'INSERT INTO mainapp_search (rowid, name, contact) SELECT {rowid}, {name}, {contact} FROM {table}')
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS mainapp_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0006_hostel_occupancy'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-17 23:49
+
+from django.db import migrations, models
+
+VERSIONED_MODELS = ('hostel', 'room', 'booking', 'employee', 'payment', 'student')
+
+
+def create_counters(apps, schema_editor):
+    """ start every counter, so a bump is always a single UPDATE """
+    ModelVersion = apps.get_model('mainapp', 'ModelVersion')
+    ModelVersion.objects.bulk_create(ModelVersion(model=f'mainapp.{model}') for model in VERSIONED_MODELS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0008_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('model', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
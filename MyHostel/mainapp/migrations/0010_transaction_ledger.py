@@ -0,0 +1,90 @@
+# Generated by Django 3.2 on 2026-10-17 23:58
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_ledger(apps, schema_editor):
+    """ copy the hostel, amount and payment time onto the recorded transactions, then total them per day """
+    Transcation = apps.get_model('mainapp', 'Transcation')
+    Payment = apps.get_model('mainapp', 'Payment')
+    LedgerDailySummary = apps.get_model('mainapp', 'LedgerDailySummary')
+    payment = Payment.objects.filter(pk=models.OuterRef('payment'))
+    Transcation.objects.update(
+        hostel=models.Subquery(payment.values('booking__room__hostel')[:1]),
+        amount=models.Subquery(payment.annotate(total=models.ExpressionWrapper(
+            models.F('booking__room__price') * models.F('booking__no_of_nights'),
+            output_field=models.PositiveIntegerField())).values('total')[:1]),
+        created_at=models.Subquery(payment.values('payment_datetime')[:1])
+    )
+    rows = Transcation.objects.order_by().values('employee', 'hostel', day=TruncDate('created_at')).annotate(
+        transactions=models.Count('pk'), amount=models.Sum('amount'))
+    LedgerDailySummary.objects.bulk_create(
+        LedgerDailySummary(employee_id=row['employee'], hostel_id=row['hostel'], day=row['day'],
+            transactions=row['transactions'], amount=row['amount'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0009_model_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcation',
+            name='hostel',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='mainapp.hostel'),
+        ),
+        migrations.AddField(
+            model_name='transcation',
+            name='amount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='transcation',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='LedgerDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('transactions', models.IntegerField(default=0)),
+                ('amount', models.BigIntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_days', to='mainapp.employee')),
+                ('hostel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_days', to='mainapp.hostel')),
+            ],
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='transcation',
+            name='hostel',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='mainapp.hostel'),
+        ),
+        migrations.AddConstraint(
+            model_name='transcation',
+            constraint=models.UniqueConstraint(fields=('payment',), name='unique_transaction_payment'),
+        ),
+        migrations.AddIndex(
+            model_name='transcation',
+            index=models.Index(fields=['employee', 'created_at'], name='transaction_employee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcation',
+            index=models.Index(fields=['hostel', 'created_at'], name='transaction_hostel_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerdailysummary',
+            constraint=models.UniqueConstraint(fields=('employee', 'hostel', 'day'), name='unique_ledger_day'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerdailysummary',
+            index=models.Index(fields=['hostel', 'day'], name='ledger_hostel_day_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def recount_active_bookings(apps, schema_editor):
+    """ active_bookings was counted against the day of each write, count it again as of today """
+    HostelOccupancy = apps.get_model('mainapp', 'HostelOccupancy')
+    Booking = apps.get_model('mainapp', 'Booking')
+    today = django.utils.timezone.localdate()
+    active = Booking.objects.filter(room__hostel=models.OuterRef('hostel'), check_out_date__gt=today).order_by().values(
+        'room__hostel').annotate(count=models.Count('pk')).values('count')
+    HostelOccupancy.objects.update(active_bookings=Coalesce(models.Subquery(active), 0), counted_on=today)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_transaction_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hosteloccupancy',
+            name='counted_on',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.RunPython(recount_active_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0011_occupancy_counted_on'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencyrecord',
+            name='unique_idempotency_key',
+        ),
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='client',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='locked_until',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencyrecord',
+            constraint=models.UniqueConstraint(fields=('client', 'key', 'endpoint'), name='unique_idempotency_key'),
+        ),
+    ]
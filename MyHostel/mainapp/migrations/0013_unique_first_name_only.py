@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0012_idempotency_client_lease'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='employee',
+            constraint=models.UniqueConstraint(condition=models.Q(last_name__isnull=True), fields=('first_name',), name='unique_employee_first_name_only'),
+        ),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(condition=models.Q(last_name__isnull=True), fields=('first_name',), name='unique_student_first_name_only'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, transaction, DatabaseError
+
+""" (table, index, document) of students, employees and hostels, the expressions of mainapp.search.DOCUMENT_SQL """
+FULL_NAME = "first_name || COALESCE(' ' || NULLIF(last_name, ''), '')"
+TRIGRAM_INDEXES = (
+    ('mainapp_student', 'search_student_trgm_idx', f"({FULL_NAME} || ' ' || phone_no)"),
+    ('mainapp_employee', 'search_employee_trgm_idx', f"({FULL_NAME} || ' ' || phone_no || ' ' || email_address)"),
+    ('mainapp_hostel', 'search_hostel_trgm_idx', "(name || ' ' || phone_no || ' ' || address)"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+        GIN trigram indexes over the search documents, postgresql only: SearchIndex filters on the
+        same expressions, so substring and similarity lookups are index scans. without the pg_trgm
+        extension search keeps to icontains queries.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        """ creating an extension takes privileges the database user may not have """
+        return
+    for table, index, document in TRIGRAM_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin (({document}) gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for table, index, document in TRIGRAM_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_unique_first_name_only'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
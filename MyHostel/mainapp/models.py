@@ -1,5 +1,16 @@
-from django.db import models
+import logging
+import operator
+import threading
+import time
+from collections import Counter
+from functools import reduce
+from django.db import models, transaction, connections, IntegrityError, OperationalError
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
 from django.core.validators import RegexValidator, MaxValueValidator
+from .vacancy import vacant_rooms
+
+logger = logging.getLogger(__name__)
 
 PHONE_NO_REGEX = RegexValidator(r"^0?[6-9]\d{9}$")
 ROOM_STATUS_CHOICES = (
@@ -13,6 +24,282 @@ PAYMENT_MODE_CHOICES = (
 
 # Create your models here.
 
+class BookingConflict(Exception):
+    """ another request changed the room while this booking was being made, safe to retry """
+
+
+class RoomUnavailable(Exception):
+    """ the room already has a booking overlapping the requested dates """
+
+
+class RoomQuerySet(models.QuerySet):
+    """ room lookups """
+
+    def available(self, check_in_date, check_out_date):
+        """
+            rooms that are free for the half open range [check_in_date, check_out_date).
+            a room is free when none of its bookings overlap the range. the NOT EXISTS probe
+            seeks the (room, check_out_date, check_in_date) index, so bookings that ended
+            before check_in_date are never read.
+        """
+        clashing_bookings = Booking.objects.filter(room=models.OuterRef('pk')).overlapping(
+            check_in_date, check_out_date)
+        return self.filter(~models.Exists(clashing_bookings))
+
+    def releasable(self, today=None):
+        """
+            reserved rooms whose bookings have all ended by today, so nothing holds them any more.
+            the NOT EXISTS probe seeks the (room, check_out_date, check_in_date) index.
+        """
+        today = today or timezone.localdate()
+        holding_bookings = Booking.objects.filter(room=models.OuterRef('pk'), check_out_date__gt=today)
+        return self.filter(status='reserved').filter(~models.Exists(holding_bookings))
+
+
+class BookingQuerySet(models.QuerySet):
+    """ booking lookups """
+
+    def overlapping(self, check_in_date, check_out_date):
+        """ bookings whose stay intersects [check_in_date, check_out_date) """
+        return self.filter(check_in_date__lt=check_out_date, check_out_date__gt=check_in_date)
+
+    def book(self, student, room, check_in_date, check_out_date):
+        """
+            create a booking without ever double booking the room.
+            the room row is locked (select_for_update) where the database supports it, and
+            Booking.save only claims the room if its version is still the one read here,
+            so concurrent writers on any backend get BookingConflict instead of a clash.
+        """
+        try:
+            with transaction.atomic():
+                room = Room.objects.select_for_update().get(pk=room.pk)
+                if not room.is_available(check_in_date, check_out_date):
+                    raise RoomUnavailable
+                booking = self.model(student=student, room=room,
+                    check_in_date=check_in_date, check_out_date=check_out_date)
+                booking.save()
+                return booking
+        except OperationalError as exc:
+            if not is_lock_contention(exc):
+                raise
+            raise BookingConflict from exc
+
+    def book_many(self, stays):
+        """
+            create many bookings in one transaction with a constant number of queries.
+            stays is a list of dicts with student, room, check_in_date and check_out_date ids/dates.
+            returns one entry per stay: the created Booking, or an error message.
+        """
+        results = [None] * len(stays)
+        try:
+            with transaction.atomic():
+                students = Student.objects.in_bulk({stay['student'] for stay in stays})
+                rooms = Room.objects.select_for_update().in_bulk({stay['room'] for stay in stays})
+                booked_stays = {}
+                if stays:
+                    existing = self.filter(room__in=rooms).overlapping(
+                        min(stay['check_in_date'] for stay in stays),
+                        max(stay['check_out_date'] for stay in stays))
+                    for room_id, check_in_date, check_out_date in existing.order_by().values_list(
+                            'room', 'check_in_date', 'check_out_date'):
+                        booked_stays.setdefault(room_id, []).append((check_in_date, check_out_date))
+
+                new_bookings = []
+                for index, stay in enumerate(stays):
+                    check_in_date, check_out_date = stay['check_in_date'], stay['check_out_date']
+                    if stay['student'] not in students:
+                        results[index] = 'Student does not exist'
+                        continue
+                    if stay['room'] not in rooms:
+                        results[index] = 'Room does not exist'
+                        continue
+                    room_stays = booked_stays.setdefault(stay['room'], [])
+                    if any(start < check_out_date and end > check_in_date for start, end in room_stays):
+                        results[index] = 'Room is not vacant'
+                        continue
+                    room_stays.append((check_in_date, check_out_date))
+                    booking = self.model(
+                        student=students[stay['student']],
+                        room=rooms[stay['room']],
+                        check_in_date=check_in_date,
+                        check_out_date=check_out_date,
+                        no_of_nights=(check_out_date - check_in_date).days
+                    )
+                    results[index] = booking
+                    new_bookings.append(booking)
+
+                if new_bookings:
+                    occupancy_deltas = self._occupancy_deltas(new_bookings)
+                    self.bulk_create(new_bookings)
+                    Room.objects.filter(pk__in={booking.room_id for booking in new_bookings}).update(
+                        status='reserved', version=models.F('version') + 1)
+                    ModelVersion.objects.bump(Booking, Room)
+                    for hostel_id, deltas in occupancy_deltas.items():
+                        HostelOccupancy.objects.add(hostel_id, **deltas)
+                    reserved_room_ids = {booking.room_id for booking in new_bookings}
+                    transaction.on_commit(lambda: [vacant_rooms.remove(room_id) for room_id in reserved_room_ids])
+                    if not connections[self.db].features.can_return_rows_from_bulk_insert:
+                        self._fetch_booking_ids(new_bookings)
+        except OperationalError as exc:
+            if not is_lock_contention(exc):
+                raise
+            raise BookingConflict from exc
+        return results
+
+    def _occupancy_deltas(self, bookings):
+        """ per hostel occupancy changes made by inserting bookings, before they are inserted """
+        known_students = set(self.filter(
+            student__in={booking.student_id for booking in bookings},
+            room__hostel__in={booking.room.hostel_id for booking in bookings}
+        ).order_by().values_list('student', 'room__hostel').distinct())
+        deltas = {}
+        reserved_rooms = set()
+        for booking in bookings:
+            hostel_id = booking.room.hostel_id
+            hostel_deltas = deltas.setdefault(hostel_id, {'vacant_rooms': 0, 'students': 0, 'stays': []})
+            if booking.room.is_room_vacant() and booking.room_id not in reserved_rooms:
+                reserved_rooms.add(booking.room_id)
+                hostel_deltas['vacant_rooms'] -= 1
+            hostel_deltas['stays'].append(booking.check_out_date)
+            if (booking.student_id, hostel_id) not in known_students:
+                known_students.add((booking.student_id, hostel_id))
+                hostel_deltas['students'] += 1
+        return deltas
+
+    def _fetch_booking_ids(self, bookings):
+        """ read back the primary keys of bulk created bookings, their stays can not overlap """
+        pending = {(booking.room_id, booking.check_in_date, booking.check_out_date): booking for booking in bookings}
+        created = self.filter(
+            room__in={booking.room_id for booking in bookings},
+            check_in_date__in={booking.check_in_date for booking in bookings}
+        ).order_by('booking_id').values_list('booking_id', 'room', 'check_in_date', 'check_out_date')
+        for booking_id, *stay in created:
+            booking = pending.get(tuple(stay))
+            if booking is not None:
+                booking.booking_id = booking_id
+
+
+class PaymentQuerySet(models.QuerySet):
+    """ payment lookups """
+
+    REVENUE_GROUPS = {
+        'hostel' : models.F('booking__room__hostel'),
+        'room' : models.F('booking__room'),
+        'payment_mode' : models.F('payment_mode'),
+        'month' : TruncMonth('payment_datetime', output_field=models.DateField()),
+    }
+
+    def with_totals(self):
+        """ annotate total_amount (room price * no of nights) computed by the database """
+        return self.annotate(total_amount=payment_total_expression())
+
+    def revenue(self, group_by):
+        """ payment count and revenue per combination of the group_by keys, in one GROUP BY query """
+        groups = {key: self.REVENUE_GROUPS[key] for key in group_by}
+        return self.values(**{f'{key}_group': expression for key, expression in groups.items()}).annotate(
+            payments=models.Count('pk'),
+            revenue=models.Sum(payment_total_expression())
+        ).order_by(*(f'{key}_group' for key in groups))
+
+    def pay_many(self, items):
+        """
+            settle many payments in one transaction with a constant number of queries.
+            items is a list of dicts with student, booking and employee ids and a payment_mode.
+            the paid bookings and paying students of the whole batch are looked up with two IN
+            queries, the payments and their Transcation rows are inserted with bulk_create.
+            returns one entry per item: the created Payment, or an error message.
+        """
+        results = [None] * len(items)
+        with transaction.atomic():
+            students = Student.objects.in_bulk({item['student'] for item in items})
+            employees = Employee.objects.in_bulk({item['employee'] for item in items})
+            bookings = Booking.objects.select_for_update().select_related('room').in_bulk(
+                {item['booking'] for item in items})
+            paid_bookings = set(self.filter(booking__in=bookings).order_by().values_list('booking', flat=True))
+            paying_students = set(self.filter(student__in=students).order_by().values_list('student', flat=True))
+
+            new_payments = []
+            for index, item in enumerate(items):
+                if item['student'] not in students:
+                    results[index] = 'Student does not exist'
+                    continue
+                if item['booking'] not in bookings:
+                    results[index] = 'Booking does not exist'
+                    continue
+                if item['employee'] not in employees:
+                    results[index] = 'Employee does not exist'
+                    continue
+                if item['booking'] in paid_bookings:
+                    results[index] = 'Payment was already done for this booking'
+                    continue
+                if item['student'] in paying_students:
+                    results[index] = 'Student have already done payment'
+                    continue
+                """ later items of the batch see the earlier ones as done """
+                paid_bookings.add(item['booking'])
+                paying_students.add(item['student'])
+                payment = self.model(
+                    student=students[item['student']],
+                    booking=bookings[item['booking']],
+                    payment_mode=item['payment_mode']
+                )
+                payment.employee = employees[item['employee']]
+                results[index] = payment
+                new_payments.append(payment)
+
+            if new_payments:
+                self.bulk_create(new_payments)
+                if not connections[self.db].features.can_return_rows_from_bulk_insert:
+                    self._fetch_payment_ids(new_payments)
+                Transcation.objects.record_many([
+                    Transcation(payment=payment, employee=payment.employee) for payment in new_payments
+                ])
+                revenue = {}
+                for payment in new_payments:
+                    hostel_id = payment.booking.room.hostel_id
+                    revenue[hostel_id] = revenue.get(hostel_id, 0) + payment.calculate_total_payment()
+                for hostel_id, amount in revenue.items():
+                    HostelOccupancy.objects.add(hostel_id, revenue=amount)
+                ModelVersion.objects.bump(Payment)
+        return results
+
+    def _fetch_payment_ids(self, payments):
+        """ read back the primary keys of bulk created payments, a booking is only paid once """
+        pending = {payment.booking_id: payment for payment in payments}
+        created = self.filter(booking__in=pending).order_by().values_list('payment_id', 'booking')
+        for payment_id, booking_id in created:
+            pending[booking_id].payment_id = payment_id
+
+
+def payment_total_expression():
+    """ room price * no of nights of the booking paid for """
+    return models.ExpressionWrapper(
+        models.F('booking__room__price') * models.F('booking__no_of_nights'),
+        output_field=models.PositiveIntegerField()
+    )
+
+
+def violated_constraint(exc, model):
+    """ name of the unique constraint of model that raised the IntegrityError, None if not known """
+    message = str(exc)
+    table = model._meta.db_table
+    for constraint in model._meta.constraints:
+        columns = ', '.join(f'{table}.{model._meta.get_field(field).column}' for field in constraint.fields)
+        # postgresql names the constraint, sqlite lists its columns
+        if f'"{constraint.name}"' in message or message == f'UNIQUE constraint failed: {columns}':
+            return constraint.name
+    return None
+
+
+def is_lock_contention(exc):
+    """ if the database refused a write because of a concurrent transaction, return True """
+    if 'locked' in str(exc):
+        # sqlite: database is locked / database table is locked
+        return True
+    # postgresql: serialization_failure, deadlock_detected
+    return getattr(exc.__cause__, 'pgcode', None) in ('40001', '40P01')
+
+
 class Student(models.Model):
     """ Hostel Student Details """
     student_id  = models.AutoField(primary_key=True)
@@ -32,6 +319,13 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['-student_id']
+        constraints = [
+            models.UniqueConstraint(fields=['phone_no'], name='unique_student_phone_no'),
+            models.UniqueConstraint(fields=['first_name', 'last_name'], name='unique_student_name'),
+            # NULLs never clash in the constraint above, a name without last name is unique on its own
+            models.UniqueConstraint(fields=['first_name'], condition=models.Q(last_name__isnull=True),
+                name='unique_student_first_name_only'),
+        ]
         
 
 class Hostel(models.Model):
@@ -43,11 +337,23 @@ class Hostel(models.Model):
     manager_id         = models.PositiveIntegerField(validators=[MaxValueValidator(99999)])
     room_limit         = models.IntegerField(validators=[MaxValueValidator(100)])
 
+    def save(self, *args, **kwargs):
+        """ overriding save method:- a new hostel starts with empty occupancy counters """
+        with transaction.atomic():
+            adding = self._state.adding
+            super(Hostel, self).save(*args, **kwargs)
+            if adding:
+                HostelOccupancy.objects.create(hostel=self)
+
     def __str__(self):
         return f'Hostel-{self.name}'
     
     class Meta:
         ordering = ['-hostel_branch_id']
+        constraints = [
+            models.UniqueConstraint(fields=['name'], name='unique_hostel_name'),
+            models.UniqueConstraint(fields=['phone_no'], name='unique_hostel_phone_no'),
+        ]
 
 
 class Room(models.Model):
@@ -57,16 +363,43 @@ class Room(models.Model):
     description = models.CharField(max_length=50)
     price       = models.PositiveIntegerField()
     status      = models.CharField(max_length=8, choices=ROOM_STATUS_CHOICES, default='vacant')
+    version     = models.PositiveIntegerField(default=0)
+
+    objects = RoomQuerySet.as_manager()
 
     def is_room_vacant(self):
         """ if room vacant, return True """
         return self.status == 'vacant'
+
+    def is_available(self, check_in_date, check_out_date, exclude_booking=None):
+        """ if no booking of this room overlaps the given dates, return True """
+        bookings = self.bookings.overlapping(check_in_date, check_out_date)
+        if exclude_booking is not None:
+            bookings = bookings.exclude(pk=exclude_booking.pk)
+        return not bookings.exists()
             
+    def save(self, *args, **kwargs):
+        """
+            overriding save method:-
+            --> count a new room in the hostel occupancy.
+            --> reflect the room in the vacant room index once committed.
+        """
+        with transaction.atomic():
+            adding = self._state.adding
+            super(Room, self).save(*args, **kwargs)
+            if adding:
+                HostelOccupancy.objects.add(self.hostel_id, total_rooms=1, vacant_rooms=int(self.is_room_vacant()))
+            room_id, price, hostel_id, vacant = self.room_id, self.price, self.hostel_id, self.is_room_vacant()
+            transaction.on_commit(lambda: vacant_rooms.update(room_id, price, hostel_id, vacant))
+
     def __str__(self):
         return f'Room number-{self.room_id}'
     
     class Meta:
         ordering = ['-room_id']
+        indexes = [
+            models.Index(fields=['status', 'price'], name='room_status_price_idx'),
+        ]
 
 
 class Booking(models.Model):
@@ -79,6 +412,8 @@ class Booking(models.Model):
     check_out_date  = models.DateField()
     no_of_nights    = models.PositiveIntegerField(validators=[MaxValueValidator(20)])
 
+    objects = BookingQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.student}-{self.booking_id}'
     
@@ -86,15 +421,56 @@ class Booking(models.Model):
         """ 
             overriding save method:- 
             --> when a booking is done, change the related room status to reserved.
+                the room is only claimed if nobody changed it since it was read (room.version),
+                else BookingConflict is raised.
             --> calculate no of nights from check in and check out date. 
+            --> count a new booking, or a moved check out date, in the hostel occupancy.
+            --> drop the room from the vacant room index once committed.
         """
-        self.room.status = 'reserved'
-        self.room.save()
-        self.no_of_nights = (self.check_out_date - self.check_in_date).days
-        super(Booking, self).save(*args, **kwargs)
+        with transaction.atomic():
+            claimed = Room.objects.filter(pk=self.room.pk, version=self.room.version).update(
+                status='reserved', version=models.F('version') + 1)
+            if not claimed:
+                raise BookingConflict
+            """ the version matched, so the status read with the room is still the stored one """
+            room_was_vacant = self.room.is_room_vacant()
+            self.room.status = 'reserved'
+            self.room.version += 1
+            self.no_of_nights = (self.check_out_date - self.check_in_date).days
+            adding = self._state.adding
+            new_student = adding and not Booking.objects.filter(
+                student=self.student_id, room__hostel=self.room.hostel_id).exists()
+            stored_check_out_date = getattr(self, 'stored_check_out_date', None)
+            moved = not adding and stored_check_out_date not in (None, self.check_out_date)
+            super(Booking, self).save(*args, **kwargs)
+            HostelOccupancy.objects.add(
+                self.room.hostel_id,
+                vacant_rooms=-int(room_was_vacant),
+                students=int(new_student),
+                stays=[self.check_out_date] if adding or moved else [],
+                ended_stays=[stored_check_out_date] if moved else []
+            )
+            self.stored_check_out_date = self.check_out_date
+            room_id = self.room.pk
+            transaction.on_commit(lambda: vacant_rooms.remove(room_id))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        booking = super().from_db(db, field_names, values)
+        """ remember the stored check out date, save moves the active bookings counter when it changes """
+        booking.stored_check_out_date = booking.__dict__.get('check_out_date')
+        return booking
+
+    def is_active(self):
+        """ if the stay has not ended yet, return True """
+        return self.check_out_date > timezone.localdate()
     
     class Meta:
         ordering = ['-booking_id']
+        indexes = [
+            models.Index(fields=['room', 'check_out_date', 'check_in_date'], name='booking_room_stay_idx'),
+            models.Index(fields=['room', 'check_in_date'], name='booking_room_check_in_idx'),
+        ]
 
 
 class Employee(models.Model):
@@ -118,6 +494,16 @@ class Employee(models.Model):
     
     class Meta:
         ordering = ['-employee_id']
+        constraints = [
+            models.UniqueConstraint(fields=['phone_no'], name='unique_employee_phone_no'),
+            models.UniqueConstraint(fields=['first_name', 'last_name'], name='unique_employee_name'),
+            # NULLs never clash in the constraint above, a name without last name is unique on its own
+            models.UniqueConstraint(fields=['first_name'], condition=models.Q(last_name__isnull=True),
+                name='unique_employee_first_name_only'),
+        ]
+        indexes = [
+            models.Index(fields=['hostel', 'first_name'], name='employee_hostel_name_idx'),
+        ]
 
 
 class Payment(models.Model):
@@ -127,6 +513,8 @@ class Payment(models.Model):
     booking          = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='payments')
     payment_mode     = models.CharField(max_length=6, choices=PAYMENT_MODE_CHOICES, default='cash')
     payment_datetime = models.DateTimeField(auto_now_add=True) 
+
+    objects = PaymentQuerySet.as_manager()
     
     @property
     def room_price(self):
@@ -136,7 +524,18 @@ class Payment(models.Model):
     def no_of_nights(self):
         return self.booking.no_of_nights
     
+    def save(self, *args, **kwargs):
+        """ overriding save method:- add a new payment to the hostel revenue """
+        with transaction.atomic():
+            adding = self._state.adding
+            super(Payment, self).save(*args, **kwargs)
+            if adding:
+                HostelOccupancy.objects.add(self.booking.room.hostel_id, revenue=self.calculate_total_payment())
+
     def calculate_total_payment(self):
+        """ use the total computed by the database when loaded with Payment.objects.with_totals() """
+        if hasattr(self, 'total_amount'):
+            return self.total_amount
         return round(self.room_price * self.no_of_nights)
     
     @property
@@ -148,19 +547,464 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-payment_id']
+        constraints = [
+            models.UniqueConstraint(fields=['booking'], name='unique_payment_booking'),
+        ]
+        indexes = [
+            models.Index(fields=['payment_datetime'], name='payment_datetime_idx'),
+        ]
+
+
+class TranscationQuerySet(models.QuerySet):
+    """ ledger writes and lookups """
+
+    def record_many(self, transactions, batch_size=500):
+        """
+            append transactions to the ledger with bulk_create, in the caller's transaction.
+            each payment must have its booking and room loaded: the hostel and amount are copied
+            onto the row so the ledger is read without joining through the payment.
+        """
+        now = timezone.now()
+        for ledger_entry in transactions:
+            ledger_entry.fill_from_payment()
+            ledger_entry.created_at = ledger_entry.created_at or now
+        with transaction.atomic():
+            self.bulk_create(transactions, batch_size=batch_size)
+            LedgerDailySummary.objects.add(transactions)
+        return transactions
+
+    def record_payments(self, items):
+        """
+            record a ledger transaction for each of items, dicts with payment and employee ids,
+            in one transaction with a constant number of queries.
+            returns one entry per item: the recorded Transcation, or an error message.
+        """
+        results = [None] * len(items)
+        with transaction.atomic():
+            payments = Payment.objects.select_related('booking__room').in_bulk({item['payment'] for item in items})
+            employees = Employee.objects.in_bulk({item['employee'] for item in items})
+            recorded = set(self.filter(payment__in=payments).order_by().values_list('payment', flat=True))
+            new_transactions = []
+            for index, item in enumerate(items):
+                if item['payment'] not in payments:
+                    results[index] = 'Payment does not exist'
+                    continue
+                if item['employee'] not in employees:
+                    results[index] = 'Employee does not exist'
+                    continue
+                if item['payment'] in recorded:
+                    results[index] = 'Transaction was already recorded for this payment'
+                    continue
+                recorded.add(item['payment'])
+                ledger_entry = self.model(payment=payments[item['payment']], employee=employees[item['employee']])
+                results[index] = ledger_entry
+                new_transactions.append(ledger_entry)
+            if new_transactions:
+                self.record_many(new_transactions)
+                if not connections[self.db].features.can_return_rows_from_bulk_insert:
+                    self._fetch_transaction_ids(new_transactions)
+        return results
+
+    def _fetch_transaction_ids(self, transactions):
+        """ read back the primary keys of bulk created transactions, a payment is only recorded once """
+        pending = {ledger_entry.payment_id: ledger_entry for ledger_entry in transactions}
+        created = self.filter(payment__in=pending).order_by().values_list('transaction_id', 'payment')
+        for transaction_id, payment_id in created:
+            pending[payment_id].transaction_id = transaction_id
 
 
 class Transcation(models.Model):
-    """ Transaction Details """
+    """
+        Transaction Details, an append only ledger of the payments processed by each employee.
+        hostel and amount are copied from the payment when the row is recorded.
+    """
     transaction_id  = models.AutoField(primary_key=True)
     student         = models.ForeignKey(Student, on_delete=models.CASCADE)
     booking         = models.ForeignKey(Booking, on_delete=models.CASCADE)
     payment         = models.ForeignKey(Payment, on_delete=models.CASCADE)
     employee        = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    hostel          = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name='transactions')
+    amount          = models.PositiveIntegerField(default=0)
+    created_at      = models.DateTimeField(default=timezone.now)
+
+    objects = TranscationQuerySet.as_manager()
+
+    def fill_from_payment(self):
+        """ copy the student, booking, hostel and amount of the payment """
+        self.student_id = self.payment.student_id
+        self.booking_id = self.payment.booking_id
+        self.hostel_id = self.payment.booking.room.hostel_id
+        self.amount = self.payment.calculate_total_payment()
+
+    def save(self, *args, **kwargs):
+        """ overriding save method:- count a new transaction in the daily ledger summary """
+        with transaction.atomic():
+            adding = self._state.adding
+            if adding:
+                self.fill_from_payment()
+            super(Transcation, self).save(*args, **kwargs)
+            if adding:
+                LedgerDailySummary.objects.add([self])
 
     def __str__(self):
         return f'{self.student}-{self.transaction_id}'
     
     class Meta:
         ordering = ['-transaction_id']
-    
\ No newline at end of file
+        constraints = [
+            models.UniqueConstraint(fields=['payment'], name='unique_transaction_payment'),
+        ]
+        indexes = [
+            models.Index(fields=['employee', 'created_at'], name='transaction_employee_idx'),
+            models.Index(fields=['hostel', 'created_at'], name='transaction_hostel_idx'),
+        ]
+
+
+class LedgerDailySummaryQuerySet(models.QuerySet):
+    """ daily ledger totals """
+
+    def add(self, transactions):
+        """ count recorded transactions in the totals of their employee, hostel and day, in the caller's transaction """
+        deltas = {}
+        for ledger_entry in transactions:
+            key = (ledger_entry.employee_id, ledger_entry.hostel_id, timezone.localdate(ledger_entry.created_at))
+            count, amount = deltas.get(key, (0, 0))
+            deltas[key] = (count + 1, amount + ledger_entry.amount)
+        for (employee_id, hostel_id, day), (count, amount) in deltas.items():
+            updated = self.filter(employee_id=employee_id, hostel_id=hostel_id, day=day).update(
+                transactions=models.F('transactions') + count, amount=models.F('amount') + amount)
+            if updated:
+                continue
+            """ first transaction of the day """
+            try:
+                with transaction.atomic():
+                    self.create(employee_id=employee_id, hostel_id=hostel_id, day=day, transactions=count, amount=amount)
+            except IntegrityError:
+                self.filter(employee_id=employee_id, hostel_id=hostel_id, day=day).update(
+                    transactions=models.F('transactions') + count, amount=models.F('amount') + amount)
+
+    def counted(self):
+        """ the daily totals computed from the ledger with one GROUP BY query """
+        return Transcation.objects.order_by().values('employee', 'hostel', day=TruncDate('created_at')).annotate(
+            transactions=models.Count('pk'), amount=models.Sum('amount'))
+
+    def rebuild(self):
+        """ replace the stored totals with freshly counted ones, return the number of rows """
+        with transaction.atomic():
+            self.all().delete()
+            summaries = self.bulk_create(
+                LedgerDailySummary(employee_id=row['employee'], hostel_id=row['hostel'], day=row['day'],
+                    transactions=row['transactions'], amount=row['amount'])
+                for row in self.counted()
+            )
+        return len(summaries)
+
+    def totals(self, date_from=None, date_to=None):
+        """ transactions and amount per day, then overall, of the rows of this queryset in one GROUP BY query """
+        queryset = self
+        if date_from is not None:
+            queryset = queryset.filter(day__gte=date_from)
+        if date_to is not None:
+            queryset = queryset.filter(day__lte=date_to)
+        days = list(queryset.values('day').annotate(
+            transactions=models.Sum('transactions'), amount=models.Sum('amount')).order_by('day'))
+        return {
+            'transactions' : sum(day['transactions'] for day in days),
+            'amount' : sum(day['amount'] for day in days),
+            'days' : days
+        }
+
+
+class LedgerDailySummary(models.Model):
+    """
+        Transaction count and amount of an employee in a hostel on a day.
+        kept up to date in the same transaction by the ledger write paths,
+        rebuilt from the ledger with the rebuild_ledger_summary command.
+    """
+    employee     = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='ledger_days')
+    hostel       = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name='ledger_days')
+    day          = models.DateField()
+    transactions = models.IntegerField(default=0)
+    amount       = models.BigIntegerField(default=0)
+
+    objects = LedgerDailySummaryQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.employee_id}-{self.hostel_id}-{self.day}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'hostel', 'day'], name='unique_ledger_day'),
+        ]
+        indexes = [
+            models.Index(fields=['hostel', 'day'], name='ledger_hostel_day_idx'),
+        ]
+
+
+class HostelOccupancyQuerySet(models.QuerySet):
+    """ occupancy counter updates """
+    COUNTERS = ('total_rooms', 'vacant_rooms', 'active_bookings', 'students', 'revenue')
+
+    def add(self, hostel_id, stays=(), ended_stays=(), **deltas):
+        """
+            add the deltas to the counters of a hostel, in the caller's transaction.
+            stays and ended_stays are the check out dates of the bookings added and taken away:
+            active_bookings counts the bookings ending after counted_on, compared in the UPDATE itself.
+        """
+        updates = {counter: models.F(counter) + delta for counter, delta in deltas.items() if delta}
+        active_bookings = self.active_bookings_delta(stays, ended_stays)
+        if active_bookings is not None:
+            updates['active_bookings'] = models.F('active_bookings') + active_bookings
+        if not updates:
+            return
+        updated = self.filter(hostel_id=hostel_id).update(**updates)
+        if not updated:
+            """ hostel created before the counters existed, count it from scratch """
+            self.rebuild([hostel_id])
+
+    @staticmethod
+    def active_bookings_delta(stays, ended_stays):
+        """ the change of active_bookings as an expression on counted_on, None if there is none """
+        counts = Counter(stays)
+        counts.subtract(ended_stays)
+        cases = [
+            models.Case(models.When(counted_on__lt=day, then=models.Value(count)), default=models.Value(0),
+                output_field=models.IntegerField())
+            for day, count in counts.items() if count
+        ]
+        return reduce(operator.add, cases) if cases else None
+
+    def expire_stays(self, hostel_ids=None):
+        """
+            take the stays that ended since counted_on off active_bookings and move counted_on to today,
+            with one GROUP BY query over the ended bookings. returns the number of hostels brought up to date.
+        """
+        today = timezone.localdate()
+        with transaction.atomic():
+            stale = self.filter(counted_on__lt=today)
+            if hostel_ids is not None:
+                stale = stale.filter(hostel_id__in=hostel_ids)
+            stale_ids = list(stale.select_for_update().values_list('hostel_id', flat=True))
+            if not stale_ids:
+                return 0
+            ended = Booking.objects.filter(
+                room__hostel__in=stale_ids,
+                check_out_date__lte=today,
+                check_out_date__gt=models.F('room__hostel__occupancy__counted_on')
+            ).values(hostel=models.F('room__hostel')).annotate(ended=models.Count('pk')).order_by()
+            for row in ended:
+                self.filter(hostel_id=row['hostel']).update(active_bookings=models.F('active_bookings') - row['ended'])
+            self.filter(hostel_id__in=stale_ids).update(counted_on=today)
+        return len(stale_ids)
+
+    def for_hostel(self, hostel_id):
+        """ the counters of a hostel, built on first use and brought up to date once a day """
+        try:
+            occupancy = self.select_related('hostel').get(hostel_id=hostel_id)
+        except HostelOccupancy.DoesNotExist:
+            if not Hostel.objects.filter(pk=hostel_id).exists():
+                raise
+            self.rebuild([hostel_id])
+            return self.select_related('hostel').get(hostel_id=hostel_id)
+        if occupancy.counted_on < timezone.localdate():
+            self.expire_stays([hostel_id])
+            occupancy = self.select_related('hostel').get(hostel_id=hostel_id)
+        return occupancy
+
+    def counted(self, hostel_ids=None, today=None):
+        """ the counters computed from scratch with one GROUP BY query per counter """
+        today = today or timezone.localdate()
+        hostels = Hostel.objects.all() if hostel_ids is None else Hostel.objects.filter(pk__in=hostel_ids)
+        rooms = Room.objects.filter(hostel__in=hostels)
+        bookings = Booking.objects.filter(room__hostel__in=hostels)
+        grouped_counts = {
+            'total_rooms' : rooms.values('hostel').annotate(value=models.Count('pk')),
+            'vacant_rooms' : rooms.filter(status='vacant').values('hostel').annotate(value=models.Count('pk')),
+            'active_bookings' : bookings.filter(check_out_date__gt=today).values(
+                hostel=models.F('room__hostel')).annotate(value=models.Count('pk')),
+            'students' : bookings.values(hostel=models.F('room__hostel')).annotate(
+                value=models.Count('student', distinct=True)),
+            'revenue' : Payment.objects.filter(booking__room__hostel__in=hostels).values(
+                hostel=models.F('booking__room__hostel')).annotate(value=models.Sum(payment_total_expression())),
+        }
+        counters = {hostel_id: dict.fromkeys(self.COUNTERS, 0) for hostel_id in hostels.values_list('pk', flat=True)}
+        for counter, rows in grouped_counts.items():
+            for row in rows.order_by():
+                counters[row['hostel']][counter] = row['value'] or 0
+        return counters
+
+    def rebuild(self, hostel_ids=None):
+        """ replace the stored counters with freshly counted ones, return the counted values """
+        today = timezone.localdate()
+        counters = self.counted(hostel_ids, today)
+        with transaction.atomic():
+            self.filter(hostel_id__in=counters).delete()
+            self.bulk_create(HostelOccupancy(hostel_id=hostel_id, counted_on=today, **values)
+                for hostel_id, values in counters.items())
+        return counters
+
+    def drift(self, hostel_ids=None):
+        """
+            {hostel_id: {counter: (stored, counted)}} for every counter that differs from a fresh count.
+            the stays ended since counted_on are taken off first, as a read of the counters would.
+        """
+        self.expire_stays(hostel_ids)
+        counters = self.counted(hostel_ids)
+        stored = {row['hostel_id']: row for row in self.filter(hostel_id__in=counters).values('hostel_id', *self.COUNTERS)}
+        drift = {}
+        for hostel_id, values in counters.items():
+            stored_values = stored.get(hostel_id, {})
+            differences = {
+                counter: (stored_values.get(counter), value)
+                for counter, value in values.items() if stored_values.get(counter) != value
+            }
+            if differences:
+                drift[hostel_id] = differences
+        return drift
+
+
+class HostelOccupancy(models.Model):
+    """
+        Running occupancy counters of a hostel.
+        kept up to date in the same transaction by the room, booking and payment write paths,
+        rebuilt from the tables with the rebuild_occupancy command.
+        active_bookings counts the bookings ending after counted_on; the stays ended since are
+        taken off by expire_stays, run by the room sweeper and by the first read of the day.
+    """
+    hostel          = models.OneToOneField(Hostel, on_delete=models.CASCADE, primary_key=True, related_name='occupancy')
+    total_rooms     = models.IntegerField(default=0)
+    vacant_rooms    = models.IntegerField(default=0)
+    active_bookings = models.IntegerField(default=0)
+    counted_on      = models.DateField(default=timezone.localdate)
+    students        = models.IntegerField(default=0)
+    revenue         = models.BigIntegerField(default=0)
+
+    objects = HostelOccupancyQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.hostel}-occupancy'
+
+
+class IdempotencyRecordQuerySet(models.QuerySet):
+    """ idempotency key lookups """
+
+    def purge_expired(self, batch_size=1000):
+        """ delete the expired records batch_size at a time, so the table is never locked for long, return the count """
+        now = timezone.now()
+        purged = 0
+        while True:
+            expired = list(self.filter(expires_at__lte=now).order_by().values_list('pk', flat=True)[:batch_size])
+            if not expired:
+                return purged
+            purged += self.filter(pk__in=expired).delete()[0]
+
+
+class IdempotencyRecord(models.Model):
+    """
+        The response to a POST made with an Idempotency-Key header, replayed when its client sends the key again.
+        status_code is NULL while the first request is still being served, until locked_until at most.
+    """
+    client        = models.CharField(max_length=100, default='')
+    key           = models.CharField(max_length=255)
+    endpoint      = models.CharField(max_length=50)
+    fingerprint   = models.CharField(max_length=64)
+    status_code   = models.PositiveSmallIntegerField(null=True)
+    response_body = models.TextField(blank=True)
+    created_at    = models.DateTimeField(auto_now_add=True)
+    locked_until  = models.DateTimeField(null=True)
+    expires_at    = models.DateTimeField()
+
+    objects = IdempotencyRecordQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.endpoint}-{self.key}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'key', 'endpoint'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_at_idx'),
+        ]
+
+
+""" labels of the counters this process failed to bump, their ETags are not used until a bump of them succeeds """
+unbumped_labels = set()
+unbumped_lock = threading.Lock()
+
+
+class ModelVersionQuerySet(models.QuerySet):
+    """ per model change counters """
+
+    def bump(self, *model_classes):
+        """
+            count a change to the tables of model_classes once the caller's transaction commits, nothing if it
+            rolls back. the counter of a table is one row shared by all its writers: updated inside their
+            transactions it would stay locked until each commits and line them all up behind each other.
+            a read between the commit and the bump only gets the new rows under the old ETag, refetched later.
+        """
+        labels = {model_class._meta.label_lower for model_class in model_classes}
+        transaction.on_commit(lambda: self.increment(labels), using=self.db)
+
+    def increment(self, labels, attempts=20):
+        """
+            add one to the counters of labels, and of those whose bump failed before, a short autocommit
+            statement each; return True if done. the write it counts has committed already, so a counter
+            kept locked by another writer is retried, never raised to the caller. if it keeps failing,
+            the labels are remembered and is_stale() holds their ETags back until a later bump succeeds.
+        """
+        with unbumped_lock:
+            labels = set(labels) | unbumped_labels
+        for attempt in range(attempts):
+            try:
+                self._increment(labels)
+            except OperationalError as exc:
+                if not is_lock_contention(exc):
+                    raise
+                time.sleep(0.001 * attempt)
+                continue
+            with unbumped_lock:
+                unbumped_labels.difference_update(labels)
+            return True
+        logger.error('could not bump the change counters of %s, their ETags are off until a bump succeeds',
+            ', '.join(sorted(labels)))
+        with unbumped_lock:
+            unbumped_labels.update(labels)
+        return False
+
+    def is_stale(self, *model_classes):
+        """ True while the counter of one of model_classes missed a bump in this process that can not be made up yet """
+        labels = {model_class._meta.label_lower for model_class in model_classes} & unbumped_labels
+        return bool(labels) and not self.increment(labels, attempts=1)
+
+    def _increment(self, labels):
+        updated = self.filter(model__in=labels).update(version=models.F('version') + 1)
+        if updated < len(labels):
+            """ first change of a table, start its counter """
+            existing = set(self.filter(model__in=labels).values_list('model', flat=True))
+            for label in labels - existing:
+                try:
+                    with transaction.atomic():
+                        self.create(model=label, version=1)
+                except IntegrityError:
+                    self.filter(model=label).update(version=models.F('version') + 1)
+
+    def current(self, *model_classes):
+        """ [version] of model_classes in order, one query """
+        labels = [model_class._meta.label_lower for model_class in model_classes]
+        versions = dict(self.filter(model__in=labels).values_list('model', 'version'))
+        return [versions.get(label, 0) for label in labels]
+
+
+class ModelVersion(models.Model):
+    """
+        Change counter of a table, bumped by every write path of the model.
+        an ETag built from the counters a view reads changes whenever its response can.
+    """
+    model   = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    objects = ModelVersionQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.model}-{self.version}'
@@ -0,0 +1,308 @@
+from django.db import connection, OperationalError
+from django.db.models import Q
+from .models import Employee, Hostel, Student
+
+SEARCH_TABLE = 'mainapp_search'
+""" kind -> code packed into the rowid of the search table, rowid = object_id * 4 + code """
+KIND_CODES = {'student' : 1, 'employee' : 2, 'hostel' : 3}
+KIND_MODELS = {'student' : Student, 'employee' : Employee, 'hostel' : Hostel}
+
+
+def full_name(first_name, last_name):
+    if last_name:
+        return f'{first_name} {last_name}'
+    return first_name
+
+
+def student_document(student_id, first_name, last_name, phone_no):
+    return student_id, full_name(first_name, last_name), phone_no
+
+
+def employee_document(employee_id, first_name, last_name, phone_no, email_address):
+    return employee_id, full_name(first_name, last_name), f'{phone_no} {email_address}'
+
+
+def hostel_document(hostel_id, name, phone_no, address):
+    return hostel_id, name, f'{phone_no} {address}'
+
+
+""" kind -> (values_list fields, function building (object_id, name, contact) from them) """
+DOCUMENTS = {
+    'student' : (('student_id', 'first_name', 'last_name', 'phone_no'), student_document),
+    'employee' : (('employee_id', 'first_name', 'last_name', 'phone_no', 'email_address'), employee_document),
+    'hostel' : (('hostel_branch_id', 'name', 'phone_no', 'address'), hostel_document),
+}
+
+
+""" kind -> (table, id column, name sql, contact sql), the documents above in sql for the trigram search on postgresql """
+FULL_NAME_SQL = "first_name || COALESCE(' ' || NULLIF(last_name, ''), '')"
+DOCUMENT_SQL = {
+    'student' : ('mainapp_student', 'student_id', FULL_NAME_SQL, 'phone_no'),
+    'employee' : ('mainapp_employee', 'employee_id', FULL_NAME_SQL, "phone_no || ' ' || email_address"),
+    'hostel' : ('mainapp_hostel', 'hostel_branch_id', 'name', "phone_no || ' ' || address"),
+}
+
+
+def trigrams_of(text):
+    """ the lowercase trigrams of the words of text, as the trigram tokenizer sees them within a word """
+    return [word[position:position + 3] for word in text.lower().split() for position in range(len(word) - 2)]
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def starts_word(text, name='name', contact='contact', like='LIKE'):
+    """ sql and params of a word of the name or contact starting with text, a LIKE the index can not answer """
+    pattern = escape_like(text)
+    condition = '({})'.format(' OR '.join(f"{column} {like} %s ESCAPE '\\'" for column in (name, name, contact, contact)))
+    return condition, [f'{pattern}%', f'% {pattern}%'] * 2
+
+
+def quote(text):
+    """ text as an FTS5 string, matched as a substring by the trigram tokenizer """
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+class SearchIndex:
+    """
+        type-ahead search over students, employees and hostels.
+        on sqlite the names and contact details live in an FTS5 table with the trigram tokenizer
+        (created by migration 0007), so any substring of three or more characters is an index lookup.
+        the save/delete signals keep it in sync, bulk paths call index() and rebuild_search_index rebuilds it.
+        on postgresql GIN trigram indexes of pg_trgm (migration 0014) over the same documents answer
+        substrings and typos straight from the tables. other databases fall back to icontains queries.
+    """
+    candidates = 200
+    """ a fuzzy match shares this fraction of the trigrams of the query words """
+    fuzzy_similarity = 0.6
+
+    def __init__(self):
+        self.available = {}
+        self.trigrams = {}
+
+    def is_available(self):
+        """ the search table exists in the current database """
+        name = str(connection.settings_dict['NAME'])
+        if name not in self.available:
+            self.available[name] = connection.vendor == 'sqlite' and \
+                SEARCH_TABLE in connection.introspection.table_names()
+        return self.available[name]
+
+    def has_trigrams(self):
+        """ the pg_trgm extension, and so the trigram indexes, exist in the current postgresql database """
+        name = str(connection.settings_dict['NAME'])
+        if name not in self.trigrams:
+            self.trigrams[name] = False
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    self.trigrams[name] = cursor.fetchone() is not None
+        return self.trigrams[name]
+
+    def index(self, kind, queryset, batch_size=5000):
+        """ (re)index the objects of queryset """
+        if not self.is_available():
+            return
+        fields, document = DOCUMENTS[kind]
+        code = KIND_CODES[kind]
+        rows = queryset.order_by().values_list(*fields).iterator(chunk_size=batch_size)
+        with connection.cursor() as cursor:
+            batch = []
+            for values in rows:
+                object_id, name, contact = document(*values)
+                batch.append((object_id * 4 + code, name, contact))
+                if len(batch) == batch_size:
+                    self.write(cursor, batch)
+                    batch = []
+            if batch:
+                self.write(cursor, batch)
+
+    def index_objects(self, kind, objects):
+        """ (re)index saved instances, their documents come from the attributes without a query """
+        if not self.is_available():
+            return
+        fields, document = DOCUMENTS[kind]
+        code = KIND_CODES[kind]
+        documents = []
+        for instance in objects:
+            object_id, name, contact = document(*(getattr(instance, field) for field in fields))
+            documents.append((object_id * 4 + code, name, contact))
+        if documents:
+            with connection.cursor() as cursor:
+                self.write(cursor, documents)
+
+    def write(self, cursor, documents):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(rowid,) for rowid, _, _ in documents])
+        cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, name, contact) VALUES (%s, %s, %s)', documents)
+
+    def remove(self, kind, *object_ids):
+        if not self.is_available() or not object_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(object_id * 4 + KIND_CODES[kind],) for object_id in object_ids])
+
+    def rebuild(self, kinds=None, batch_size=5000):
+        """ empty the index and index every object again, returns {kind: count} """
+        if not self.is_available():
+            return {}
+        kinds = kinds or list(KIND_MODELS)
+        with connection.cursor() as cursor:
+            if set(kinds) == set(KIND_MODELS):
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            else:
+                for kind in kinds:
+                    cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid %% 4 = %s', [KIND_CODES[kind]])
+        counts = {}
+        for kind in kinds:
+            self.index(kind, KIND_MODELS[kind].objects.all(), batch_size)
+            counts[kind] = KIND_MODELS[kind].objects.count()
+        return counts
+
+    def search(self, query, kinds=None, limit=10):
+        """
+            [{'kind', 'id', 'name', 'contact', 'match'}] best first, each phase only runs when the ones before
+            found fewer than limit results:
+            'prefix' names or contacts with a word starting with the query,
+            'substring' other matches of every query word, ranked by bm25,
+            'fuzzy' matches sharing most trigrams of the query words (typos), ranked by the share.
+        """
+        query = ' '.join(query.split())
+        kinds = kinds or list(KIND_MODELS)
+        if not query:
+            return []
+        if not self.is_available():
+            if self.has_trigrams():
+                return self.search_trigrams(query, kinds, limit)
+            return self.search_database(query, kinds, limit)
+        kind_filter = f'rowid %% 4 IN ({", ".join(str(KIND_CODES[kind]) for kind in kinds)})'
+        prefix, prefix_params = starts_word(query)
+        words = query.split()
+        long_words = [word for word in words if len(word) >= 3]
+        if not long_words:
+            """ trigrams need three characters, short type-ahead input only matches prefixes, without the index """
+            return self.matches(
+                f'SELECT rowid, name, contact FROM {SEARCH_TABLE} WHERE {prefix} AND {kind_filter} LIMIT %s',
+                prefix_params + [limit], 'prefix')
+
+        """
+            every word of three characters or more as a substring, in any order and column, through the index;
+            shorter words, a word prefix each, only filter the rows it found
+        """
+        phrase = ' '.join(quote(word) for word in long_words)
+        short_filter, short_params = '', []
+        for word in words:
+            if len(word) < 3:
+                condition, params = starts_word(word)
+                short_filter += f' AND {condition}'
+                short_params += params
+        results = self.matches(
+            f'SELECT rowid, name, contact FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND {kind_filter}{short_filter} AND {prefix} LIMIT %s',
+            [phrase] + short_params + prefix_params + [limit], 'prefix')
+        if len(results) < limit:
+            """ only the first self.candidates matches are ranked, so a very common substring stays cheap """
+            results += self.matches(f'''
+                SELECT rowid, name, contact FROM (
+                    SELECT rowid, name, contact, rank FROM {SEARCH_TABLE}
+                    WHERE {SEARCH_TABLE} MATCH %s AND {kind_filter}{short_filter} AND NOT {prefix} LIMIT %s
+                ) ORDER BY rank LIMIT %s
+            ''', [phrase] + short_params + prefix_params + [self.candidates, limit - len(results)], 'substring')
+        """ typos are looked for in names, phone numbers and emails only match as typed """
+        trigrams = set(trigrams_of(' '.join(word for word in long_words if word.isalpha())))
+        if trigrams and len(results) < limit:
+            fuzzy = ' '.join(
+                '({})'.format(' OR '.join(quote(trigram) for trigram in trigrams_of(word))) if word.isalpha() else quote(word)
+                for word in long_words
+            )
+            candidates = self.matches(
+                f'SELECT rowid, name, contact FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND {kind_filter}{short_filter} LIMIT %s',
+                [f'({fuzzy}) NOT ({phrase})'] + short_params + [self.candidates], 'fuzzy')
+            scored = []
+            for result in candidates:
+                shared = len(trigrams.intersection(trigrams_of(f"{result['name']} {result['contact']}"))) / len(trigrams)
+                if shared >= self.fuzzy_similarity:
+                    scored.append((-shared, result['name'], result))
+            results += [result for _, _, result in sorted(scored, key=lambda score: score[:2])[:limit - len(results)]]
+        return results
+
+    def matches(self, sql, params, match_type):
+        kinds = {code: kind for kind, code in KIND_CODES.items()}
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        except OperationalError:
+            """ input FTS5 can not parse """
+            return []
+        return [
+            {
+                'kind' : kinds[rowid % 4],
+                'id' : rowid // 4,
+                'name' : name,
+                'contact' : contact,
+                'match' : match_type
+            }
+            for rowid, name, contact in rows
+        ]
+
+    def search_trigrams(self, query, kinds, limit):
+        """
+            postgresql: documents holding every query word as a substring, or a word sharing
+            pg_trgm.word_similarity_threshold (0.6 by default, as fuzzy_similarity) of the trigrams
+            of the query. both are answered by the GIN trigram index of the document, one query per kind,
+            ranked as on sqlite: prefix, substring, then fuzzy matches by similarity.
+        """
+        words = query.split()
+        substring_params = [f'%{escape_like(word)}%' for word in words]
+        rows = []
+        with connection.cursor() as cursor:
+            for kind in kinds:
+                table, id_column, name, contact = DOCUMENT_SQL[kind]
+                document = f"({name} || ' ' || {contact})"
+                prefix, prefix_params = starts_word(query, f'({name})', f'({contact})', 'ILIKE')
+                """ backslash is the default LIKE escape of postgresql, a plain ILIKE the index can answer """
+                substring = ' AND '.join([f'{document} ILIKE %s'] * len(words))
+                cursor.execute(f'''
+                    SELECT {id_column}, {name}, {contact}, {prefix}, {substring}, word_similarity(%s, {document})
+                    FROM {table}
+                    WHERE ({substring}) OR %s <%% {document}
+                    ORDER BY 4 DESC, 5 DESC, 6 DESC
+                    LIMIT %s
+                ''', prefix_params + substring_params + [query] + substring_params + [query, limit])
+                rows += [(kind, *row) for row in cursor.fetchall()]
+        rows.sort(key=lambda row: (not row[4], not row[5], -row[6], row[2]))
+        return [
+            {
+                'kind' : kind,
+                'id' : object_id,
+                'name' : name,
+                'contact' : contact,
+                'match' : 'prefix' if is_prefix else 'substring' if is_substring else 'fuzzy'
+            }
+            for kind, object_id, name, contact, is_prefix, is_substring, _ in rows[:limit]
+        ]
+
+    def search_database(self, query, kinds, limit):
+        """ icontains fallback for other databases, every query word in one of the fields """
+        results = []
+        for kind in kinds:
+            model = KIND_MODELS[kind]
+            fields, document = DOCUMENTS[kind]
+            condition = Q()
+            for word in query.split():
+                """ so a full name matches across first_name and last_name """
+                has_word = Q()
+                for field in fields[1:]:
+                    has_word |= Q(**{f'{field}__icontains': word})
+                condition &= has_word
+            for values in model.objects.filter(condition).order_by().values_list(*fields)[:limit - len(results)]:
+                object_id, name, contact = document(*values)
+                results.append({'kind' : kind, 'id' : object_id, 'name' : name, 'contact' : contact,
+                    'match' : 'prefix' if name.lower().startswith(query.lower()) else 'substring'})
+            if len(results) >= limit:
+                break
+        return results
+
+
+search_index = SearchIndex()
@@ -1,5 +1,53 @@
+from django.db.models import F, Case, When, Value, CharField
+from django.db.models.functions import Concat, TruncDate
 from rest_framework import serializers
-from .models import Student, Employee, Hostel, Payment, Transcation, Room, Booking
+from .models import (
+    Student, Employee, Hostel, Payment, Transcation, Room, Booking, HostelOccupancy,
+    payment_total_expression
+)
+
+
+def requested_fields(query_params, serializer_class):
+    """ the fields of ?fields=a,b, validated against the output fields of serializer_class; None if not passed """
+    value = query_params.get('fields')
+    if value is None:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    allowed = serializer_class.field_names()
+    invalid = set(fields) - set(allowed)
+    if not fields or invalid:
+        raise serializers.ValidationError({'fields' : f'fields takes a comma separated subset of {", ".join(allowed)}'})
+    return fields
+
+
+class SparseFieldsMixin:
+    """
+        sparse fieldsets for a model serializer: pass fields=[...] to output only those fields,
+        and read only their columns and joins with sparse_queryset.
+        columns maps an output field to the model fields it reads, other fields read the field of their own name.
+    """
+    columns = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def field_names(cls):
+        return list(cls().fields)
+
+    @classmethod
+    def sparse_queryset(cls, queryset, fields=None, ordering=()):
+        """ queryset narrowed with only() and select_related() to what fields (all of them if None) and ordering read """
+        columns = [column for field in fields or cls.field_names() for column in cls.columns.get(field, (field,))]
+        columns += [field.lstrip('-') for field in ordering]
+        relations = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
 
 
 # create your serializers here
@@ -19,15 +67,14 @@ class CreateEmployeeSerializer(serializers.ModelSerializer):
             'email_address', 
             'hostel'
             )
-    
-    def validate_phone_no(self, value):
-        if Employee.objects.filter(phone_no=value).exists():
-            raise serializers.ValidationError('Phone number already exists')
-        return value
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ serializer to display or list out employee details """
+    columns = {
+        'full_name' : ('first_name', 'last_name'),
+        'hostel' : ('hostel__name',),
+    }
     phone_no = serializers.RegexField("^0?[6-9]\d{9}$")
     email_address = serializers.EmailField()
     hostel = serializers.SlugRelatedField(read_only=True, slug_field='name')
@@ -44,7 +91,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
             )
 
 
-class CreateHostelSerializer(serializers.ModelSerializer):
+class CreateHostelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     phone_no = serializers.RegexField("^0?[6-9]\d{9}$")
     manager_id = serializers.IntegerField()
 
@@ -57,18 +104,28 @@ class CreateHostelSerializer(serializers.ModelSerializer):
             'manager_id', 
             'room_limit'
             )
-    
-    def validate_phone_no(self, value):
-        """ validate unique phone number exists """
-        if Hostel.objects.filter(phone_no=value).exists():
-            raise serializers.ValidationError('Phone number already exists')
-        return value
-    
-    def validate_name(self, value):
-        """ hostel name should be unique """
-        if Hostel.objects.filter(name=value).exists():
-            raise serializers.ValidationError('Hostel name already exists. Please keep some other name')
-        return value
+
+
+class HostelOccupancySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ serialize the occupancy counters of a hostel """
+    columns = {
+        'hostel' : ('hostel__name',),
+        'room_limit' : ('hostel__room_limit',),
+    }
+    hostel = serializers.SlugRelatedField(read_only=True, slug_field='name')
+    room_limit = serializers.IntegerField(read_only=True, source='hostel.room_limit')
+
+    class Meta:
+        model = HostelOccupancy
+        fields = (
+            'hostel',
+            'room_limit',
+            'total_rooms',
+            'vacant_rooms',
+            'active_bookings',
+            'students',
+            'revenue'
+            )
 
 
 class StudentSerializer(serializers.ModelSerializer):
@@ -83,18 +140,13 @@ class StudentSerializer(serializers.ModelSerializer):
             'phone_no'
             )
     
-    def validate_phone_no(self, value):
-        if Student.objects.filter(phone_no = value).exists():
-            raise serializers.ValidationError({"error":"This phone number already exists"})
-        return value
-    
 
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ serialize the room details """
 
     class Meta:
         model = Room
-        fields = ('__all__')
+        exclude = ('version',)
 
     def validate_price(self, value):
         """ room price neither can be null nor lesser than 0 """
@@ -119,15 +171,16 @@ class BookingSerializer(serializers.ModelSerializer):
             )
 
     def validate(self, data):
-        """ validate: 
+        """ validate:
                 check_out_date > check_in date,
-                is room vacant?
+                is room free for the requested dates?
          """
-        if data['check_in_date'] > data['check_out_date']:
+        check_in_date = data.get('check_in_date', getattr(self.instance, 'check_in_date', None))
+        check_out_date = data.get('check_out_date', getattr(self.instance, 'check_out_date', None))
+        room = data.get('room', getattr(self.instance, 'room', None))
+        if check_in_date > check_out_date:
             raise serializers.ValidationError({"date-error" : "check_out_date should come after check_in_date."})
-        room_id = data['room'].room_id
-        room_vacant = Room.objects.get(room_id = room_id).is_room_vacant()
-        if not room_vacant:
+        if not room.is_available(check_in_date, check_out_date, exclude_booking=self.instance):
             raise serializers.ValidationError({
                 'room-status' : 'Room is not vacant',
                 'failed' : True
@@ -135,8 +188,38 @@ class BookingSerializer(serializers.ModelSerializer):
         return data
 
 
-class GetBookingSerializer(serializers.ModelSerializer):
+class BatchBookingItemSerializer(serializers.Serializer):
+    """ one booking of a batch, related ids are checked for the whole batch at once """
+    student = serializers.IntegerField()
+    room = serializers.IntegerField()
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['check_in_date'] > data['check_out_date']:
+            raise serializers.ValidationError({"date-error" : "check_out_date should come after check_in_date."})
+        return data
+
+
+class RoomAvailabilitySerializer(serializers.Serializer):
+    """ validate the stay dates used to look up free rooms """
+    check_in_date = serializers.DateField()
+    check_out_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['check_in_date'] >= data['check_out_date']:
+            raise serializers.ValidationError({"date-error" : "check_out_date should come after check_in_date."})
+        return data
+
+
+class GetBookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Get the booking details of a particular booking """
+    columns = {
+        'student' : ('student__first_name', 'student__last_name'),
+        'room' : ('room__description',),
+        'roomprice' : ('room__price',),
+        'status' : ('room__status',),
+    }
     student = serializers.SlugRelatedField(read_only=True, slug_field='full_name')
     room = serializers.SlugRelatedField(read_only=True, slug_field='description')
     roomprice = serializers.SerializerMethodField()
@@ -193,8 +276,91 @@ class CreatePaymentSerializer(serializers.ModelSerializer):
         return value
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class BatchPaymentItemSerializer(serializers.Serializer):
+    """ one payment of a batch, related ids and duplicates are checked for the whole batch at once """
+    student = serializers.IntegerField()
+    booking = serializers.IntegerField()
+    employee = serializers.IntegerField()
+    payment_mode = serializers.ChoiceField(choices=Payment._meta.get_field('payment_mode').choices, default='cash')
+
+
+class LedgerEntrySerializer(serializers.Serializer):
+    """ one transaction to record, related ids and duplicates are checked for the whole batch at once """
+    payment = serializers.IntegerField()
+    employee = serializers.IntegerField()
+
+
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ serialize a ledger transaction with the ids of its related rows """
+
+    class Meta:
+        model = Transcation
+        fields = (
+            'transaction_id',
+            'student',
+            'booking',
+            'payment',
+            'employee',
+            'hostel',
+            'amount',
+            'created_at'
+            )
+
+
+class LedgerQuerySerializer(serializers.Serializer):
+    """ validate the date range of the ledger summaries """
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError({"date-error" : "date_to should not come before date_from."})
+        return data
+
+
+class RevenueQuerySerializer(serializers.Serializer):
+    """ validate the revenue report query params """
+    GROUPS = ('hostel', 'room', 'payment_mode', 'month')
+
+    year = serializers.IntegerField(required=False, min_value=1900, max_value=9999)
+    group_by = serializers.CharField(required=False, default='hostel,month')
+
+    def validate_group_by(self, value):
+        group_by = [key.strip() for key in value.split(',') if key.strip()]
+        invalid = set(group_by) - set(self.GROUPS)
+        if not group_by or invalid:
+            raise serializers.ValidationError(f'group_by takes a comma separated subset of {", ".join(self.GROUPS)}')
+        return list(dict.fromkeys(group_by))
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """ validate the search query params """
+    KINDS = ('student', 'employee', 'hostel')
+
+    q = serializers.CharField(max_length=100)
+    kind = serializers.CharField(required=False, default=','.join(KINDS))
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=50)
+
+    def validate_kind(self, value):
+        kinds = [kind.strip() for kind in value.split(',') if kind.strip()]
+        invalid = set(kinds) - set(self.KINDS)
+        if not kinds or invalid:
+            raise serializers.ValidationError(f'kind takes a comma separated subset of {", ".join(self.KINDS)}')
+        return list(dict.fromkeys(kinds))
+
+
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ serializers the payment details when displaying """
+    columns = {
+        'student' : ('student__first_name', 'student__last_name'),
+        'booking_date' : ('booking__booking_date',),
+        'check_in_date' : ('booking__check_in_date',),
+        'check_out_date' : ('booking__check_out_date',),
+        'room' : ('booking__room__description',),
+        'room_price' : ('booking__room__price',),
+        'no_of_nights' : ('booking__no_of_nights',),
+        'total_payments' : ('booking__room__price', 'booking__no_of_nights'),
+    }
     student = serializers.SlugRelatedField(read_only=True, slug_field='full_name')
     booking_date = serializers.SlugRelatedField(read_only=True, source='booking', slug_field='booking_date')
     check_in_date = serializers.SlugRelatedField(read_only=True, source='booking', slug_field='check_in_date')
@@ -225,3 +391,103 @@ class PaymentSerializer(serializers.ModelSerializer):
     def get_room(self, obj):
         """ get room description """
         return obj.booking.room.description
+
+
+def full_name_expression(prefix):
+    """ database side version of the full_name property for the person at prefix """
+    first_name, last_name = f'{prefix}__first_name', f'{prefix}__last_name'
+    return Case(
+        When(**{f'{last_name}__isnull': True}, then=F(first_name)),
+        When(**{last_name: ''}, then=F(first_name)),
+        default=Concat(F(first_name), Value(' '), F(last_name)),
+        output_field=CharField()
+    )
+
+
+def rename_keys(rows, renamed_keys):
+    """ values() annotations can not reuse model field names, rename them for the response """
+    for row in rows:
+        for alias, key in renamed_keys.items():
+            row[key] = row.pop(alias)
+        yield row
+
+
+class ValuesSerializer:
+    """
+        lightweight read path: serializer shaped dicts straight from queryset.values(),
+        without building model instances.
+        fields maps each output key to a field path or a database expression.
+        pass the fields=[...] of a sparse fieldset to values() and the serializer to read and output only those.
+    """
+    fields = {}
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.selected_fields = fields
+
+    @classmethod
+    def field_names(cls):
+        return list(cls.fields)
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        """ the values queryset to paginate and pass to the serializer, the primary key is always read for the cursor """
+        keys = cls.field_names() if fields is None else fields
+        field_names = [key for key in keys if not cls.is_aliased(key)]
+        if queryset.model._meta.pk.name not in field_names:
+            field_names.append(queryset.model._meta.pk.name)
+        expressions = {
+            cls.alias(key): F(cls.fields[key]) if isinstance(cls.fields[key], str) else cls.fields[key]
+            for key in keys if cls.is_aliased(key)
+        }
+        return queryset.values(*field_names, **expressions)
+
+    @classmethod
+    def is_aliased(cls, key):
+        """ model fields read under their own name are not aliased """
+        return cls.fields[key] != key
+
+    @staticmethod
+    def alias(key):
+        return f'{key}_value'
+
+    @property
+    def data(self):
+        keys = self.field_names() if self.selected_fields is None else self.selected_fields
+        renamed_keys = {self.alias(key): key for key in keys if self.is_aliased(key)}
+        rows = rename_keys(self.rows, renamed_keys)
+        if self.selected_fields is None:
+            return list(rows)
+        return [{key: row[key] for key in keys} for row in rows]
+
+
+class BookingValuesSerializer(ValuesSerializer):
+    """ the GetBookingSerializer fields """
+    fields = {
+        'booking_id' : 'booking_id',
+        'student' : full_name_expression('student'),
+        'room' : 'room__description',
+        'roomprice' : 'room__price',
+        'status' : 'room__status',
+        'booking_date' : 'booking_date',
+        'check_in_date' : 'check_in_date',
+        'check_out_date' : 'check_out_date',
+        'no_of_nights' : 'no_of_nights',
+    }
+
+
+class PaymentValuesSerializer(ValuesSerializer):
+    """ the PaymentSerializer fields """
+    fields = {
+        'payment_id' : 'payment_id',
+        'student' : full_name_expression('student'),
+        'booking_date' : 'booking__booking_date',
+        'check_in_date' : 'booking__check_in_date',
+        'check_out_date' : 'booking__check_out_date',
+        'room' : 'booking__room__description',
+        'room_price' : 'booking__room__price',
+        'no_of_nights' : 'booking__no_of_nights',
+        'payment_mode' : 'payment_mode',
+        'payment_datetime' : TruncDate('payment_datetime'),
+        'total_payments' : payment_total_expression(),
+    }
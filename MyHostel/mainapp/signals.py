@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .cache import object_cache
+from .metrics import count_query
+from .models import Booking, Employee, Hostel, ModelVersion, Payment, Room, Student
+from .search import search_index
+
+
+@receiver([post_save, post_delete], sender=Hostel)
+def invalidate_hostel(sender, instance, **kwargs):
+    """
+        drop the cached hostel, and the cached employees showing its name, once the write is committed:
+        a reader running before the commit would otherwise cache the old row again until the TTL
+    """
+    hostel_id = instance.pk
+    employee_ids = list(Employee.objects.filter(hostel=hostel_id).values_list('pk', flat=True))
+    transaction.on_commit(lambda: (
+        object_cache.invalidate(Hostel, hostel_id), object_cache.invalidate(Employee, *employee_ids)))
+
+
+@receiver([post_save, post_delete], sender=Employee)
+def invalidate_employee(sender, instance, **kwargs):
+    employee_id = instance.pk
+    transaction.on_commit(lambda: object_cache.invalidate(Employee, employee_id))
+
+
+@receiver([post_save, post_delete], sender=Hostel)
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=Student)
+@receiver([post_save, post_delete], sender=Payment)
+def bump_model_version(sender, **kwargs):
+    """ change the ETags of the views reading this table """
+    ModelVersion.objects.bump(sender)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def bump_booking_version(sender, **kwargs):
+    """ Booking.save reserves its room with an update, which sends no signal of its own """
+    ModelVersion.objects.bump(Booking, Room)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Hostel)
+def index_for_search(sender, instance, **kwargs):
+    """ keep the search index in step with every save, in the same transaction """
+    search_index.index_objects(sender._meta.model_name, [instance])
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Hostel)
+def remove_from_search(sender, instance, **kwargs):
+    search_index.remove(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_migrate)
+def reset_search_index(sender, **kwargs):
+    """ migrations create or drop the search table, check for it again """
+    search_index.available.clear()
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    """ every database connection charges its queries to the request being served """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """ apply the SQLITE_PRAGMAS and SQLITE_IMMEDIATE_TRANSACTIONS of the database profile to new sqlite connections """
+    if connection.vendor != 'sqlite':
+        return
+    if settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            for pragma, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+    if settings.SQLITE_IMMEDIATE_TRANSACTIONS and begin_immediate not in connection.execute_wrappers:
+        connection.execute_wrappers.append(begin_immediate)
+
+
+def begin_immediate(execute, sql, params, many, context):
+    """ transaction.atomic() opens sqlite transactions with a plain BEGIN, take the write lock right away """
+    if sql == 'BEGIN':
+        sql = 'BEGIN IMMEDIATE'
+    return execute(sql, params, many, context)
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection, transaction, models
+from django.utils import timezone
+from .models import HostelOccupancy, ModelVersion, Room
+from .vacancy import vacant_rooms
+
+logger = logging.getLogger(__name__)
+
+
+def release_rooms(today=None, batch_size=500):
+    """
+        set every reserved room whose bookings have all ended back to vacant.
+        rooms are walked in primary key order batch_size at a time, each batch in its own short
+        transaction: lock the candidates, release them with one UPDATE, move the hostel occupancy
+        counters and bump the room versions so a booking that read the room before conflicts.
+        the stays that ended since the last sweep are then taken off the active bookings counters.
+        returns {'released', 'batches', 'seconds'}.
+    """
+    today = today or timezone.localdate()
+    started = time.perf_counter()
+    released = batches = 0
+    last_room_id = 0
+    while True:
+        with transaction.atomic():
+            candidates = list(
+                Room.objects.releasable(today).select_for_update().filter(pk__gt=last_room_id)
+                .order_by('pk').values_list('pk', 'price', 'hostel')[:batch_size]
+            )
+            if not candidates:
+                break
+            room_ids = [room_id for room_id, _, _ in candidates]
+            """ the conditions again, in case a booking came in before the rows were locked """
+            updated = Room.objects.releasable(today).filter(pk__in=room_ids).update(
+                status='vacant', version=models.F('version') + 1)
+            hostel_ids = {hostel_id for _, _, hostel_id in candidates}
+            if updated:
+                ModelVersion.objects.bump(Room)
+            if updated == len(candidates):
+                deltas = {}
+                for _, _, hostel_id in candidates:
+                    deltas[hostel_id] = deltas.get(hostel_id, 0) + 1
+                for hostel_id, vacant in deltas.items():
+                    HostelOccupancy.objects.add(hostel_id, vacant_rooms=vacant)
+                transaction.on_commit(lambda candidates=candidates: [
+                    vacant_rooms.add(room_id, price, hostel_id) for room_id, price, hostel_id in candidates])
+            else:
+                """ a concurrent writer got in first (no row locks on sqlite), count these hostels again """
+                HostelOccupancy.objects.rebuild(hostel_ids)
+                transaction.on_commit(vacant_rooms.invalidate)
+        released += updated
+        batches += 1
+        last_room_id = room_ids[-1]
+    HostelOccupancy.objects.expire_stays()
+    return {'released' : released, 'batches' : batches, 'seconds' : round(time.perf_counter() - started, 3)}
+
+
+class RoomSweeper:
+    """
+        in process runner calling release_rooms every interval seconds on a daemon thread,
+        started by the app when ROOM_SWEEP_INTERVAL is set. for more than one process prefer
+        scheduling the release_rooms command instead.
+    """
+
+    def __init__(self, interval, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='room-sweeper', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sweep()
+
+    def sweep(self):
+        try:
+            report = release_rooms(batch_size=self.batch_size)
+            logger.info('released %(released)s rooms in %(batches)s batches, %(seconds)ss', report)
+            return report
+        except Exception:
+            logger.exception('room sweep failed')
+        finally:
+            """ this thread is not a request, nothing else closes its connection """
+            connection.close()
+
+
+def start_sweeper():
+    """ the RoomSweeper of ROOM_SWEEP_INTERVAL, None when it is off """
+    interval = getattr(settings, 'ROOM_SWEEP_INTERVAL', 0)
+    if not interval:
+        return None
+    sweeper = RoomSweeper(interval, getattr(settings, 'ROOM_SWEEP_BATCH_SIZE', 500))
+    sweeper.start()
+    return sweeper
@@ -1,9 +1,74 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from unittest import mock
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
-from rest_framework.test import APITestCase
-from .models import Student, Booking, Employee, Room, Hostel
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from .benchmarks import rolled_back
+from .cache import LRUFileBasedCache, object_cache
+from .datasets import generate_dataset
+from .metrics import EndpointStats, metrics
+from .signals import begin_immediate, tune_sqlite_connection
+from .sweeper import release_rooms
+from .throttling import TokenBuckets, buckets
+from .models import Student, Booking, Employee, Room, Hostel, HostelOccupancy, IdempotencyRecord, Payment, Transcation
+from .models import LedgerDailySummary, ModelVersion, ModelVersionQuerySet, PaymentQuerySet, unbumped_labels
+from .search import search_index
+from .serializers import CreatePaymentSerializer
+from .vacancy import vacant_rooms
 
 # Create your tests here.
 
+class QueryBudgetMixin:
+    """ assert how many SQL queries an endpoint runs per request, as counted by the metrics middleware """
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, budget):
+        before = metrics.snapshot().get(url_name, EndpointStats())
+        yield
+        after = metrics.snapshot().get(url_name, EndpointStats())
+        requests, queries = after.requests - before.requests, after.queries - before.queries
+        self.assertGreater(requests, 0, f'no request reached {url_name}')
+        self.assertLessEqual(queries, budget * requests,
+            f'{url_name} ran {queries} queries in {requests} requests, the budget is {budget} per request')
+
+
+class BatchFixtureMixin:
+    """ a hostel with new students and rooms made in bulk, for the batch endpoints """
+
+    def setUp(self):
+        super().setUp()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+
+    def make_students_and_rooms(self, size):
+        """ [(student_id, room_id)] of size new students, each with a new room """
+        offset = Student.objects.count()
+        Room.objects.bulk_create(
+            Room(hostel=self.hostel, description=f'Room {i}', price=1000) for i in range(size))
+        Student.objects.bulk_create(
+            Student(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            for i in range(offset, offset + size))
+        return list(zip(
+            Student.objects.order_by('-student_id').values_list('student_id', flat=True)[:size],
+            Room.objects.order_by('-room_id').values_list('room_id', flat=True)[:size]))
+
+
 class StudentTestCase(APITestCase):
     """ 
         TestCase to check all student logics
@@ -49,6 +114,24 @@ class StudentTestCase(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(self.currentCount, latest_count)
     
+    def test_duplicate_student_without_last_name(self):
+        """ a student with no last name is a duplicate of another with the same first name and no last name """
+        solo = {'first_name' : 'Solo', 'address' : 'Bhavnath-1', 'phone_no' : '8849091265'}
+        self.assertEqual(self.client.post('/api/v1/createStudent/', solo).status_code, 201)
+        response = self.client.post('/api/v1/createStudent/', dict(solo, phone_no='8849091266'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Student already exists')
+        response = self.client.post('/api/v1/createStudent/', dict(solo, last_name='JS', phone_no='8849091266'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Student.objects.count(), self.currentCount + 2)
+
+    def test_duplicate_student_query_count(self):
+        """ duplicates are caught by the unique constraints, without lookups before the insert """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/createStudent/', self.student_attrs)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(any(query['sql'].startswith('SELECT') for query in queries))
+
     def test_phoneno_duplicate(self):
         """ test if phone number already exists, it doesn't allow """
         duplicate_student_attr = self.student_attrs.copy()
@@ -93,6 +176,1346 @@ class BookingTestCase(APITestCase):
         self.assertGreaterEqual(response.data['check_out_date'], response.data['check_in_date'], 
         msg='Check_out_date should be greater than check_in_date')
 
+    def test_booking_same_room_other_dates(self):
+        """ a booked room can be booked again for a stay that does not overlap """
+        self.client.post('/api/v1/booking/', self.booking_attrs)
+        later_stay = self.booking_attrs.copy()
+        later_stay.update(check_in_date='2021-05-23', check_out_date='2021-05-25')
+        response = self.client.post('/api/v1/booking/', later_stay)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Booking.objects.count(), self.current_count + 2)
+
+    def test_overlapping_booking_invalid(self):
+        """ deny booking a room for dates overlapping an existing booking """
+        self.client.post('/api/v1/booking/', self.booking_attrs)
+        overlapping_stay = self.booking_attrs.copy()
+        overlapping_stay.update(check_in_date='2021-05-22', check_out_date='2021-05-24')
+        response = self.client.post('/api/v1/booking/', overlapping_stay)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['failed'])
+        self.assertEqual(Booking.objects.count(), self.current_count + 1)
+
+
+class IdempotencyKeyTestCase(APITestCase):
+    """ retried booking and payment POSTs with an Idempotency-Key get the first response back """
+
+    def setUp(self):
+        hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        room = Room.objects.create(hostel=hostel, description='King Sized Bedroom', price=3000, status='vacant')
+        self.student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        self.booking_attrs = {
+            "student": self.student.pk,
+            "room": room.pk,
+            "check_in_date": "2021-05-19",
+            "check_out_date": "2021-05-23"
+            }
+
+    def test_replayed_booking(self):
+        response = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(response.status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            replayed = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual((replayed.status_code, replayed.data), (201, response.data))
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertFalse([query for query in queries if 'mainapp_booking' in query['sql'] or 'mainapp_room' in query['sql']])
+        self.assertEqual(Booking.objects.count(), 1)
+        other_stay = dict(self.booking_attrs, check_in_date='2021-06-19', check_out_date='2021-06-23')
+        response = self.client.post('/api/v1/booking/', other_stay, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post('/api/v1/booking/', other_stay, HTTP_IDEMPOTENCY_KEY='booking-2')
+        self.assertEqual(response.status_code, 201)
+
+    def test_replayed_payment(self):
+        self.client.post('/api/v1/booking/', self.booking_attrs)
+        payment = {'student' : self.student.pk, 'booking' : Booking.objects.get().pk, 'payment_mode' : 'online'}
+        response = self.client.post('/api/v1/payment/', payment, HTTP_IDEMPOTENCY_KEY='payment-1')
+        self.assertEqual(response.status_code, 201)
+        """ without the key a retry is refused as a second payment """
+        self.assertEqual(self.client.post('/api/v1/payment/', payment).status_code, 400)
+        response = self.client.post('/api/v1/payment/', payment, HTTP_IDEMPOTENCY_KEY='payment-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_concurrent_payment(self):
+        """ a payment that passed validation next to a concurrent one is refused by the unique booking constraint """
+        self.client.post('/api/v1/booking/', self.booking_attrs)
+        payment = {'student' : self.student.pk, 'booking' : Booking.objects.get().pk, 'payment_mode' : 'online'}
+        self.client.post('/api/v1/payment/', payment)
+        refused = self.client.post('/api/v1/payment/', payment)
+        with mock.patch.object(CreatePaymentSerializer, 'validate_booking', lambda serializer, value: value), \
+                mock.patch.object(CreatePaymentSerializer, 'validate_student', lambda serializer, value: value):
+            response = self.client.post('/api/v1/payment/', payment)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['booking'], refused.data['booking'])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_stale_claim(self):
+        """ a request still in progress holds its key until its lease runs out, then a retry claims it over """
+        response = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        fingerprint = IdempotencyRecord.objects.get().fingerprint
+        IdempotencyRecord.objects.update(status_code=None, response_body='')
+        Booking.objects.all().delete()
+        self.assertEqual(self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1').status_code, 409)
+        IdempotencyRecord.objects.update(locked_until=timezone.now())
+        retried = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(retried.status_code, 201)
+        self.assertEqual((retried.data['student'], retried.data['room']), (response.data['student'], response.data['room']))
+        record = IdempotencyRecord.objects.get()
+        self.assertEqual((record.status_code, record.fingerprint), (201, fingerprint))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_keys_per_client(self):
+        """ the same key sent by another client is a request of its own, not a replay """
+        response = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1',
+            REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1',
+            REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(IdempotencyRecord.objects.count(), 2)
+
+    def test_expired_keys(self):
+        self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        """ an expired key runs the request again """
+        response = self.client.post('/api/v1/booking/', self.booking_attrs, HTTP_IDEMPOTENCY_KEY='booking-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 400)
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        output = io.StringIO()
+        call_command('purge_idempotency_keys', stdout=output)
+        self.assertIn('Purged 1 expired idempotency keys', output.getvalue())
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
+@override_settings(THROTTLE_BUDGETS={
+    'List_Vacant_Rooms': {'rate': 1, 'burst': 3},
+    'Async_List_Vacant_Rooms': {'rate': 1, 'burst': 3},
+    'Do_Booking': {'rate': 1, 'burst': 1, 'methods': ['POST']},
+    'Do_Batch_Booking': {'shares': 'Do_Booking', 'methods': ['POST']},
+    'Get_Booking_Details': {'shares': 'Do_Booking', 'methods': ['PUT']},
+})
+class ThrottleTestCase(TransactionTestCase):
+    """ every client gets its own token bucket per throttled route """
+
+    def setUp(self):
+        buckets.clear()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        Room.objects.create(hostel=self.hostel, description='King Sized Bedroom', price=3000, status='vacant')
+
+    def test_token_bucket(self):
+        kiosk = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual([kiosk.get('/api/v1/getVacantRooms/').status_code for _ in range(4)], [200, 200, 200, 429])
+        response = kiosk.get('/api/v1/getVacantRooms/')
+        self.assertEqual(response['Retry-After'], '1')
+        """ a made up api key is no way around the budget """
+        self.assertEqual(kiosk.get('/api/v1/getVacantRooms/', HTTP_X_API_KEY='new').status_code, 429)
+        """ other clients and other routes keep their own budget """
+        self.assertEqual(APIClient(REMOTE_ADDR='10.0.0.2').get('/api/v1/getVacantRooms/').status_code, 200)
+        self.assertEqual(kiosk.get('/api/v1/async/getVacantRooms/').status_code, 200)
+        self.assertEqual(kiosk.get(f'/api/v1/getHostelDetails/{self.hostel.pk}/').status_code, 200)
+        for _ in range(3):
+            response = kiosk.get('/api/v1/async/getVacantRooms/')
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '1'))
+
+    def test_budget_methods(self):
+        """ the booking budget counts bookings made, not listings """
+        self.assertEqual([self.client.get('/api/v1/booking/').status_code for _ in range(3)], [200, 200, 200])
+        self.assertEqual([self.client.post('/api/v1/booking/', {}).status_code for _ in range(2)], [400, 429])
+
+    def test_shared_budget(self):
+        """ batches and updates of bookings take from the bucket of the bookings a client makes """
+        kiosk = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(kiosk.post('/api/v1/booking/', {}).status_code, 400)
+        self.assertEqual(kiosk.post('/api/v1/booking/batch/', [], format='json').status_code, 429)
+        self.assertEqual(kiosk.put('/api/v1/booking/1/', {}).status_code, 429)
+        desk = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertNotEqual(desk.post('/api/v1/booking/batch/', [], format='json').status_code, 429)
+        self.assertEqual(desk.post('/api/v1/booking/', {}).status_code, 429)
+
+    def test_bucket_refills(self):
+        bucket = TokenBuckets(max_buckets=2)
+        self.assertEqual([bucket.take('kiosk', 100, 2) for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.take('kiosk', 100, 2), 0)
+        time.sleep(0.02)
+        self.assertEqual(bucket.take('kiosk', 100, 2), 0)
+        bucket.take('desk', 100, 2)
+        bucket.take('lobby', 100, 2)
+        self.assertEqual(list(bucket.buckets), ['desk', 'lobby'])
+
+
+class BatchBookingTestCase(BatchFixtureMixin, APITestCase):
+    """
+        TestCase to check booking a group of students in one request
+    """
+    def make_batch(self, size):
+        return [
+            {'student': student_id, 'room': room_id, 'check_in_date': '2021-05-19', 'check_out_date': '2021-05-23'}
+            for student_id, room_id in self.make_students_and_rooms(size)
+        ]
+
+    def test_batch_booking(self):
+        """ valid items are booked, invalid and clashing items are reported """
+        batch = self.make_batch(2)
+        batch.append(dict(batch[0], check_in_date='2021-05-20'))
+        batch.append(dict(batch[1], room=0))
+        batch.append(dict(batch[1], check_in_date='2021-05-25'))
+        response = self.client.post('/api/v1/booking/batch/', batch, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['created'] for result in response.data['results']], [True, True, False, False, False])
+        self.assertEqual(response.data['results'][2]['errors']['error'], ['Room is not vacant'])
+        self.assertEqual(response.data['results'][3]['errors']['error'], ['Room does not exist'])
+        self.assertIn('date-error', response.data['results'][4]['errors'])
+        booking = Booking.objects.get(booking_id=response.data['results'][0]['booking_id'])
+        self.assertEqual(booking.no_of_nights, 4)
+        self.assertEqual(booking.room.status, 'reserved')
+
+    def test_batch_booking_query_count(self):
+        """ the number of queries does not grow with the batch size """
+        for size in (3, 60):
+            batch = self.make_batch(size)
+            with self.assertNumQueries(10):
+                response = self.client.post('/api/v1/booking/batch/', batch, format='json')
+            self.assertEqual(response.data['created'], size)
+
+
+class BatchPaymentTestCase(BatchFixtureMixin, APITestCase):
+    """
+        TestCase to check settling a list of payments in one request
+    """
+    def setUp(self):
+        super().setUp()
+        self.employee = Employee.objects.create(first_name='Warden', address='Staff Quarters', phone_no='9999912346',
+            hostel=self.hostel)
+
+    def make_batch(self, size):
+        Booking.objects.bulk_create(
+            Booking(student_id=student_id, room_id=room_id, check_in_date=date(2021, 5, 19),
+                check_out_date=date(2021, 5, 23), no_of_nights=4)
+            for student_id, room_id in self.make_students_and_rooms(size))
+        return [
+            {'student': student_id, 'booking': booking_id, 'employee': self.employee.pk, 'payment_mode': 'cash'}
+            for booking_id, student_id in Booking.objects.order_by('-booking_id').values_list('booking_id', 'student')[:size]
+        ]
+
+    def test_batch_payment(self):
+        """ valid items are paid with their transaction, duplicates and invalid items are reported """
+        batch = self.make_batch(2)
+        batch.append(dict(batch[0]))
+        batch.append(dict(batch[1], booking=0))
+        batch.append(dict(batch[1], payment_mode='cheque'))
+        response = self.client.post('/api/v1/payment/', batch, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['created'] for result in response.data['results']], [True, True, False, False, False])
+        self.assertEqual(response.data['results'][0]['total_payments'], 4000)
+        self.assertEqual(response.data['results'][2]['errors']['error'], ['Payment was already done for this booking'])
+        self.assertEqual(response.data['results'][3]['errors']['error'], ['Booking does not exist'])
+        self.assertIn('payment_mode', response.data['results'][4]['errors'])
+        payment_ids = [result['payment_id'] for result in response.data['results'][:2]]
+        self.assertEqual(set(Transcation.objects.values_list('payment', flat=True)), set(payment_ids))
+        self.assertEqual(HostelOccupancy.objects.for_hostel(self.hostel.pk).revenue, 8000)
+
+        response = self.client.post('/api/v1/payment/', batch[:1], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['errors']['error'], ['Payment was already done for this booking'])
+
+    def test_batch_payment_race(self):
+        """ a batch beaten to a booking is checked again, and answered with 409 if it keeps losing """
+        batch = self.make_batch(2)
+        lost_race = IntegrityError('UNIQUE constraint failed: mainapp_payment.booking_id')
+        pay_many = PaymentQuerySet.pay_many
+        calls = []
+
+        def paid_concurrently(queryset, items):
+            calls.append(items)
+            if len(calls) == 1:
+                Payment.objects.create(student_id=items[0]['student'], booking_id=items[0]['booking'])
+                raise lost_race
+            return pay_many(queryset, items)
+
+        with mock.patch.object(PaymentQuerySet, 'pay_many', paid_concurrently):
+            response = self.client.post('/api/v1/payment/', batch, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['created'] for result in response.data['results']], [False, True])
+        self.assertEqual(response.data['results'][0]['errors']['error'], ['Payment was already done for this booking'])
+
+        with mock.patch.object(PaymentQuerySet, 'pay_many', side_effect=lost_race):
+            response = self.client.post('/api/v1/payment/', self.make_batch(1), format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.data['retryable'])
+
+    def test_batch_payment_query_count(self):
+        """ the number of queries does not grow with the batch size """
+        """ the first payment of the day starts the ledger total of the employee """
+        self.client.post('/api/v1/payment/', self.make_batch(1), format='json')
+        for size in (3, 60):
+            batch = self.make_batch(size)
+            with self.assertNumQueries(14):
+                response = self.client.post('/api/v1/payment/', batch, format='json')
+            self.assertEqual(response.data['created'], size)
+
+
+class LedgerTestCase(APITestCase):
+    """
+        TestCase to check recording transactions in the ledger and the per employee and hostel summaries
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.employee = Employee.objects.create(first_name='Warden', address='Staff Quarters', phone_no='9999912346',
+            hostel=self.hostel)
+        room = Room.objects.create(hostel=self.hostel, description='Room 1', price=1000)
+        self.payments = []
+        for i in range(3):
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'999990000{i}')
+            booking = Booking.objects.create(student=student, room=room, check_in_date=date(2021, 5, 10 + 5 * i),
+                check_out_date=date(2021, 5, 12 + 5 * i))
+            self.payments.append(Payment.objects.create(student=student, booking=booking))
+
+    def test_record_transactions(self):
+        """ valid items are recorded with the hostel and amount of their payment, duplicates are reported """
+        entries = [{'payment': payment.pk, 'employee': self.employee.pk} for payment in self.payments[:2]]
+        entries += [dict(entries[0]), {'payment': 0, 'employee': self.employee.pk}, {'payment': 'x'}]
+        response = self.client.post('/api/v1/ledger/', entries, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['created'] for result in response.data['results']], [True, True, False, False, False])
+        self.assertEqual(response.data['results'][2]['errors']['error'], ['Transaction was already recorded for this payment'])
+        self.assertEqual(response.data['results'][3]['errors']['error'], ['Payment does not exist'])
+        ledger_entry = Transcation.objects.get(pk=response.data['results'][0]['transaction_id'])
+        self.assertEqual((ledger_entry.hostel_id, ledger_entry.amount, ledger_entry.student_id),
+            (self.hostel.pk, 2000, self.payments[0].student_id))
+
+        response = self.client.post('/api/v1/ledger/', {'payment': self.payments[2].pk, 'employee': self.employee.pk},
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get('/api/v1/ledger/', {'employee': self.employee.pk})
+        self.assertEqual([row['payment'] for row in response.data['results']], [self.payments[2].pk, self.payments[1].pk])
+
+    def test_summaries(self):
+        """ the summaries are read from the daily totals, which match the ledger """
+        Transcation.objects.create(payment=self.payments[0], employee=self.employee,
+            created_at=timezone.now() - timedelta(days=1))
+        self.client.post('/api/v1/ledger/', [{'payment': payment.pk, 'employee': self.employee.pk}
+            for payment in self.payments[1:]], format='json')
+        self.assertEqual(LedgerDailySummary.objects.count(), 2)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/v1/ledger/employee/{self.employee.pk}/')
+        self.assertEqual((response.data['transactions'], response.data['amount']), (3, 6000))
+        self.assertEqual([day['transactions'] for day in response.data['days']], [1, 2])
+        response = self.client.get(f'/api/v1/ledger/hostel/{self.hostel.pk}/', {'date_from': timezone.localdate()})
+        self.assertEqual((response.data['hostel'], response.data['transactions'], response.data['amount']),
+            (self.hostel.pk, 2, 4000))
+
+        stored = list(LedgerDailySummary.objects.order_by('day').values_list('day', 'transactions', 'amount'))
+        LedgerDailySummary.objects.rebuild()
+        self.assertEqual(list(LedgerDailySummary.objects.order_by('day').values_list('day', 'transactions', 'amount')),
+            stored)
+        self.assertEqual(self.client.get('/api/v1/ledger/employee/0/').status_code, 404)
+
+
+@override_settings(THROTTLE_BUDGETS={})
+class ConcurrentBookingTestCase(TransactionTestCase):
+    """
+        TestCase to check parallel booking requests never double book a room, all from one unthrottled client
+    """
+    threads_per_room = 8
+
+    def setUp(self):
+        hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rooms = [Room.objects.create(hostel=hostel, description=f'Room {i}', price=1000) for i in range(3)]
+        self.students = [
+            Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            for i in range(len(self.rooms) * self.threads_per_room)
+        ]
+
+    def book(self, student, room, results):
+        """ keep retrying the booking while the api answers 409 """
+        client = APIClient()
+        booking_attrs = {
+            'student': student.student_id,
+            'room': room.room_id,
+            'check_in_date': '2021-05-19',
+            'check_out_date': '2021-05-23'
+            }
+        try:
+            for attempt in range(200):
+                response = client.post('/api/v1/booking/', booking_attrs)
+                if response.status_code != 409:
+                    break
+                self.assertTrue(response.data['retryable'])
+                time.sleep(0.001 * attempt)
+            results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_no_double_booking(self):
+        results = []
+        threads = [
+            threading.Thread(target=self.book, args=(student, self.rooms[i % len(self.rooms)], results))
+            for i, student in enumerate(self.students)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), len(self.students))
+        self.assertEqual(results.count(201), len(self.rooms))
+        self.assertEqual(results.count(400), len(self.students) - len(self.rooms))
+        for room in self.rooms:
+            self.assertEqual(room.bookings.count(), 1)
+
+
+class AsyncReadPathTestCase(QueryBudgetMixin, TransactionTestCase):
+    """
+        TestCase to check the async views answer like the sync ones.
+        their queries run on other threads, so the data has to be committed.
+    """
+    def setUp(self):
+        vacant_rooms.invalidate()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000 * (i + 1)) for i in range(3)]
+        for i, room in enumerate(rooms[:2]):
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            booking = Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+            self.payment = Payment.objects.create(student=student, booking=booking)
+        self.client = APIClient()
+
+    def tearDown(self):
+        vacant_rooms.invalidate()
+
+    def assertSameResponse(self, path, **params):
+        sync_response = self.client.get(f'/api/v1/{path}', params)
+        async_response = self.client.get(f'/api/v1/async/{path}', params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        """ page links point back at the async endpoint """
+        self.assertEqual(json.loads(async_response.content.decode().replace('/async/', '/')), sync_response.json())
+
+    def test_same_responses(self):
+        self.assertSameResponse('booking/', page_size=1)
+        self.assertSameResponse('booking/', lite='true', price_limit=1000)
+        self.assertSameResponse(f'payment/{self.payment.pk}/')
+        self.assertSameResponse('payment/', payment_mode='cash')
+        self.assertSameResponse(f'getHostelDetails/{self.hostel.pk}/')
+        self.assertSameResponse('getVacantRooms/')
+        self.assertSameResponse('getVacantRooms/', price_limit=2000)
+        self.assertSameResponse('getVacantRooms/', check_in_date='2021-05-20', check_out_date='2021-05-21')
+        self.assertSameResponse('booking/', fields='booking_id,roomprice')
+        self.assertSameResponse('payment/', lite='true', fields='payment_id,total_payments')
+        self.assertSameResponse('getVacantRooms/', fields='room_id,price')
+        self.assertSameResponse(f'getHostelDetails/{self.hostel.pk}/', fields='name')
+
+    def test_stale_vacant_room_index(self):
+        """ a room vacated by another process, unseen by the index, is still listed """
+        vacant = Room.objects.get(status='vacant')
+        Room.objects.update(status='reserved')
+        vacant_rooms.load()
+        Room.objects.filter(pk=vacant.pk).update(status='vacant')
+        response = self.client.get('/api/v1/async/getVacantRooms/', {'price_limit': 3000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room['room_id'] for room in response.json()['results']], [vacant.room_id])
+
+    def test_queries_counted_on_pool_threads(self):
+        before = metrics.snapshot().get('Async_Do_Booking', EndpointStats()).queries
+        with self.assertQueryBudget('Async_Do_Booking', 1):
+            self.client.get('/api/v1/async/booking/')
+        self.assertEqual(metrics.snapshot()['Async_Do_Booking'].queries, before + 1)
+
+    def test_errors(self):
+        self.assertSameResponse('booking/0/')
+        self.assertSameResponse('payment/', payment_mode='card')
+        self.assertSameResponse('booking/', fields='booking_id,secret')
+        self.assertEqual(self.client.get('/api/v1/async/getHostelDetails/0/').status_code, 404)
+        self.assertEqual(self.client.post('/api/v1/async/booking/').status_code, 405)
+
+
+class HostelStudentsTestCase(APITestCase):
+    """
+        TestCase to check listing the students of a hostel
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        for i in range(3):
+            room = Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000)
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+        self.url = f'/api/v1/getStudents/{self.hostel.hostel_branch_id}/'
+
+    def test_students_from_hostel(self):
+        """ one query returns every student of the hostel """
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['student_full_names_list'], ['Test 2', 'Test 1', 'Test 0'])
+        self.assertEqual(response.json()['message'], 'got 3 students')
+
+    def test_students_from_hostel_paginated(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.json()['student_full_names_list'], ['Test 2', 'Test 1'])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.json()['student_full_names_list'], ['Test 0'])
+        self.assertIsNone(response.json()['next'])
+
+    def test_students_from_hostel_streamed(self):
+        response = self.client.get(self.url, {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['student_full_names_list'], ['Test 2', 'Test 1', 'Test 0'])
+        self.assertEqual(data['message'], 'got 3 students')
+
+    def test_students_from_unknown_hostel(self):
+        response = self.client.get('/api/v1/getStudents/0/')
+        self.assertEqual(response.status_code, 400)
+
+
+class ListingQueryCountTestCase(APITestCase):
+    """
+        TestCase to check booking and payment listings run a constant number of queries
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rows = 0
+
+    def add_rows(self, count):
+        for i in range(self.rows, self.rows + count):
+            room = Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000 + i)
+            student = Student.objects.create(first_name=f'Test {i}', last_name=str(i) if i % 2 else None,
+             address='qwerty', phone_no=f'99999{i:05d}')
+            booking = Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+            Payment.objects.create(student=student, booking=booking, payment_mode='cash')
+        self.rows += count
+
+    def assertConstantQueries(self, url, params=None):
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as few_rows:
+            self.client.get(url, params)
+        self.add_rows(20)
+        with CaptureQueriesContext(connection) as many_rows:
+            response = self.client.get(url, params)
+        self.assertEqual(len(few_rows), len(many_rows))
+        return response
+
+    def test_booking_listing_queries(self):
+        self.assertConstantQueries('/api/v1/booking/', {'page_size': 100})
+        self.assertConstantQueries('/api/v1/booking/', {'page_size': 100, 'lite': 'true'})
+
+    def test_payment_listing_queries(self):
+        self.assertConstantQueries('/api/v1/payment/', {'page_size': 100})
+        self.assertConstantQueries('/api/v1/payment/', {'page_size': 100, 'lite': 'true'})
+
+    def test_lite_listing_matches_serializer(self):
+        """ the values based path returns the same data as the serializers """
+        self.add_rows(2)
+        for url in ('/api/v1/booking/', '/api/v1/payment/', '/api/v1/booking/1/', '/api/v1/payment/1/'):
+            full = self.client.get(url).json()
+            lite = self.client.get(url, {'lite': 'true'}).json()
+            self.assertEqual(full, lite)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """
+        TestCase to check list endpoints page with cursors and without COUNT queries
+    """
+    def setUp(self):
+        hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        for i in range(5):
+            room = Room.objects.create(hostel=hostel, description=f'Room {i}', price=1000)
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+            Employee.objects.create(first_name='Emp', last_name=str(i), address='qwerty', phone_no=f'98888{i:05d}',
+             email_address=f'emp{i}@example.com', hostel=hostel)
+
+    def collect_pages(self, url, params):
+        """ follow the next cursors, return the ids of every page """
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertNotIn('count', response.data)
+            pages.append(response.data['results'])
+            if response.data['next'] is None:
+                return pages
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(response.data['next'])
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+    def test_booking_pages(self):
+        pages = self.collect_pages('/api/v1/booking/', {'page_size': 2})
+        booking_ids = [[booking['booking_id'] for booking in page] for page in pages]
+        expected_ids = list(Booking.objects.values_list('booking_id', flat=True))
+        self.assertEqual(booking_ids, [expected_ids[0:2], expected_ids[2:4], expected_ids[4:]])
+
+    def test_employee_pages(self):
+        pages = self.collect_pages('/api/v1/listEmployee/', {'page_size': 3, 'ordering': 'first_name'})
+        self.assertEqual([len(page) for page in pages], [3, 2])
+        self.assertEqual(
+            sorted(employee['employee_id'] for page in pages for employee in page),
+            sorted(Employee.objects.values_list('employee_id', flat=True)))
+
+
+class RevenueTestCase(APITestCase):
+    """
+        TestCase to check payment totals and revenue computed by the database
+    """
+    def setUp(self):
+        self.hostels = [
+            Hostel.objects.create(name=f'Hostel {i}', address='Gachibowli', phone_no=f'992213451{i}',
+             manager_id='1', room_limit='50')
+            for i in range(2)
+        ]
+        for i, (hostel, price, mode) in enumerate([
+                (self.hostels[0], 1000, 'cash'), (self.hostels[0], 2000, 'online'), (self.hostels[1], 500, 'cash')]):
+            room = Room.objects.create(hostel=hostel, description=f'Room {i}', price=price)
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            booking = Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+            Payment.objects.create(student=student, booking=booking, payment_mode=mode)
+
+    def test_total_annotation(self):
+        """ the database total matches the python computed total """
+        for payment in Payment.objects.with_totals():
+            self.assertEqual(payment.total_amount, payment.room_price * payment.no_of_nights)
+            self.assertEqual(payment.total_payments, payment.total_amount)
+
+    def test_revenue_by_hostel(self):
+        response = self.client.get('/api/v1/revenue/', {'group_by': 'hostel'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['hostel'], row['payments'], row['revenue']) for row in response.data], [
+            (self.hostels[0].hostel_branch_id, 2, 12000),
+            (self.hostels[1].hostel_branch_id, 1, 2000),
+        ])
+
+    def test_revenue_by_mode_and_month(self):
+        year = timezone.now().year
+        response = self.client.get('/api/v1/revenue/', {'group_by': 'payment_mode,month', 'year': year})
+        month = timezone.localdate().replace(day=1)
+        self.assertEqual([(row['payment_mode'], row['month'], row['revenue']) for row in response.data], [
+            ('cash', month, 6000),
+            ('online', month, 8000),
+        ])
+        response = self.client.get('/api/v1/revenue/', {'group_by': 'payment_mode', 'year': year - 1})
+        self.assertEqual(response.data, [])
+
+    def test_revenue_invalid_group(self):
+        response = self.client.get('/api/v1/revenue/', {'group_by': 'student'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HostelOccupancyTestCase(APITestCase):
+    """
+        TestCase to check the occupancy counters follow the write paths
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000) for i in range(4)]
+        self.student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        today = timezone.localdate()
+        self.past_booking = Booking.objects.create(student=self.student, room=self.rooms[0],
+         check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+        Booking.objects.create(student=self.student, room=self.rooms[1],
+         check_in_date=today, check_out_date=today + timedelta(days=2))
+        Payment.objects.create(student=self.student, booking=self.past_booking)
+
+    def test_counters(self):
+        occupancy = HostelOccupancy.objects.get(hostel=self.hostel)
+        self.assertEqual(
+            (occupancy.total_rooms, occupancy.vacant_rooms, occupancy.active_bookings, occupancy.students, occupancy.revenue),
+            (4, 2, 1, 1, 4000))
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+    def test_batch_booking_counters(self):
+        other_student = Student.objects.create(first_name='Test', last_name='456', address='qwerty', phone_no='9999912346')
+        today = timezone.localdate()
+        Booking.objects.book_many([
+            {'student': other_student.pk, 'room': room.pk, 'check_in_date': today, 'check_out_date': today + timedelta(days=1)}
+            for room in self.rooms[2:]
+        ])
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+    def test_stays_expire(self):
+        """ the booking ending in two days stops counting as active once the date moves past its check out """
+        today = timezone.localdate()
+        with mock.patch.object(timezone, 'localdate', return_value=today + timedelta(days=3)):
+            Booking.objects.create(student=self.student, room=Room.objects.get(pk=self.rooms[2].pk),
+             check_in_date=today + timedelta(days=3), check_out_date=today + timedelta(days=4))
+            response = self.client.get(f'/api/v1/getHostelOccupancy/{self.hostel.hostel_branch_id}/')
+            self.assertEqual(response.data['active_bookings'], 1)
+            self.assertEqual(HostelOccupancy.objects.drift(), {})
+            booking = Booking.objects.get(room=self.rooms[2])
+            booking.check_in_date, booking.check_out_date = today + timedelta(days=1), today + timedelta(days=2)
+            booking.save()
+            self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+    def test_occupancy_endpoint(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/v1/getHostelOccupancy/{self.hostel.hostel_branch_id}/')
+        self.assertEqual(response.data['vacant_rooms'], 2)
+        self.assertEqual(response.data['room_limit'], 50)
+        response = self.client.get('/api/v1/getHostelOccupancy/0/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebuild_command(self):
+        HostelOccupancy.objects.filter(hostel=self.hostel).update(vacant_rooms=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_occupancy', '--check', stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('rebuild_occupancy', stdout=output)
+        self.assertIn('vacant_rooms stored 0, counted 2', output.getvalue())
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+
+class ReleaseRoomsTestCase(APITestCase):
+    """ the sweeper frees reserved rooms once every booking of them has ended, and only those """
+
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000 + i) for i in range(4)]
+        student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        today = timezone.localdate()
+        stays = [
+            (0, today - timedelta(days=5), today - timedelta(days=1)),
+            (1, today - timedelta(days=3), today),
+            (2, today - timedelta(days=1), today + timedelta(days=1)),
+            (3, today - timedelta(days=9), today - timedelta(days=7)),
+            (3, today + timedelta(days=3), today + timedelta(days=5)),
+        ]
+        for position, check_in_date, check_out_date in stays:
+            Booking.objects.create(student=student, room=Room.objects.get(pk=self.rooms[position].pk),
+             check_in_date=check_in_date, check_out_date=check_out_date)
+
+    def test_release_rooms(self):
+        vacant_rooms.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            report = release_rooms(batch_size=1)
+        self.assertEqual((report['released'], report['batches']), (2, 2))
+        statuses = dict(Room.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[room.pk] for room in self.rooms], ['vacant', 'vacant', 'reserved', 'reserved'])
+        self.assertEqual(Room.objects.get(pk=self.rooms[0].pk).version, 2)
+        self.assertEqual(vacant_rooms.rooms_under(), [self.rooms[0].pk, self.rooms[1].pk])
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+        self.assertEqual(release_rooms()['released'], 0)
+
+    def test_release_rooms_expires_stays(self):
+        """ two days on, the stay that was active when booked has ended and the sweep takes it off the counters """
+        today = timezone.localdate()
+        self.assertEqual(HostelOccupancy.objects.get(hostel=self.hostel).active_bookings, 2)
+        with mock.patch.object(timezone, 'localdate', return_value=today + timedelta(days=2)):
+            self.assertEqual(release_rooms()['released'], 3)
+            occupancy = HostelOccupancy.objects.get(hostel=self.hostel)
+            self.assertEqual((occupancy.active_bookings, occupancy.counted_on), (1, today + timedelta(days=2)))
+            self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+    def test_release_rooms_command(self):
+        output = io.StringIO()
+        call_command('release_rooms', '--date', (timezone.localdate() + timedelta(days=1)).isoformat(), stdout=output)
+        self.assertIn('Released 3 rooms', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('release_rooms', '--date', 'tomorrow', stdout=io.StringIO())
+
+
+class ExportDataTestCase(APITestCase):
+    """
+        TestCase to check the bulk export command
+    """
+    def setUp(self):
+        hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        room = Room.objects.create(hostel=hostel, description='Room 1', price=1000)
+        for i in range(3):
+            student = Student.objects.create(first_name='Test', last_name=str(i), address='qwerty', phone_no=f'99999{i:05d}')
+            booking = Booking.objects.create(student=student, room=room,
+             check_in_date=date(2021, 5, 1 + i * 5), check_out_date=date(2021, 5, 3 + i * 5))
+            Payment.objects.create(student=student, booking=booking)
+        Booking.objects.filter(student__last_name='0').update(booking_date=date(2021, 1, 1))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def read(self, file_name):
+        with gzip.open(os.path.join(self.directory, file_name), 'rt', newline='') as stream:
+            return stream.read()
+
+    def test_export_csv(self):
+        call_command('export_data', '--output-dir', self.directory, '--chunk-size', '2', stdout=io.StringIO())
+        payments = list(csv.DictReader(io.StringIO(self.read('payments.csv.gz'))))
+        self.assertEqual([row['total_amount'] for row in payments], ['2000'] * 3)
+        self.assertEqual(len(list(csv.reader(io.StringIO(self.read('transactions.csv.gz'))))), 1)
+
+    def test_export_ndjson_since(self):
+        since = timezone.localdate().isoformat()
+        call_command('export_data', 'bookings', 'students', '--format', 'ndjson', '--since', since,
+         '--output-dir', self.directory, stdout=io.StringIO())
+        students = [json.loads(line) for line in self.read('students.ndjson.gz').splitlines()]
+        self.assertEqual([student['last_name'] for student in students], ['1', '2'])
+        bookings = [json.loads(line) for line in self.read('bookings.ndjson.gz').splitlines()]
+        self.assertEqual([booking['check_in_date'] for booking in bookings], ['2021-05-06', '2021-05-11'])
+
+    def test_export_payments_since(self):
+        Payment.objects.filter(student__last_name='0').update(payment_datetime=timezone.now() - timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            call_command('export_data', 'payments', '--since', timezone.localdate().isoformat(),
+             '--output-dir', self.directory, stdout=io.StringIO())
+        payments = list(csv.DictReader(io.StringIO(self.read('payments.csv.gz'))))
+        self.assertEqual(len(payments), 2)
+        """ a plain range on the indexed column, no date() cast of it """
+        self.assertFalse([query for query in queries if 'django_datetime_cast_date' in query['sql']])
+
+    def test_unknown_table(self):
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'rooms', '--output-dir', self.directory)
+
+
+class ImportCSVTestCase(APITestCase):
+    """
+        TestCase to check the bulk CSV import command and endpoint
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='3')
+        Room.objects.create(hostel=self.hostel, description='Room 0', price=1000)
+        Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_csv(self, rows):
+        path = os.path.join(self.directory, 'import.csv')
+        with open(path, 'w', newline='') as stream:
+            csv.writer(stream).writerows(rows)
+        return path
+
+    def test_import_rooms_room_limit(self):
+        path = self.write_csv([['hostel', 'description', 'price', 'status']] + [
+            [self.hostel.pk, f'Room {i}', 1500, ''] for i in range(1, 4)
+        ] + [[0, 'Room 9', 1500, 'vacant'], [self.hostel.pk, 'Room 10', -5, 'vacant']])
+        output = io.StringIO()
+        call_command('import_csv', 'rooms', path, '--batch-size', '2', stdout=output)
+        self.assertEqual(Room.objects.filter(hostel=self.hostel).count(), 3)
+        self.assertIn('line 4: hostel: Hostel room limit of 3 reached', output.getvalue())
+        self.assertIn('line 5: hostel: Hostel does not exist', output.getvalue())
+        self.assertIn('line 6: price: Price cannot be lesser than 0', output.getvalue())
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+
+    def test_import_students_endpoint(self):
+        rows = 'first_name,last_name,address,phone_no\n' + ''.join(
+            f'Student,{i},Gachibowli,98765{i:05d}\n' for i in range(50))
+        rows += 'Test,123,qwerty,9876500999\n'
+        rows += 'Other,Student,qwerty,12345\n'
+        rows += 'Another,Student,qwerty,9876500001\n'
+        upload = SimpleUploadedFile('students.csv', rows.encode(), content_type='text/csv')
+        """
+            per batch of 20: two uniqueness queries, one insert and three to index them
+            for search, inside a savepoint. the version bumps wait for the commit
+        """
+        with self.assertNumQueries(24):
+            response = self.client.post('/api/v1/import/students/', {'file': upload, 'batch_size': 20}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (50, 3))
+        self.assertEqual([error['line'] for error in response.data['errors']], [52, 53, 54])
+        self.assertIn('phone_no', response.data['errors'][1]['errors'])
+        self.assertEqual(Student.objects.count(), 51)
+
+    def test_import_without_last_name(self):
+        upload = SimpleUploadedFile('students.csv', (
+            'first_name,last_name,address,phone_no\n'
+            'Solo,,qwerty,9876500001\n'
+            'Solo,,qwerty,9876500002\n'
+            'Solo,Other,qwerty,9876500003\n'
+            'Test,,qwerty,9876500004\n').encode(), content_type='text/csv')
+        response = self.client.post('/api/v1/import/students/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 1))
+        self.assertEqual(response.data['errors'], [{'line' : 3, 'errors' : {'non_field_errors' : ['Student already exists']}}])
+
+    def test_import_missing_columns(self):
+        upload = SimpleUploadedFile('students.csv', b'first_name,address\nTest,qwerty\n', content_type='text/csv')
+        response = self.client.post('/api/v1/import/students/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/import/bookings/', {'file': upload}, format='multipart').status_code, 404)
+
+
+class EndpointMetricsTestCase(QueryBudgetMixin, APITestCase):
+    """
+        TestCase to check the per endpoint metrics and the query budgets of the read endpoints
+    """
+    """ the conditional GET views add one ModelVersion lookup for their ETag """
+    QUERY_BUDGETS = {
+        'Get_Particular_Hostel_Details' : 2,
+        'Get_Hostel_Occupancy' : 1,
+        'List_Vacant_Rooms' : 3,
+        'Do_Booking' : 2,
+        'Get_Booking_Details' : 5,
+        'Do_Payment' : 1,
+        'Get_Students_Name_From_Hostel' : 1,
+        'List_Employee' : 2,
+    }
+
+    def setUp(self):
+        vacant_rooms.invalidate()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000) for i in range(3)]
+        student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        self.booking = Booking.objects.create(student=student, room=rooms[0],
+         check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+        Payment.objects.create(student=student, booking=self.booking)
+        for i in range(3):
+            Employee.objects.create(first_name='Warden', last_name=str(i), address='Staff Quarters',
+                phone_no=f'98888{i:05d}', hostel=self.hostel)
+        object_cache.invalidate(Hostel, self.hostel.pk)
+
+    def tearDown(self):
+        vacant_rooms.invalidate()
+
+    def test_query_budgets(self):
+        paths = {
+            'Get_Particular_Hostel_Details' : f'/api/v1/getHostelDetails/{self.hostel.pk}/',
+            'Get_Hostel_Occupancy' : f'/api/v1/getHostelOccupancy/{self.hostel.pk}/',
+            'List_Vacant_Rooms' : '/api/v1/getVacantRooms/',
+            'Do_Booking' : '/api/v1/booking/?page_size=10',
+            'Get_Booking_Details' : f'/api/v1/booking/{self.booking.pk}/?lite=true',
+            'Do_Payment' : '/api/v1/payment/?page_size=10',
+            'Get_Students_Name_From_Hostel' : f'/api/v1/getStudents/{self.hostel.pk}/',
+            'List_Employee' : '/api/v1/listEmployee/?page_size=10',
+        }
+        for url_name, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(url_name), self.assertQueryBudget(url_name, budget):
+                self.assertEqual(self.client.get(paths[url_name]).status_code, 200)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/v1/booking/')
+        self.client.get('/api/v1/unknown/')
+        response = self.client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE myhostel_request_duration_seconds histogram', text)
+        self.assertRegex(text, r'myhostel_request_duration_seconds_bucket\{url_name="Do_Booking",le="\+Inf"\} [1-9]')
+        self.assertRegex(text, r'myhostel_sql_queries_total\{url_name="Do_Booking"\} [1-9]')
+        self.assertRegex(text, r'myhostel_requests_total\{url_name="unmatched"\} [1-9]')
+
+
+class DatasetGeneratorTestCase(APITestCase):
+    """
+        TestCase to check the benchmark dataset generator is reproducible and consistent
+    """
+    sizes = {'hostels': 3, 'rooms': 20, 'students': 50, 'bookings': 300}
+
+    def generated_rows(self, seed):
+        with rolled_back():
+            generate_dataset(seed=seed, **self.sizes)
+            return (
+                list(Room.objects.order_by('pk').values_list('hostel', 'price', 'status')),
+                list(Booking.objects.order_by('pk').values_list('student', 'room', 'check_in_date', 'check_out_date')),
+                list(Payment.objects.order_by('pk').values_list('student', 'booking', 'payment_mode')),
+            )
+
+    def test_same_seed_same_rows(self):
+        rooms, bookings, payments = self.generated_rows(seed=7)
+        self.assertEqual((len(rooms), len(bookings), len(payments)), (20, 300, 300))
+        self.assertEqual(self.generated_rows(seed=7), (rooms, bookings, payments))
+        self.assertNotEqual(self.generated_rows(seed=8)[1], bookings)
+
+    def test_consistent_dataset(self):
+        generate_dataset(seed=1, **self.sizes)
+        self.assertEqual(HostelOccupancy.objects.drift(), {})
+        for booking in Booking.objects.all()[:50]:
+            self.assertFalse(Booking.objects.filter(room=booking.room_id).exclude(pk=booking.pk).overlapping(
+                booking.check_in_date, booking.check_out_date).exists())
+            self.assertEqual(booking.no_of_nights, (booking.check_out_date - booking.check_in_date).days)
+        reserved = set(Booking.objects.filter(check_out_date__gt=timezone.localdate()).values_list('room', flat=True))
+        self.assertEqual(set(Room.objects.filter(status='reserved').values_list('pk', flat=True)), reserved)
+        self.assertEqual(Transcation.objects.count(), 300)
+        self.assertEqual(sum(LedgerDailySummary.objects.values_list('amount', flat=True)),
+            sum(HostelOccupancy.objects.values_list('revenue', flat=True)))
+
+
+class DatabaseProfileTestCase(APITestCase):
+    """
+        TestCase to check the sqlite tuning of the sqlite-tuned database profile
+    """
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -32000}, SQLITE_IMMEDIATE_TRANSACTIONS=True)
+    def test_tune_sqlite_connection(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('sqlite only')
+        with connection.cursor() as cursor:
+            cache_size = cursor.execute('PRAGMA cache_size').fetchone()[0]
+        self.addCleanup(connection.execute_wrappers.remove, begin_immediate)
+        self.addCleanup(lambda: connection.cursor().execute(f'PRAGMA cache_size = {cache_size}'))
+        tune_sqlite_connection(None, connection)
+        tune_sqlite_connection(None, connection)
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -32000)
+        self.assertEqual(connection.execute_wrappers.count(begin_immediate), 1)
+
+    def test_begin_immediate(self):
+        executed = []
+        execute = lambda sql, params, many, context: executed.append(sql)
+        begin_immediate(execute, 'BEGIN', None, False, {})
+        begin_immediate(execute, 'SELECT 1', None, False, {})
+        self.assertEqual(executed, ['BEGIN IMMEDIATE', 'SELECT 1'])
+
+
+class SearchTestCase(APITestCase):
+    """ the search index follows saves, deletes and imports, and ranks prefix, substring and fuzzy matches """
+
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name='Ananta Residency', address='Kondapur, Hyderabad',
+            phone_no='9000000001', manager_id=1, room_limit=10)
+        self.ananya = Student.objects.create(first_name='Ananya', last_name='Rao', address='Kochi', phone_no='9000000002')
+        self.janani = Student.objects.create(first_name='Janani', last_name='Ananth', address='Pune', phone_no='9000000003')
+        self.employee = Employee.objects.create(first_name='Vikram', last_name='Shetty', address='Staff Quarters',
+            phone_no='9000000004', email_address='vikram@myhostel.test', hostel=self.hostel)
+
+    def search(self, **params):
+        response = self.client.get('/api/v1/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(result['kind'], result['id'], result['match']) for result in response.data['results']]
+
+    def test_search_ranks_prefix_first(self):
+        self.assertTrue(search_index.is_available())
+        dhanashree = Student.objects.create(first_name='Dhanashree', address='Pune', phone_no='9000000006')
+        results = self.search(q='ana', kind='student')
+        self.assertEqual(sorted(results[:2]), [('student', self.ananya.pk, 'prefix'), ('student', self.janani.pk, 'prefix')])
+        self.assertEqual(results[2:], [('student', dhanashree.pk, 'substring')])
+        self.assertEqual(len(self.search(q='anan')), 3)
+
+    def test_search_filters(self):
+        self.assertEqual(self.search(q='ja', kind='student'), [('student', self.janani.pk, 'prefix')])
+        self.assertEqual(self.search(q='myhostel.test'), [('employee', self.employee.pk, 'substring')])
+        self.assertEqual(self.search(q='ananyq', kind='student', limit=1), [('student', self.ananya.pk, 'fuzzy')])
+        response = self.client.get('/api/v1/search/', {'q' : 'anan', 'kind' : 'room'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_short_words(self):
+        """ a short word only filters what the index finds for the longer ones, as a word prefix """
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search(q='ja ananth', kind='student'), [('student', self.janani.pk, 'substring')])
+        self.assertTrue(all('MATCH' in query['sql'] for query in queries if 'mainapp_search' in query['sql']))
+        self.assertEqual(self.search(q='ananth ja', kind='student'), [('student', self.janani.pk, 'substring')])
+        self.assertEqual(self.search(q='an rao'), [('student', self.ananya.pk, 'substring')])
+        self.assertEqual(self.search(q='na ananth'), [])
+
+    def test_search_fallback_full_name(self):
+        """ without a search index every word is looked for in one of the fields, so a full name matches """
+        with mock.patch.object(search_index, 'is_available', return_value=False):
+            self.assertFalse(search_index.has_trigrams())
+            self.assertEqual(self.search(q='ananya rao'), [('student', self.ananya.pk, 'prefix')])
+            self.assertEqual(self.search(q='rao ananya'), [('student', self.ananya.pk, 'substring')])
+            self.assertEqual(self.search(q='ananya shetty'), [])
+
+    def test_search_follows_writes(self):
+        self.ananya.first_name = 'Meera'
+        self.ananya.save()
+        self.assertEqual(self.search(q='ananya'), [])
+        self.assertEqual(self.search(q='meera'), [('student', self.ananya.pk, 'prefix')])
+        self.employee.delete()
+        self.assertEqual(self.search(q='vikram'), [])
+        upload = SimpleUploadedFile('students.csv', b'first_name,last_name,address,phone_no\nKavya,Iyer,Kochi,9000000005\n',
+            content_type='text/csv')
+        self.client.post('/api/v1/import/students/', {'file' : upload}, format='multipart')
+        kavya = Student.objects.get(first_name='Kavya')
+        self.assertEqual(self.search(q='kavya iyer'), [('student', kavya.pk, 'prefix')])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search(q='9000000005'), [('student', kavya.pk, 'prefix')])
+
+
+class ConditionalGetTestCase(APITestCase):
+    """ polls with a matching If-None-Match get 304 for one counter lookup, any write changes the ETag """
+
+    def setUp(self):
+        vacant_rooms.invalidate()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000) for i in range(2)]
+        self.student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        Employee.objects.create(first_name='Warden', address='Staff Quarters', phone_no='9999912346',
+            email_address='warden@myhostel.test', hostel=self.hostel)
+
+    def assertNotModified(self, path, params=None):
+        etag = self.client.get(path, params)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(path, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_not_modified(self):
+        for path in ('/api/v1/getVacantRooms/', '/api/v1/listEmployee/', '/api/v1/booking/',
+                f'/api/v1/getHostelDetails/{self.hostel.pk}/'):
+            with self.subTest(path):
+                self.assertNotModified(path)
+
+    def test_writes_change_etag(self):
+        rooms_etag = self.assertNotModified('/api/v1/getVacantRooms/')
+        self.assertNotEqual(self.client.get('/api/v1/getVacantRooms/', {'page_size': 1})['ETag'], rooms_etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.book_many([{'student': self.student.pk, 'room': self.rooms[0].pk,
+                'check_in_date': date(2021, 5, 19), 'check_out_date': date(2021, 5, 23)}])
+        response = self.client.get('/api/v1/getVacantRooms/', HTTP_IF_NONE_MATCH=rooms_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        employees_etag = self.assertNotModified('/api/v1/listEmployee/')
+        self.hostel.name = 'Pragati Womens Hostel'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hostel.save()
+        response = self.client.get('/api/v1/listEmployee/', HTTP_IF_NONE_MATCH=employees_etag)
+        self.assertEqual(response.data['results'][0]['hostel'], 'Pragati Womens Hostel')
+
+
+    def test_failed_bump(self):
+        """ a counter that missed its bump turns the ETag off until a bump of it succeeds """
+        self.addCleanup(unbumped_labels.clear)
+        employees_etag = self.assertNotModified('/api/v1/listEmployee/')
+        self.hostel.name = 'Pragati Womens Hostel'
+        locked = OperationalError('database is locked')
+        with mock.patch.object(ModelVersionQuerySet, '_increment', side_effect=locked), \
+                mock.patch.object(time, 'sleep'), self.assertLogs('mainapp.models', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.hostel.save()
+            response = self.client.get('/api/v1/listEmployee/', HTTP_IF_NONE_MATCH=employees_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        """ the next read makes up for the missed bump """
+        response = self.client.get('/api/v1/listEmployee/', HTTP_IF_NONE_MATCH=employees_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], employees_etag)
+        self.assertNotModified('/api/v1/listEmployee/')
+
+    def test_bump_after_commit(self):
+        """ the counters are bumped once the write commits, never while its transaction is open or if it rolls back """
+        versions = ModelVersion.objects.current(Room, Booking)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.rooms[0].delete()
+            self.assertEqual(ModelVersion.objects.current(Room, Booking), versions)
+        with self.captureOnCommitCallbacks() as rolled_back:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.rooms[1].delete()
+                raise IntegrityError
+        self.assertEqual(rolled_back, [])
+        for callback in callbacks:
+            callback()
+        self.assertGreater(ModelVersion.objects.current(Room)[0], versions[0])
+
+    def test_errors_have_no_etag(self):
+        response = self.client.get('/api/v1/getHostelDetails/0/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class SparseFieldsTestCase(APITestCase):
+    """
+        TestCase to check ?fields= trims the responses and the columns and joins read
+    """
+    def setUp(self):
+        vacant_rooms.invalidate()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.employee = Employee.objects.create(first_name='Warden', address='Staff Quarters', phone_no='9999912346',
+            email_address='warden@myhostel.test', hostel=self.hostel)
+        rooms = [Room.objects.create(hostel=self.hostel, description=f'Room {i}', price=1000) for i in range(2)]
+        student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        self.booking = Booking.objects.create(student=student, room=rooms[0],
+         check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+        self.payment = Payment.objects.create(student=student, booking=self.booking)
+
+    def tearDown(self):
+        vacant_rooms.invalidate()
+
+    def get(self, path, params):
+        """ the response and the sql of its last query, the page read """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        return response, queries.captured_queries[-1]['sql']
+
+    def test_listing_fields(self):
+        response, sql = self.get('/api/v1/listEmployee/', {'fields': 'employee_id,hostel', 'ordering': 'first_name'})
+        self.assertEqual(response.data['results'], [{'employee_id': self.employee.pk, 'hostel': 'Pragati Mens Hostel'}])
+        self.assertNotIn('email_address', sql)
+        response, sql = self.get('/api/v1/getVacantRooms/', {'fields': 'room_id,price'})
+        self.assertEqual(response.data['results'][0].keys(), {'room_id', 'price'})
+        self.assertNotIn('description', sql)
+
+    def test_booking_and_payment_fields(self):
+        response, sql = self.get('/api/v1/booking/', {'fields': 'booking_id,roomprice'})
+        self.assertEqual(response.data['results'], [{'booking_id': self.booking.pk, 'roomprice': 1000}])
+        self.assertNotIn('mainapp_student', sql)
+        self.assertNotIn('description', sql)
+        for lite in ('false', 'true'):
+            response, sql = self.get(f'/api/v1/payment/{self.payment.pk}/', {'fields': 'total_payments', 'lite': lite})
+            self.assertEqual(response.json(), [{'total_payments': 4000}])
+            self.assertNotIn('mainapp_student', sql)
+        response, sql = self.get('/api/v1/ledger/', {'fields': 'transaction_id,amount'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_full_response_without_fields(self):
+        response = self.client.get('/api/v1/payment/')
+        self.assertEqual(len(response.data['results'][0]), 11)
+        response = self.client.get(f'/api/v1/getEmployee/{self.employee.pk}/', {'fields': 'full_name'})
+        self.assertEqual(response.data, {'full_name': 'Warden'})
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/v1/payment/', {'fields': 'payment_id,card_number'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('payment_id', response.data['fields'])
+        self.assertEqual(self.client.get('/api/v1/listEmployee/', {'fields': ','}).status_code, 400)
+
+
+class ObjectCacheTestCase(APITestCase):
+    """
+        TestCase to check hostel and employee details are served from the object cache
+    """
+    def setUp(self):
+        caches['objects'].clear()
+        object_cache.counters.clear()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.employee = Employee.objects.create(first_name='Emp', last_name='1', address='qwerty',
+         phone_no='9888800001', email_address='emp1@example.com', hostel=self.hostel)
+
+    def test_hostel_details_cached(self):
+        url = f'/api/v1/getHostelDetails/{self.hostel.hostel_branch_id}/'
+        self.client.get(url)
+        """ only the ETag counter lookup """
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Pragati Mens Hostel')
+        self.assertEqual(object_cache.stats()['mainapp.hostel'], {'hits': 1, 'misses': 1})
+
+    def test_invalidated_on_save(self):
+        """ renaming the hostel refreshes the cached hostel and its employees """
+        hostel_url = f'/api/v1/getHostelDetails/{self.hostel.hostel_branch_id}/'
+        employee_url = f'/api/v1/getEmployee/{self.employee.employee_id}/'
+        self.client.get(hostel_url)
+        self.client.get(employee_url)
+        self.hostel.name = 'Pragati Womens Hostel'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hostel.save()
+            """ evicted at commit, not before, so a reader can not cache the old row again """
+            self.assertIsNotNone(caches['objects'].get(object_cache.make_key(Hostel, self.hostel.pk)))
+        self.assertEqual(self.client.get(hostel_url).data['name'], 'Pragati Womens Hostel')
+        self.assertEqual(self.client.get(employee_url).data['hostel'], 'Pragati Womens Hostel')
+
+    def test_invalidated_on_delete(self):
+        employee_url = f'/api/v1/getEmployee/{self.employee.employee_id}/'
+        self.client.get(employee_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.delete()
+        self.assertEqual(self.client.get(employee_url).status_code, 404)
+
+    def test_lru_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = LRUFileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3}})
+            for i, key in enumerate(('a', 'b', 'c')):
+                cache.set(key, i)
+                os.utime(cache._key_to_file(key), (i, i))
+            cache.get('a')
+            cache.set('d', 3)
+            self.assertEqual(cache.get('b'), None)
+            self.assertEqual([cache.get(key) for key in ('a', 'c', 'd')], [0, 2, 3])
+
+
+class VacantRoomIndexTestCase(APITestCase):
+    """
+        TestCase to check the in-memory vacant room index
+    """
+    def setUp(self):
+        vacant_rooms.invalidate()
+        self.hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        self.rooms = [
+            Room.objects.create(hostel=self.hostel, description=f'Room {price}', price=price)
+            for price in (3000, 1000, 2000)
+        ]
+
+    def tearDown(self):
+        vacant_rooms.invalidate()
+
+    def test_price_lookups(self):
+        self.assertEqual(vacant_rooms.count_under(), 3)
+        self.assertEqual(vacant_rooms.count_under(2000), 2)
+        self.assertEqual(vacant_rooms.count_under(999), 0)
+        self.assertEqual(vacant_rooms.rooms_under(2500), [self.rooms[1].room_id, self.rooms[2].room_id])
+        self.assertEqual(vacant_rooms.count_under(hostel_id=0), 0)
+
+    def test_write_paths_update_index(self):
+        vacant_rooms.load()
+        student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(student=student, room=self.rooms[1],
+             check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+        self.assertEqual(vacant_rooms.rooms_under(), [self.rooms[2].room_id, self.rooms[0].room_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            new_room = Room.objects.create(hostel=self.hostel, description='Cheap Room', price=500)
+        self.assertEqual(vacant_rooms.rooms_under(1000), [new_room.room_id])
+
+    def test_vacant_rooms_single_query(self):
+        """ once warm, listing vacant rooms under a price is a single query, after the ETag counter lookup """
+        self.client.get('/api/v1/getVacantRooms/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/getVacantRooms/', {'price_limit': 2000, 'page_size': 10})
+        self.assertEqual({room['price'] for room in response.data['results']}, {1000, 2000})
+        """ an empty answer of the index is confirmed with the database """
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/getVacantRooms/', {'price_limit': 500})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_index(self):
+        """ a room vacated by another process, unseen by the index, is still listed """
+        Room.objects.update(status='reserved')
+        vacant_rooms.load()
+        Room.objects.filter(pk=self.rooms[1].pk).update(status='vacant')
+        response = self.client.get('/api/v1/getVacantRooms/', {'price_limit': 1500})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room['room_id'] for room in response.data['results']], [self.rooms[1].room_id])
+        self.assertEqual(vacant_rooms.rooms_under(), [self.rooms[1].room_id])
+
+
+class RoomAvailabilityTestCase(APITestCase):
+    """
+        TestCase to check free room lookups for a stay
+    """
+    def setUp(self):
+        hostel = Hostel.objects.create(name='Pragati Mens Hostel', address='Gachibowli',
+         phone_no='09922134512', manager_id='1', room_limit='50')
+        student = Student.objects.create(first_name='Test', last_name='123', address='qwerty', phone_no='9999912345')
+        self.booked_room = Room.objects.create(hostel=hostel, description='King Sized Bedroom', price=3000)
+        self.free_room = Room.objects.create(hostel=hostel, description='Twin Bedroom', price=2000)
+        Booking.objects.create(student=student, room=self.booked_room,
+         check_in_date=date(2021, 5, 19), check_out_date=date(2021, 5, 23))
+
+    def test_available_rooms(self):
+        """ only rooms without an overlapping booking are free for a stay """
+        free_rooms = Room.objects.available(date(2021, 5, 20), date(2021, 5, 21))
+        self.assertQuerysetEqual(free_rooms, [self.free_room])
+        free_rooms = Room.objects.available(date(2021, 5, 23), date(2021, 5, 24))
+        self.assertEqual(set(free_rooms), {self.booked_room, self.free_room})
+
+    def test_vacant_rooms_for_stay(self):
+        """ list vacant rooms for the passed check in and check out dates """
+        response = self.client.get('/api/v1/getVacantRooms/',
+         {'check_in_date': '2021-05-18', 'check_out_date': '2021-05-20'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([room['room_id'] for room in response.data['results']], [self.free_room.room_id])
+
+    def test_vacant_rooms_invalid_stay(self):
+        """ check_out_date has to come after check_in_date """
+        response = self.client.get('/api/v1/getVacantRooms/',
+         {'check_in_date': '2021-05-20', 'check_out_date': '2021-05-18'})
+        self.assertEqual(response.status_code, 400)
+
 
 class HostelTestCase(APITestCase):
     """
@@ -122,4 +1545,20 @@ class HostelTestCase(APITestCase):
             self.assertRaises(ValidationError)
         self.assertEqual(response.status_code, 400)
         self.assertNotEqual(self.currentCount, self.currentCount + 1)
+        self.assertIn('name', response.data)
+
+    def test_create_hostel(self):
+        new_hostel_attrs = self.hostel_attrs.copy()
+        new_hostel_attrs['name'] = 'Pragati Womens Hostel'
+        response = self.client.post('/api/v1/createHostel/', new_hostel_attrs)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Hostel.objects.count(), self.currentCount + 1)
+
+    def test_duplicate_phone_no(self):
+        new_hostel_attrs = self.hostel_attrs.copy()
+        new_hostel_attrs.update(name='Pragati Womens Hostel', phone_no='09922134512')
+        response = self.client.post('/api/v1/createHostel/', new_hostel_attrs)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['phone_no'], ['Phone number already exists'])
+        self.assertEqual(Hostel.objects.count(), self.currentCount)
     
\ No newline at end of file
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBuckets:
+    """
+        process local token buckets, one per key: a bucket holds up to burst tokens, refills rate
+        tokens a second and every request takes one. a take is a dict lookup and a little arithmetic
+        under a lock, O(1) whatever the number of clients. the least recently used buckets are
+        dropped past max_buckets, a dropped bucket comes back full.
+    """
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """ take a token from the bucket of key, return 0 if there was one else the seconds until there is """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(burst), now]
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+buckets = TokenBuckets(getattr(settings, 'THROTTLE_MAX_BUCKETS', 10000))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+        throttle each client per url name with the budgets of THROTTLE_BUDGETS,
+        {url_name: {'rate': requests per second, 'burst': bucket size, 'methods': [...]}}; routes without
+        a budget are not throttled, and a budget with methods only counts requests of those methods.
+        {'shares': url_name, 'methods': [...]} takes from the bucket of another budget instead, so
+        a route doing the same work under another url name can not be used to dodge that budget.
+        clients are told apart by their address: an X-Api-Key header is not checked anywhere, so a
+        client could dodge its budget by sending a new one with each request.
+        a throttled request gets 429 with a Retry-After header from DRF.
+    """
+
+    def allow_request(self, request, view):
+        resolver_match = getattr(request, 'resolver_match', None)
+        url_name = resolver_match.url_name if resolver_match is not None else None
+        budgets = getattr(settings, 'THROTTLE_BUDGETS', {})
+        budget = budgets.get(url_name)
+        if budget is None or request.method not in budget.get('methods', (request.method,)):
+            return True
+        bucket = budget.get('shares', url_name)
+        budget = budgets[bucket]
+        self.wait_seconds = buckets.take(f'{self.get_ident(request)}:{bucket}', budget['rate'], budget['burst'])
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
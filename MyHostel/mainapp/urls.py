@@ -1,21 +1,32 @@
 from django.urls import path
+from . import async_views
 from .views import (
         createHostelView, 
         CreateEmployee,
         GetEmployee,
         ListEmployee, 
         GetHostelDetails, 
+        GetHostelOccupancy,
         getStudentFromHostel,
         create_room, 
         GetVacantRooms, 
         CreateStudentDetails, 
         DoBooking,
-        PaymentView
+        BatchBooking,
+        PaymentView,
+        RevenueReport,
+        Ledger,
+        LedgerSummary,
+        getCacheStats,
+        ImportCSV,
+        getMetrics,
+        search
     )
 
 urlpatterns = [
     path('createHostel/', createHostelView, name='Create_Hostel'),
     path('getHostelDetails/<int:pk>/', GetHostelDetails.as_view(),name='Get_Particular_Hostel_Details'),
+    path('getHostelOccupancy/<int:pk>/', GetHostelOccupancy.as_view(), name='Get_Hostel_Occupancy'),
     path('createEmployee/', CreateEmployee.as_view(), name='Create_Employee'),
     path('getEmployee/<int:pk>/', GetEmployee.as_view(), name='Get_Employee'),
     path('listEmployee/', ListEmployee.as_view(), name='List_Employee'),
@@ -25,6 +36,21 @@ urlpatterns = [
     path('getStudents/<int:pk>/',getStudentFromHostel, name='Get_Students_Name_From_Hostel'),
     path('booking/', DoBooking.as_view(),name='Do_Booking'),
     path('booking/<int:pk>/', DoBooking.as_view(), name='Get_Booking_Details'),
+    path('booking/batch/', BatchBooking.as_view(), name='Do_Batch_Booking'),
     path('payment/', PaymentView.as_view(),name='Do_Payment'),
-    path('payment/<int:pk>/', PaymentView.as_view(), name='Get_Payment_Details')
+    path('payment/<int:pk>/', PaymentView.as_view(), name='Get_Payment_Details'),
+    path('revenue/', RevenueReport.as_view(), name='Get_Revenue'),
+    path('ledger/', Ledger.as_view(), name='Ledger'),
+    path('ledger/employee/<int:pk>/', LedgerSummary.as_view(summary_of='employee'), name='Get_Employee_Ledger_Summary'),
+    path('ledger/hostel/<int:pk>/', LedgerSummary.as_view(summary_of='hostel'), name='Get_Hostel_Ledger_Summary'),
+    path('cacheStats/', getCacheStats, name='Get_Cache_Stats'),
+    path('import/<str:kind>/', ImportCSV.as_view(), name='Import_CSV'),
+    path('metrics/', getMetrics, name='Get_Metrics'),
+    path('search/', search, name='Search'),
+    path('async/getVacantRooms/', async_views.getVacantRooms, name='Async_List_Vacant_Rooms'),
+    path('async/getHostelDetails/<int:pk>/', async_views.getHostelDetails, name='Async_Get_Particular_Hostel_Details'),
+    path('async/booking/', async_views.getBookings, name='Async_Do_Booking'),
+    path('async/booking/<int:pk>/', async_views.getBookings, name='Async_Get_Booking_Details'),
+    path('async/payment/', async_views.getPayments, name='Async_Do_Payment'),
+    path('async/payment/<int:pk>/', async_views.getPayments, name='Async_Get_Payment_Details')
 ]
@@ -0,0 +1,94 @@
+import threading
+import time
+from bisect import bisect_right, insort
+from django.apps import apps
+from django.conf import settings
+
+
+class VacantRoomIndex:
+    """
+        process local index of the vacant rooms, sorted by price overall and per hostel,
+        answering "vacant rooms under a price" with a bisect lookup.
+        the write paths of this process keep it current; it is loaded from the database
+        when cold and reloaded after VACANT_ROOM_INDEX_TTL seconds to pick up the
+        writes of other processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded_at = None
+        self.rooms = {}
+        self.by_price = []
+        self.by_hostel_price = {}
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'VACANT_ROOM_INDEX_TTL', 30)
+
+    def is_warm(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def load(self):
+        """ read every vacant room with one query """
+        Room = apps.get_model('mainapp', 'Room')
+        rows = Room.objects.filter(status='vacant').order_by().values_list('room_id', 'price', 'hostel')
+        with self.lock:
+            self.rooms = {room_id: (price, hostel_id) for room_id, price, hostel_id in rows}
+            self.by_price = sorted((price, room_id) for room_id, (price, hostel_id) in self.rooms.items())
+            self.by_hostel_price = {}
+            for price, room_id in self.by_price:
+                self.by_hostel_price.setdefault(self.rooms[room_id][1], []).append((price, room_id))
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """ forget the index, the next lookup reloads it """
+        with self.lock:
+            self.loaded_at = None
+
+    def add(self, room_id, price, hostel_id):
+        with self.lock:
+            if self.loaded_at is None or room_id in self.rooms:
+                return
+            self.rooms[room_id] = (price, hostel_id)
+            insort(self.by_price, (price, room_id))
+            insort(self.by_hostel_price.setdefault(hostel_id, []), (price, room_id))
+
+    def remove(self, room_id):
+        with self.lock:
+            if self.loaded_at is None or room_id not in self.rooms:
+                return
+            price, hostel_id = self.rooms.pop(room_id)
+            for prices in (self.by_price, self.by_hostel_price[hostel_id]):
+                del prices[bisect_right(prices, (price, room_id)) - 1]
+
+    def update(self, room_id, price, hostel_id, vacant):
+        """ reflect a saved room """
+        with self.lock:
+            self.remove(room_id)
+            if vacant:
+                self.add(room_id, price, hostel_id)
+
+    def _prices(self, hostel_id):
+        if not self.is_warm():
+            self.load()
+        if hostel_id is None:
+            return self.by_price
+        return self.by_hostel_price.get(hostel_id, [])
+
+    def count_under(self, price_limit=None, hostel_id=None):
+        """ number of vacant rooms priced at most price_limit """
+        with self.lock:
+            prices = self._prices(hostel_id)
+            if price_limit is None:
+                return len(prices)
+            return bisect_right(prices, (price_limit, float('inf')))
+
+    def rooms_under(self, price_limit=None, hostel_id=None):
+        """ ids of the vacant rooms priced at most price_limit, cheapest first """
+        with self.lock:
+            prices = self._prices(hostel_id)
+            end = len(prices) if price_limit is None else bisect_right(prices, (price_limit, float('inf')))
+            return [room_id for price, room_id in prices[:end]]
+
+
+vacant_rooms = VacantRoomIndex()
@@ -1,33 +1,93 @@
-from django.http import JsonResponse
-from django.core.exceptions import ObjectDoesNotExist
+import io
+import json
+from datetime import datetime
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError, OperationalError
+from django.utils import timezone
 from rest_framework.generics import CreateAPIView, RetrieveAPIView, ListAPIView
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework import status
-from .models import Student, Employee, Hostel, Payment, Room, Booking
+from .models import (
+    Student, Employee, Hostel, HostelOccupancy, Payment, Room, Booking, Transcation, LedgerDailySummary,
+    BookingConflict, RoomUnavailable, is_lock_contention, violated_constraint
+)
+from .cache import object_cache
+from .etags import conditional_get
+from .idempotency import idempotent
+from .importers import IMPORTERS
+from .metrics import metrics
+from .search import search_index
+from .vacancy import vacant_rooms
 from .serializers import (
     CreateEmployeeSerializer,
     EmployeeSerializer, 
     CreateHostelSerializer, 
+    HostelOccupancySerializer,
     GetBookingSerializer, 
     RoomSerializer, 
     StudentSerializer, 
     BookingSerializer,
+    BatchBookingItemSerializer,
+    RoomAvailabilitySerializer,
     CreatePaymentSerializer,
-    PaymentSerializer
+    BatchPaymentItemSerializer,
+    PaymentSerializer,
+    LedgerEntrySerializer,
+    TransactionSerializer,
+    LedgerQuerySerializer,
+    RevenueQuerySerializer,
+    SearchQuerySerializer,
+    BookingValuesSerializer,
+    PaymentValuesSerializer,
+    rename_keys,
+    requested_fields
 )
 
 
 # Create your api views here.
 
-class ModelsPagination(LimitOffsetPagination):
-    """ paginating models """
-    default_limit = 2
-    max_limit = 10
+class ModelsPagination(CursorPagination):
+    """
+        paginating models with keyset (cursor) pagination:
+        pages are read with WHERE pk < cursor on the model ordering (e.g. -booking_id)
+        instead of OFFSET, and no COUNT query is run, so a deep page costs the same as the first.
+    """
+    page_size = 2
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        """ order on the model ordering unless the view has an ordering filter """
+        if any(hasattr(backend, 'get_ordering') for backend in getattr(view, 'filter_backends', ())):
+            return super().get_ordering(request, queryset, view)
+        return tuple(queryset.model._meta.ordering)
+
+
+def booking_conflict_response():
+    """ the room changed under a concurrent booking, tell the client to retry """
+    data = {
+        'failed' : True,
+        'retryable' : True,
+        'error' : 'Room was updated by another booking. Please retry.'
+    }
+    return Response(data, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+
+def payment_conflict_response():
+    """ concurrent payments got in the way of a batch, tell the client to retry """
+    data = {
+        'failed' : True,
+        'retryable' : True,
+        'error' : 'Payments were updated by another request. Please retry.'
+    }
+    return Response(data, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
 
 
 @api_view(['POST'])
@@ -44,8 +104,14 @@ def createHostelView(request):
     
     serializer = CreateHostelSerializer(data=request.data)
     if serializer.is_valid(raise_exception=True):
-        hostel_serialized_data = serializer.validated_data
-        hostel_serialized_data.save()
+        """ name and phone number are unique in the database """
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as exc:
+            if violated_constraint(exc, Hostel) == 'unique_hostel_phone_no':
+                raise ValidationError({'phone_no' : ['Phone number already exists']})
+            raise ValidationError({'name' : ['Hostel name already exists. Please keep some other name']})
         data = {
             'hostelCreated' : True,
             'savedToDatabase' : True
@@ -58,14 +124,10 @@ class CreateEmployee(CreateAPIView):
     serializer_class = CreateEmployeeSerializer
 
     def create(self, request, *args, **kwargs):
+        """ name and phone number are unique in the database """
         try:
-            first_name = request.data.get('first_name')
-            last_name = request.data.get('last_name')
-
-            if Employee.objects.filter(first_name=first_name, last_name=last_name).exists():
-                raise ValidationError({'error' : 'Employee already created'})
-            else:
-                return super().create(request, *args, **kwargs)  
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
         except:
             data = {
                 "Failed": True,
@@ -74,17 +136,55 @@ class CreateEmployee(CreateAPIView):
             return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
 
-class GetEmployee(RetrieveAPIView):
-    queryset = Employee.objects.all()
+class SparseFieldsViewMixin:
+    """
+        ?fields=a,b on a generic read view: the serializer outputs only those fields and the
+        listed rows are read with only their columns and joins, plus the columns the page is ordered on.
+    """
+
+    @property
+    def requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = requested_fields(self.request.query_params, self.get_serializer_class())
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'] = self.requested_fields
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.get_serializer_class().sparse_queryset(queryset, self.requested_fields, queryset.query.order_by)
+
+
+class CachedObjectMixin:
+    """ retrieve the object through the read-through object cache """
+
+    def get_object(self):
+        try:
+            instance = object_cache.get(self.get_queryset(), self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ObjectDoesNotExist:
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+
+class GetEmployee(SparseFieldsViewMixin, CachedObjectMixin, RetrieveAPIView):
+    queryset = Employee.objects.select_related('hostel')
     serializer_class = EmployeeSerializer
 
 
-class ListEmployee(ListAPIView):
+class ListEmployee(SparseFieldsViewMixin, ListAPIView):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     pagination_class = ModelsPagination
     filter_backends = (OrderingFilter,)
-    ordering_fields = ('first_name',)
+    ordering_fields = ('first_name', 'employee_id')
+    ordering = ('-employee_id',)
+
+    @conditional_get(Employee, Hostel)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
         """ get the list of employees from a hostel """
@@ -97,39 +197,95 @@ class ListEmployee(ListAPIView):
         raise ValidationError('Hostel name is incorrect or hostel doesnt exist with name')
 
 
-class GetHostelDetails(RetrieveAPIView):
+class GetHostelDetails(SparseFieldsViewMixin, CachedObjectMixin, RetrieveAPIView):
     """ Get the particular hostel details """
     queryset = Hostel.objects.all()
     serializer_class = CreateHostelSerializer
 
+    @conditional_get(Hostel)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class GetHostelOccupancy(SparseFieldsViewMixin, RetrieveAPIView):
+    """ Get how full a hostel is from its running counters """
+    serializer_class = HostelOccupancySerializer
+
+    def get_object(self):
+        try:
+            return HostelOccupancy.objects.for_hostel(self.kwargs['pk'])
+        except HostelOccupancy.DoesNotExist:
+            raise Http404
+
+
+def join_full_name(first_name, last_name):
+    """ same as the full_name property of Student and Employee """
+    if last_name:
+        return f'{first_name} {last_name}'
+    return first_name
+
 
 @api_view(['GET'])
 def getStudentFromHostel(request, pk):
-    """ to get the names of students who have booked a hostel """
-    try:
-        rooms = Room.objects.filter(hostel=pk)
-        if rooms.count() == 0:
-            raise ObjectDoesNotExist
+    """
+        to get the names of students who have booked a hostel.
+        one joined query over bookings, rooms and students.
+        pass page_size/cursor to paginate, or stream=true to stream the names for very large hostels.
+    """
+    student_names_qs = Booking.objects.filter(room__hostel=pk).values(
+        'booking_id', 'student__first_name', 'student__last_name')
+    if request.query_params.get('stream') == 'true':
+        if not Room.objects.filter(hostel=pk).exists():
+            raise_hostel_does_not_exist()
+        return StreamingHttpResponse(stream_student_names(student_names_qs), content_type='application/json')
+
+    paginator = None
+    if 'page_size' in request.query_params or 'cursor' in request.query_params:
+        paginator = ModelsPagination()
+        student_names_qs = paginator.paginate_queryset(student_names_qs, request)
+    student_names = [
+        join_full_name(row['student__first_name'], row['student__last_name']) for row in student_names_qs
+    ]
+    if not student_names and not Room.objects.filter(hostel=pk).exists():
+        raise_hostel_does_not_exist()
+    data = {
+        'message' : 'There are no students in this hostel'
+        }
+    if len(student_names) > 0:
         data = {
-            'message' : 'There are no students in this hostel'
-            }
-        student_names = list()
-        for room in rooms:
-            booking_qs = Booking.objects.filter(room=room)
-            if booking_qs:
-                for booking_obj in booking_qs:
-                    full_name = booking_obj.student.full_name
-                    student_names.append(full_name)           
-        if len(student_names) > 0:
-            data = {
-                'student_full_names_list' : student_names,
-                'message' : f'got {len(student_names)} students'
-            }
-        return JsonResponse(data, status=status.HTTP_200_OK)
-    except ObjectDoesNotExist:
-        raise ValidationError({
-            'error_message' : 'hostel object does not exist. Please pass correct hostel obj request' 
+            'student_full_names_list' : student_names,
+            'message' : f'got {len(student_names)} students'
+        }
+    if paginator is not None:
+        data.update({
+            'next' : paginator.get_next_link(),
+            'previous' : paginator.get_previous_link()
         })
+    return JsonResponse(data, status=status.HTTP_200_OK)
+
+
+def stream_student_names(student_names_qs, chunk_size=2000):
+    """ yield the students response as json pieces, holding only one chunk of rows in memory """
+    yield '{"student_full_names_list": ['
+    count = 0
+    names = []
+    for row in student_names_qs.iterator(chunk_size=chunk_size):
+        names.append(json.dumps(join_full_name(row['student__first_name'], row['student__last_name'])))
+        if len(names) == chunk_size:
+            yield (', ' if count else '') + ', '.join(names)
+            count += len(names)
+            names = []
+    if names:
+        yield (', ' if count else '') + ', '.join(names)
+        count += len(names)
+    message = f'got {count} students' if count else 'There are no students in this hostel'
+    yield f'], "message": {json.dumps(message)}}}'
+
+
+def raise_hostel_does_not_exist():
+    raise ValidationError({
+        'error_message' : 'hostel object does not exist. Please pass correct hostel obj request' 
+    })
 
 
 @api_view(['POST'])
@@ -149,7 +305,7 @@ def create_room(request):
         response_data = serializer.data.copy()
         extra_data = {
             'created' : True,
-            'hostel_name' : Hostel.objects.get(hostel_branch_id=response_data.get('hostel')).name
+            'hostel_name' : object_cache.get(Hostel.objects.all(), response_data.get('hostel')).name
         }
         response_data.pop('hostel')
         response_data.update(extra_data)
@@ -159,45 +315,98 @@ def create_room(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
    
-class GetVacantRooms(ListAPIView):
-    """ Api to get all vacant rooms available """
+def no_vacant_rooms(queryset, price_limit=None):
+    """
+        True if queryset, vacant rooms priced at most price_limit, is empty. the vacant room index
+        answers without a query while it knows of such a room, but it sees the writes of other
+        processes (release_rooms runs on its own) only after VACANT_ROOM_INDEX_TTL: an empty
+        answer is confirmed with the database, and the index reloaded if it was wrong.
+    """
+    if vacant_rooms.count_under(price_limit):
+        return False
+    if queryset.exists():
+        vacant_rooms.invalidate()
+        return False
+    return True
+
+
+class GetVacantRooms(SparseFieldsViewMixin, ListAPIView):
+    """
+        Api to get all vacant rooms available.
+        pass check_in_date and check_out_date to get the rooms free for that stay.
+    """
     queryset = Room.objects.filter(status='vacant')
     serializer_class = RoomSerializer
     pagination_class = ModelsPagination
 
+    @conditional_get(Room, Booking)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         """ Raise error message if no rooms are available """
-        if self.queryset.count() == 0:
+        room_price_limit = self.get_price_limit()
+        stay_dates = self.get_stay_dates()
+        if stay_dates is not None:
+            queryset = Room.objects.available(stay_dates['check_in_date'], stay_dates['check_out_date'])
+            if room_price_limit is None:
+                return queryset
+            queryset = queryset.filter(price__lte=room_price_limit)
+            if queryset.exists():
+                return queryset
+            raise ValidationError(f'There are no vacant rooms below {room_price_limit}')
+
+        queryset = super().get_queryset()
+        if no_vacant_rooms(queryset):
             raise ValidationError({
                 'room-count' : 0,
                 'error' : 'Sorry, all rooms are occupied. Please try later..'
                 })
 
         """ filter rooms under a specific price limit """
+        if room_price_limit is None:
+            return queryset
+        queryset = queryset.filter(price__lte=room_price_limit)
+        if no_vacant_rooms(queryset, room_price_limit):
+            raise ValidationError(f'There are no vacant rooms below {room_price_limit}')
+        return queryset
+
+    def get_price_limit(self):
         room_price_limit = self.request.query_params.get('price_limit', None)
         if not room_price_limit:
-            return super().get_queryset()
-        queryset = Room.objects.filter(status='vacant').filter(price__lte=room_price_limit)
-        if queryset.exists():
-            return queryset
-        raise ValidationError(f'There are no vacant rooms below {room_price_limit}')
+            return None
+        try:
+            return int(room_price_limit)
+        except ValueError:
+            raise ValidationError({'price_limit' : 'Price limit should be a number'})
+
+    def get_stay_dates(self):
+        """ validated check in/out dates from the query params, None if not passed """
+        params = self.request.query_params
+        if 'check_in_date' not in params and 'check_out_date' not in params:
+            return None
+        serializer = RoomAvailabilitySerializer(data=params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
         
         
 class CreateStudentDetails(CreateAPIView):
     """ Api to create student details """
     serializer_class = StudentSerializer
 
-    def create(self, request, *args, **kwargs):
-        """ do not create if student exists """
-        first_name = request.data.get('first_name')
-        last_name = request.data.get('last_name')
-        if Student.objects.filter(first_name=first_name, last_name=last_name).exists():
+    def perform_create(self, serializer):
+        """ do not create if student exists, name and phone number are unique in the database """
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as exc:
+            if violated_constraint(exc, Student) == 'unique_student_phone_no':
+                raise ValidationError({'phone_no' : {'error' : 'This phone number already exists'}})
             errordata = {
             "Failed": True,
             "error" : "Student already exists"
         }
             raise ValidationError(errordata, code=status.HTTP_400_BAD_REQUEST)
-        return super().create(request, *args, **kwargs)
           
 
 class DoBooking(APIView):
@@ -210,18 +419,26 @@ class DoBooking(APIView):
         "check_out_date": "2021-05-23"
     }
 
+    @idempotent
     def post(self, request):
-        """ only allow to book if serialized data validated """
+        """ only allow to book if serialized data validated, retries can send an Idempotency-Key """
         serializer = BookingSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             booking_data = serializer.validated_data
-            booking_obj = Booking(
-                student         = booking_data.get('student'),
-                room            = booking_data.get('room'),
-                check_in_date   = booking_data.get('check_in_date'),
-                check_out_date  = booking_data.get('check_out_date')
-            )
-            booking_obj.save()
+            try:
+                Booking.objects.book(
+                    student         = booking_data.get('student'),
+                    room            = booking_data.get('room'),
+                    check_in_date   = booking_data.get('check_in_date'),
+                    check_out_date  = booking_data.get('check_out_date')
+                )
+            except RoomUnavailable:
+                raise ValidationError({
+                    'room-status' : 'Room is not vacant',
+                    'failed' : True
+                    })
+            except BookingConflict:
+                return booking_conflict_response()
             response_data = serializer.data
             response_data.update({
                 'created' : True,
@@ -230,11 +447,17 @@ class DoBooking(APIView):
                 })
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def handle_exception(self, exc):
+        """ a write blocked by a concurrent booking is a conflict the client can retry """
+        if isinstance(exc, OperationalError) and is_lock_contention(exc):
+            return booking_conflict_response()
+        return super().handle_exception(exc)
     
     def get_queryset(self):
         """ Get booking queryset by id """
         try:
-            bookings_qs = Booking.objects.all()
+            bookings_qs = Booking.objects.select_related('student', 'room')
             id = self.kwargs.get('pk', None)
             """ return all bookings if no pk passed """
             if id is None:
@@ -253,15 +476,30 @@ class DoBooking(APIView):
             }
             raise ValidationError(error_data)
 
+    @conditional_get(Booking, Student, Room)
     def get(self, request, *args, **kwargs):
-        """ Get all booking details """
+        """ Get all booking details, pass lite=true for the values based read path and fields=a,b for a sparse fieldset """
         booking_qs = self.get_queryset()
-        if booking_qs.count() > 1:
-            room_price_limit = self.request.query_params.get('price_limit', None)
-            if room_price_limit:
-                booking_qs = booking_qs.filter(room__price__lte = int(room_price_limit))
-        serializer = GetBookingSerializer(booking_qs, many=True)      
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        lite = self.request.query_params.get('lite') == 'true'
+        fields = requested_fields(self.request.query_params, GetBookingSerializer)
+        if not lite:
+            booking_qs = GetBookingSerializer.sparse_queryset(booking_qs, fields)
+        if self.kwargs.get('pk', None) is not None:
+            serializer = BookingValuesSerializer(BookingValuesSerializer.values(booking_qs, fields), fields) if lite else \
+                GetBookingSerializer(booking_qs, many=True, fields=fields)
+            return Response(serializer.data, status = status.HTTP_200_OK)
+
+        room_price_limit = self.request.query_params.get('price_limit', None)
+        if room_price_limit:
+            booking_qs = booking_qs.filter(room__price__lte = int(room_price_limit))
+        paginator = ModelsPagination()
+        if lite:
+            page = paginator.paginate_queryset(BookingValuesSerializer.values(booking_qs, fields), request, view=self)
+            serializer = BookingValuesSerializer(page, fields)
+        else:
+            page = paginator.paginate_queryset(booking_qs, request, view=self)
+            serializer = GetBookingSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
     
     def put(self, request, *args, **kwargs):
         """ update booking details if any typo error """
@@ -273,7 +511,10 @@ class DoBooking(APIView):
             booking_instance = Booking.objects.get(booking_id=booking_id)
             serializer = BookingSerializer(instance=booking_instance, data=updated_booking_data, partial=True)
             if serializer.is_valid(raise_exception=True):
-                serializer.save()
+                try:
+                    serializer.save()
+                except BookingConflict:
+                    return booking_conflict_response()
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             response_data = serializer.data 
@@ -290,6 +531,67 @@ class DoBooking(APIView):
                 }, code=status.status.HTTP_400_BAD_REQUEST)
 
 
+class BatchBooking(APIView):
+    """ Book rooms for a whole group of students in one request """
+
+    batchBookingDataFormat = [
+        {
+            "student": "1",
+            "room": "2",
+            "check_in_date": "2021-05-19",
+            "check_out_date": "2021-05-23"
+        }
+    ]
+    max_batch_size = 500
+
+    def post(self, request):
+        """ book every valid item of the list, report success or failure per item """
+        if not isinstance(request.data, list) or not request.data:
+            raise ValidationError({'error' : 'Pass a non empty list of bookings'})
+        if len(request.data) > self.max_batch_size:
+            raise ValidationError({'error' : f'A batch can have at most {self.max_batch_size} bookings'})
+
+        results = [None] * len(request.data)
+        stays, stay_indexes = [], []
+        for index, item in enumerate(request.data):
+            serializer = BatchBookingItemSerializer(data=item)
+            if serializer.is_valid():
+                stays.append(serializer.validated_data)
+                stay_indexes.append(index)
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : serializer.errors}
+
+        try:
+            bookings = Booking.objects.book_many(stays)
+        except BookingConflict:
+            return booking_conflict_response()
+        for index, booking in zip(stay_indexes, bookings):
+            if isinstance(booking, Booking):
+                results[index] = {
+                    'index' : index,
+                    'created' : True,
+                    'booking_id' : booking.booking_id,
+                    'no_of_nights' : booking.no_of_nights
+                }
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : {'error' : [booking]}}
+
+        created_count = sum(result['created'] for result in results)
+        response_data = {
+            'created' : created_count,
+            'failed' : len(results) - created_count,
+            'results' : results
+        }
+        response_status = status.HTTP_201_CREATED if created_count else status.HTTP_400_BAD_REQUEST
+        return Response(response_data, status=response_status)
+
+    def handle_exception(self, exc):
+        """ a write blocked by a concurrent booking is a conflict the client can retry """
+        if isinstance(exc, OperationalError) and is_lock_contention(exc):
+            return booking_conflict_response()
+        return super().handle_exception(exc)
+
+
 class PaymentView(APIView):
     """ payment details"""
     
@@ -298,20 +600,90 @@ class PaymentView(APIView):
         "booking" : "20",
         "payment_mode" : "online"
     }
+    batchPaymentFormat = [
+        {
+            "student" : "4",
+            "booking" : "20",
+            "employee" : "1",
+            "payment_mode" : "cash"
+        }
+    ]
     PAYMENTMODES = ('cash', 'online')
+    max_batch_size = 500
 
+    @idempotent
     def post(self, request, *args, **kwargs):
-        """ create the payment details """ 
+        """ create the payment details, or settle a list of payments at once; retries can send an Idempotency-Key """
+        if isinstance(request.data, list):
+            return self.post_batch(request)
         serializer = CreatePaymentSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
+            """ a booking is paid once in the database, a concurrent payment can get in after validate_booking """
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError as exc:
+                if violated_constraint(exc, Payment) != 'unique_payment_booking':
+                    raise
+                raise ValidationError({'booking' : {'error' : 'Payment was already done for this booking'}})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def post_batch(self, request):
+        """ settle every valid payment of the list with its transaction, report success or failure per item """
+        if not request.data:
+            raise ValidationError({'error' : 'Pass a non empty list of payments'})
+        if len(request.data) > self.max_batch_size:
+            raise ValidationError({'error' : f'A batch can have at most {self.max_batch_size} payments'})
+
+        results = [None] * len(request.data)
+        items, item_indexes = [], []
+        for index, item in enumerate(request.data):
+            serializer = BatchPaymentItemSerializer(data=item)
+            if serializer.is_valid():
+                items.append(serializer.validated_data)
+                item_indexes.append(index)
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : serializer.errors}
+
+        """ a concurrent payment can take a booking between the checks and the insert, check the batch again once """
+        for attempt in range(2):
+            try:
+                payments = Payment.objects.pay_many(items)
+                break
+            except IntegrityError as exc:
+                if violated_constraint(exc, Payment) != 'unique_payment_booking':
+                    raise
+                if attempt:
+                    return payment_conflict_response()
+            except OperationalError as exc:
+                if not is_lock_contention(exc):
+                    raise
+                return payment_conflict_response()
+        for index, payment in zip(item_indexes, payments):
+            if isinstance(payment, Payment):
+                results[index] = {
+                    'index' : index,
+                    'created' : True,
+                    'payment_id' : payment.payment_id,
+                    'total_payments' : payment.total_payments
+                }
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : {'error' : [payment]}}
+
+        created_count = sum(result['created'] for result in results)
+        response_data = {
+            'created' : created_count,
+            'failed' : len(results) - created_count,
+            'results' : results
+        }
+        response_status = status.HTTP_201_CREATED if created_count else status.HTTP_400_BAD_REQUEST
+        return Response(response_data, status=response_status)
     
     def get_queryset(self):
         """ Get paying queryset by id """
         try:
-            payment_qs = Payment.objects.all()
+            payment_qs = Payment.objects.select_related('student', 'booking__room')
             id = self.kwargs.get('pk', None)
             """ return all payments done if no pk passed """
             if id is None:
@@ -331,14 +703,200 @@ class PaymentView(APIView):
             raise ValidationError(error_data)
     
     def get(self, request, *args, **kwargs):
-        """ get the payment details """
+        """ get the payment details, pass lite=true for the values based read path and fields=a,b for a sparse fieldset """
         payment_qs = self.get_queryset()
-        if payment_qs.count() > 1:
-            payment_mode = self.request.query_params.get('payment_mode', None)
-            """ get payment details with respect to payment mode """
-            if payment_mode:
-                if payment_mode.lower() not in self.PAYMENTMODES:
-                    raise ValidationError('Invalid payment mode passed')
-                payment_qs = payment_qs.filter(payment_mode__iexact=payment_mode)            
-        serializer = PaymentSerializer(payment_qs, many=True)
-        return Response(serializer.data, status = status.HTTP_200_OK)
+        lite = self.request.query_params.get('lite') == 'true'
+        fields = requested_fields(self.request.query_params, PaymentSerializer)
+        if not lite:
+            payment_qs = PaymentSerializer.sparse_queryset(payment_qs, fields)
+        if self.kwargs.get('pk', None) is not None:
+            serializer = PaymentValuesSerializer(PaymentValuesSerializer.values(payment_qs, fields), fields) if lite else \
+                PaymentSerializer(payment_qs, many=True, fields=fields)
+            return Response(serializer.data, status = status.HTTP_200_OK)
+
+        payment_mode = self.request.query_params.get('payment_mode', None)
+        """ get payment details with respect to payment mode """
+        if payment_mode:
+            if payment_mode.lower() not in self.PAYMENTMODES:
+                raise ValidationError('Invalid payment mode passed')
+            payment_qs = payment_qs.filter(payment_mode__iexact=payment_mode)            
+        paginator = ModelsPagination()
+        if lite:
+            page = paginator.paginate_queryset(PaymentValuesSerializer.values(payment_qs, fields), request, view=self)
+            serializer = PaymentValuesSerializer(page, fields)
+        else:
+            page = paginator.paginate_queryset(payment_qs, request, view=self)
+            serializer = PaymentSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+def getCacheStats(request):
+    """ hits and misses of the object cache in this process, to size it """
+    return Response(object_cache.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def search(request):
+    """
+        type-ahead search over students, employees and hostels: ?q=anan&kind=student,employee&limit=10
+        names and contacts starting with q come first, then substring and fuzzy (typo) matches.
+    """
+    query = SearchQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    results = search_index.search(query.validated_data['q'], query.validated_data['kind'], query.validated_data['limit'])
+    return Response({
+        'query' : query.validated_data['q'],
+        'count' : len(results),
+        'results' : results
+    }, status=status.HTTP_200_OK)
+
+
+def getMetrics(request):
+    """ request count, latency histogram and SQL work per url name, in Prometheus text format """
+    return HttpResponse(metrics.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class RevenueReport(APIView):
+    """ payment count and revenue grouped by hostel, room, payment_mode and/or month """
+
+    def get(self, request, *args, **kwargs):
+        """ ?year=2021&group_by=hostel,payment_mode,month """
+        query = RevenueQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        payment_qs = Payment.objects.all()
+        year = query.validated_data.get('year')
+        if year is not None:
+            """ a range on payment_datetime can use its index, unlike __year """
+            tz = timezone.get_current_timezone()
+            payment_qs = payment_qs.filter(
+                payment_datetime__gte=datetime(year, 1, 1, tzinfo=tz),
+                payment_datetime__lt=datetime(year + 1, 1, 1, tzinfo=tz)
+            )
+        group_by = query.validated_data['group_by']
+        rows = payment_qs.revenue(group_by)
+        data = list(rename_keys(rows, {f'{key}_group': key for key in group_by}))
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class Ledger(APIView):
+    """ append only ledger of the payments processed by each employee """
+
+    ledgerDataFormat = [
+        {
+            "payment" : "20",
+            "employee" : "1"
+        }
+    ]
+    max_batch_size = 1000
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        """ record a transaction or a list of them with one insert, report success or failure per item """
+        entries = request.data if isinstance(request.data, list) else [request.data]
+        if not entries:
+            raise ValidationError({'error' : 'Pass a non empty list of transactions'})
+        if len(entries) > self.max_batch_size:
+            raise ValidationError({'error' : f'A batch can have at most {self.max_batch_size} transactions'})
+
+        results = [None] * len(entries)
+        items, item_indexes = [], []
+        for index, entry in enumerate(entries):
+            serializer = LedgerEntrySerializer(data=entry)
+            if serializer.is_valid():
+                items.append(serializer.validated_data)
+                item_indexes.append(index)
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : serializer.errors}
+
+        try:
+            transactions = Transcation.objects.record_payments(items)
+        except IntegrityError:
+            """ a concurrent request recorded one of the payments first """
+            data = {
+                'failed' : True,
+                'retryable' : True,
+                'error' : 'A payment was recorded by another request. Please retry.'
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        for index, ledger_entry in zip(item_indexes, transactions):
+            if isinstance(ledger_entry, Transcation):
+                results[index] = {
+                    'index' : index,
+                    'created' : True,
+                    'transaction_id' : ledger_entry.transaction_id,
+                    'amount' : ledger_entry.amount
+                }
+            else:
+                results[index] = {'index' : index, 'created' : False, 'errors' : {'error' : [ledger_entry]}}
+
+        created_count = sum(result['created'] for result in results)
+        response_data = {
+            'created' : created_count,
+            'failed' : len(results) - created_count,
+            'results' : results
+        }
+        response_status = status.HTTP_201_CREATED if created_count else status.HTTP_400_BAD_REQUEST
+        return Response(response_data, status=response_status)
+
+    def get(self, request, *args, **kwargs):
+        """ ?employee=1 or ?hostel=2, newest first, read through the (employee|hostel, created_at) indexes """
+        fields = requested_fields(request.query_params, TransactionSerializer)
+        transaction_qs = TransactionSerializer.sparse_queryset(Transcation.objects.all(), fields)
+        for key in ('employee', 'hostel'):
+            value = request.query_params.get(key)
+            if value is not None:
+                if not value.isdigit():
+                    raise ValidationError({key : 'Should be an id'})
+                transaction_qs = transaction_qs.filter(**{key: value})
+        paginator = ModelsPagination()
+        page = paginator.paginate_queryset(transaction_qs, request, view=self)
+        return paginator.get_paginated_response(TransactionSerializer(page, many=True, fields=fields).data)
+
+
+class LedgerSummary(APIView):
+    """ transaction count and amount per day of an employee or a hostel, read from the daily ledger totals """
+    summary_of = 'employee'
+    summary_models = {'employee' : Employee, 'hostel' : Hostel}
+
+    def get(self, request, pk, *args, **kwargs):
+        """ ?date_from=2021-05-01&date_to=2021-05-31 """
+        query = LedgerQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        totals = LedgerDailySummary.objects.filter(**{self.summary_of: pk}).totals(
+            query.validated_data.get('date_from'), query.validated_data.get('date_to'))
+        if not totals['days'] and not self.summary_models[self.summary_of].objects.filter(pk=pk).exists():
+            raise Http404
+        return Response({self.summary_of : pk, **totals}, status=status.HTTP_200_OK)
+
+
+class ImportCSV(APIView):
+    """ Bulk import hostels, rooms, students or employees from an uploaded CSV file """
+    parser_classes = (MultiPartParser,)
+
+    importCSVDataFormat = {
+        "file": "rooms.csv with the header hostel,description,price,status",
+        "batch_size": "500"
+    }
+
+    def post(self, request, kind):
+        """ the file is read line by line, each batch is validated and bulk inserted, errors reported per row """
+        if kind not in IMPORTERS:
+            raise Http404
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file' : ['Upload the CSV as the file field']})
+        try:
+            batch_size = int(request.data.get('batch_size', 500))
+        except ValueError:
+            raise ValidationError({'batch_size' : ['A valid integer is required.']})
+        if not 0 < batch_size <= 5000:
+            raise ValidationError({'batch_size' : ['Batch size should be between 1 and 5000']})
+
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            report = IMPORTERS[kind](batch_size=batch_size).run(lines)
+        except DjangoValidationError as exc:
+            raise ValidationError({'file' : exc.messages})
+        response_status = status.HTTP_201_CREATED if report.created else status.HTTP_400_BAD_REQUEST
+        return Response(report.as_dict(), status=response_status)